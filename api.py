@@ -0,0 +1,222 @@
+import io
+import json
+import os
+import threading
+import time
+from importlib.util import find_spec
+
+import numpy as np
+
+from instrumentation import stage
+from runner import CHANNELS, DEFAULT_CHANNELS, METRIC_CHANNELS, result_columns, scenario_from_dict, simulate_scenarios
+
+# =============================================================================
+# API HTTP: POST /api/simulate
+# =============================================================================
+# Ciało żądania (JSON, prędkości w m/s – jak w runner.py):
+#   {"scenarios": [{"id": "a1", "vehicle": "truck", "kp": 15, "Tp": 0.5, "Ti": 5, "Td": 0.1,
+#                   "v_ref": 25, "v0": 0, "t_end": 600}, ...],
+#    "channels": ["velocity"], "metrics_only": false, "format": "npz" | "arrow"}
+# (pojedynczy scenariusz można podać bez listy). Odpowiedź – kolumnowo jak w plikach
+# paczek runner.py: id, offsets, t_end, kanały float32 sklejone po scenariuszach
+# (przebieg i – [offsets[i]:offsets[i + 1]], czas – np.linspace(0, t_end, długość))
+# i wskaźniki jakości metric_*. "format": "arrow" – strumień Arrow IPC, jeden wiersz na
+# scenariusz, kanały jako listy (wymaga pyarrow).
+#
+# Żądania, które nadejdą w ciągu BATCH_WINDOW_MS od pierwszego oczekującego, liczone są
+# razem – jedno wywołanie simulate_batch dla wszystkich ich scenariuszy (Coalescer).
+# Symulacja trzyma w pamięci tylko kanały żądane i potrzebne do wskaźników (float64),
+# więc MAX_SAMPLES ogranicza pamięć paczki do kilkudziesięciu MB. Integrator "adaptive"
+# (symulacja skalarna, krok po kroku) nie jest przyjmowany – wstrzymywałby całą paczkę.
+
+BATCH_WINDOW_MS = float(os.environ.get("TEMPOMAT_API_BATCH_MS", 5))
+REQUEST_TIMEOUT = float(os.environ.get("TEMPOMAT_API_TIMEOUT_S", 60))  # [s] oczekiwania na paczkę
+MAX_SCENARIOS = 1000  # na jedno żądanie
+MAX_SAMPLES = 1_000_000  # próbek (scenariusze × kroki) na jedno żądanie i na paczkę
+ARROW_AVAILABLE = find_spec("pyarrow") is not None
+NPZ_TYPE = "application/x-npz"
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def _samples(scenarios):
+    return sum(int(s["t_end"] / s["Tp"]) + 1 for s in scenarios)
+
+
+class Coalescer:
+    """
+    Łączenie równoczesnych żądań w jedną paczkę. Pierwsze żądanie w oknie czasowym
+    (lider) czeka window sekund, zabiera wszystkie oczekujące, liczy je razem (w paczkach
+    do max_samples próbek) i rozdziela wyniki; pozostałe wątki czekają na swoje wyniki.
+    Żądania, które nadejdą w trakcie liczenia, wybierają już nowego lidera.
+    Jeśli paczka się nie policzy, jej żądania liczone są ponownie pojedynczo – błąd trafia
+    tylko do żądania, które go wywołało. Wątek, który nie dostanie wyniku w ciągu timeout
+    sekund, kończy się TimeoutError.
+    """
+
+    def __init__(self, window=BATCH_WINDOW_MS / 1000, compute=simulate_scenarios, max_samples=MAX_SAMPLES,
+                 timeout=REQUEST_TIMEOUT):
+        self.window = window
+        self.timeout = timeout
+        self.compute = compute
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._pending = []
+        self._leader = False
+        self.batches = 0
+        self.requests = 0
+
+    def submit(self, scenarios, channels=CHANNELS):
+        """
+        Wyniki dla listy scenariuszy (kolejność zachowana) z kanałami channels;
+        zwraca (wyniki, rozmiar paczki).
+        """
+        entry = {"scenarios": scenarios, "channels": tuple(channels), "samples": _samples(scenarios),
+                 "done": threading.Event()}
+        with self._lock:
+            self._pending.append(entry)
+            lead = not self._leader
+            self._leader = True
+        if lead:
+            time.sleep(self.window)
+            with self._lock:
+                pending, self._pending, self._leader = self._pending, [], False
+            try:
+                batch, total = [], 0
+                for other in pending:
+                    if batch and total + other["samples"] > self.max_samples:
+                        self._run(batch)
+                        batch, total = [], 0
+                    batch.append(other)
+                    total += other["samples"]
+                self._run(batch)
+            except BaseException as exc:
+                for other in pending:
+                    if "results" not in other:
+                        other.setdefault("error", exc)
+                raise
+            finally:
+                # Żaden oczekujący wątek nie zostaje bez odpowiedzi – także gdy lider przerwie pracę
+                for other in pending:
+                    other["done"].set()
+        if not entry["done"].wait(self.timeout):
+            raise TimeoutError(f"brak wyniku symulacji po {self.timeout:g} s")
+        if "error" in entry:
+            raise entry["error"]
+        return entry["results"], entry["batch_size"]
+
+    def _run(self, batch):
+        scenarios = [s for entry in batch for s in entry["scenarios"]]
+        channels = tuple(dict.fromkeys(c for entry in batch for c in entry["channels"]))
+        try:
+            results = self.compute(scenarios, channels)
+        except Exception as exc:
+            if len(batch) > 1:  # które żądanie? – każde osobno
+                for entry in batch:
+                    self._run([entry])
+                return
+            batch[0]["error"] = exc
+            batch[0]["done"].set()
+            return
+        with self._lock:
+            self.batches += 1
+            self.requests += len(batch)
+        start = 0
+        for entry in batch:
+            n = len(entry["scenarios"])
+            entry["results"], entry["batch_size"] = results[start:start + n], len(scenarios)
+            start += n
+            entry["done"].set()
+
+
+COALESCER = Coalescer()
+
+
+def parse_request(body):
+    """Ciało żądania -> (scenariusze, kanały, metrics_only, format); ValueError przy błędach."""
+    if isinstance(body, list) or (isinstance(body, dict) and "scenarios" not in body):
+        body = {"scenarios": body}
+    if not isinstance(body, dict):
+        raise ValueError("oczekiwano obiektu JSON")
+    raw = body["scenarios"]
+    raw = raw if isinstance(raw, list) else [raw]
+    if not raw or len(raw) > MAX_SCENARIOS:
+        raise ValueError(f"liczba scenariuszy musi być z zakresu 1–{MAX_SCENARIOS}")
+    scenarios = [scenario_from_dict(r, i, f"scenariusz {i}") for i, r in enumerate(raw)]
+    adaptive = [s["id"] for s in scenarios if s["integrator"] == "adaptive"]
+    if adaptive:
+        raise ValueError(f"integrator adaptive jest niedostępny w API (scenariusze: {', '.join(adaptive)})")
+    samples = _samples(scenarios)
+    if samples > MAX_SAMPLES:
+        raise ValueError(f"za dużo próbek w jednym żądaniu ({samples:.3g} > {MAX_SAMPLES:.3g})")
+
+    metrics_only = bool(body.get("metrics_only", False))
+    channels = body.get("channels", DEFAULT_CHANNELS)
+    channels = [] if metrics_only else (channels.split(",") if isinstance(channels, str) else channels)
+    if not isinstance(channels, (list, tuple)) or not all(isinstance(c, str) for c in channels):
+        raise ValueError("channels musi być listą nazw kanałów")
+    channels = list(channels)
+    unknown = set(channels) - set(CHANNELS)
+    if unknown:
+        raise ValueError(f"nieznane kanały: {', '.join(sorted(unknown))}")
+    fmt = body.get("format", "npz")
+    if fmt not in ("npz", "arrow"):
+        raise ValueError(f"nieznany format {fmt!r}")
+    if fmt == "arrow" and not ARROW_AVAILABLE:
+        raise ValueError("format arrow wymaga pakietu pyarrow")
+    return scenarios, channels, metrics_only, fmt
+
+
+def encode_npz(columns):
+    buffer = io.BytesIO()
+    np.savez(buffer, **columns)
+    return buffer.getvalue()
+
+
+def encode_arrow(columns, channels):
+    """Kolumny result_columns -> strumień Arrow IPC (wiersz na scenariusz)."""
+    import pyarrow as pa
+
+    offsets = columns["offsets"].astype(np.int64)
+    table = {name: value for name, value in columns.items() if name not in channels and name != "offsets"}
+    for name in channels:
+        table[name] = pa.LargeListArray.from_arrays(pa.array(offsets), pa.array(columns[name]))
+    table = pa.table(table)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def simulate_endpoint():
+    from flask import request
+
+    body = request.get_json(silent=True)
+    if body is None:
+        return _error("ciało żądania musi być poprawnym JSON")
+    try:
+        scenarios, channels, metrics_only, fmt = parse_request(body)
+    except ValueError as exc:
+        return _error(str(exc))
+
+    needed = tuple(dict.fromkeys(channels + list(METRIC_CHANNELS)))
+    try:
+        with stage("simulate"):
+            results, batch_size = COALESCER.submit(scenarios, needed)
+    except TimeoutError as exc:
+        return _error(str(exc), 503)
+    with stage("encode"):
+        columns = result_columns(scenarios, results, channels)
+        if metrics_only:
+            del columns["offsets"]
+        payload = encode_arrow(columns, channels) if fmt == "arrow" else encode_npz(columns)
+    return payload, 200, {"Content-Type": ARROW_TYPE if fmt == "arrow" else NPZ_TYPE,
+                          "X-Batch-Scenarios": str(batch_size)}
+
+
+def _error(message, status=400):
+    return json.dumps({"error": message}), status, {"Content-Type": "application/json"}
+
+
+def install(server):
+    """Podpięcie /api/simulate do serwera Flask aplikacji."""
+    server.add_url_rule("/api/simulate", "api_simulate", simulate_endpoint, methods=["POST"])
@@ -0,0 +1,168 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch import BatchStepper
+from core import V_MAX_REF
+
+# =============================================================================
+# AUTOMATYCZNY DOBÓR NASTAW PID
+# =============================================================================
+# Ewolucja różnicowa (DE/rand/1/bin – metoda bezgradientowa) na modelu
+# CruiseControlSimulator liczonym wsadowo (BatchStepper). Wszystkie składniki kosztu
+# rosną monotonicznie w czasie symulacji, więc koszt częściowy jest dolnym
+# ograniczeniem kosztu końcowego – kandydat, który przekroczy koszt swojego rodzica,
+# zostaje przerwany, bo i tak przegrałby selekcję.
+
+# Zakresy jak na suwakach aplikacji
+BOUNDS = {"kp": (1.0, 50.0), "Ti": (0.1, 10.0), "Td": (0.0, 5.0)}
+SLIDER_STEPS = {"kp": 1.0, "Ti": 0.1, "Td": 0.1}
+
+DEFAULT_WEIGHTS = {
+    "ise": 0.0,  # ∫(e/Δv)² dt [s]
+    "itae": 1.0,  # ∫t·|e/Δv| dt / t_end [s]
+    "overshoot": 50.0,  # przeregulowanie względne [-]
+    "settling": 0.2,  # czas regulacji (pasmo ±2%) [s]
+    "brake": 20.0,  # ∫F_ham dt / (F_ham_max · t_end) [-]
+}
+SETTLING_BAND = 0.02
+PRUNE_EVERY = 10  # co ile kroków sprawdzać przerwanie kandydatów
+
+
+def _to_params(x):
+    """Przestrzeń znormalizowana [0, 1]³ -> (kp, Ti, Td); Ti w skali logarytmicznej."""
+    kp = BOUNDS["kp"][0] + x[:, 0] * (BOUNDS["kp"][1] - BOUNDS["kp"][0])
+    log_ti = np.log10(BOUNDS["Ti"])
+    Ti = 10 ** (log_ti[0] + x[:, 1] * (log_ti[1] - log_ti[0]))
+    Td = BOUNDS["Td"][0] + x[:, 2] * (BOUNDS["Td"][1] - BOUNDS["Td"][0])
+    return np.column_stack([kp, Ti, Td])
+
+
+def evaluate(candidates, vehicle_params, v_ref, v0, Tp, t_end, weights=None, thresholds=None):
+    """
+    Koszt kandydatów candidates – tablica (n, 3) kolumn (kp, Ti, Td).
+    thresholds: opcjonalny próg dla każdego kandydata; po jego przekroczeniu przez koszt
+    częściowy symulacja kandydata jest przerywana, a jego koszt wynosi inf.
+    """
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    candidates = np.asarray(candidates, dtype=float)
+    n = len(candidates)
+    step_size = abs(v_ref - v0) or max(abs(v_ref), 1.0)
+    direction = 1.0 if v_ref >= v0 else -1.0
+
+    stepper = BatchStepper(candidates[:, 0], candidates[:, 1], candidates[:, 2], Tp,
+                           vehicle_params["mass"], vehicle_params["drag_coeff"],
+                           vehicle_params["max_traction"], vehicle_params["max_brake"], v_ref, v0)
+    alive = np.arange(n)
+    ise, itae, overshoot, settling, brake = (np.zeros(n) for _ in range(5))
+    limit = np.full(n, np.inf) if thresholds is None else np.asarray(thresholds, dtype=float).copy()
+
+    def partial_cost():
+        return (weights["ise"] * ise + weights["itae"] * itae + weights["overshoot"] * overshoot
+                + weights["settling"] * settling + weights["brake"] * brake)
+
+    n_steps = int(t_end / Tp) + 1
+    for k in range(n_steps - 1):
+        t = k * Tp
+        e, _, _, _, _, f_brake = stepper.step()
+        err = e * V_MAX_REF / step_size  # uchyb w próbce k, względem wielkości skoku
+
+        ise += err ** 2 * Tp
+        itae += t * np.abs(err) * Tp / t_end
+        np.maximum(overshoot, -direction * err, out=overshoot)
+        settling[np.abs(err) > SETTLING_BAND] = t
+        brake += f_brake * Tp / (vehicle_params["max_brake"] * t_end)
+
+        if thresholds is not None and k % PRUNE_EVERY == 0:
+            keep = partial_cost() <= limit
+            if not keep.all():
+                stepper.select(keep)
+                alive, ise, itae, overshoot, settling, brake, limit = (
+                    a[keep] for a in (alive, ise, itae, overshoot, settling, brake, limit))
+                if len(alive) == 0:
+                    break
+
+    cost = np.full(n, np.inf)
+    cost[alive] = partial_cost()
+    if thresholds is not None:
+        cost[alive[cost[alive] > limit]] = np.inf
+    return cost
+
+
+def _evaluate_parallel(executor, workers, candidates, thresholds, args):
+    if executor is None:
+        return evaluate(candidates, *args, thresholds=thresholds)
+    parts = np.array_split(np.arange(len(candidates)), workers)
+    futures = [executor.submit(evaluate, candidates[p], *args,
+                               thresholds=None if thresholds is None else thresholds[p])
+               for p in parts if len(p)]
+    return np.concatenate([f.result() for f in futures])
+
+
+def snap_to_sliders(params):
+    """Zaokrąglenie (kp, Ti, Td) do rozdzielczości suwaków aplikacji."""
+    snapped = []
+    for value, name in zip(params, ("kp", "Ti", "Td")):
+        value = round(value / SLIDER_STEPS[name]) * SLIDER_STEPS[name]
+        snapped.append(round(float(np.clip(value, *BOUNDS[name])), 1))
+    return snapped
+
+
+def autotune(vehicle_params, v_ref, v0=0.0, Tp=0.5, t_end=120.0, weights=None,
+             population=24, generations=40, mutation=0.7, crossover=0.9,
+             workers=None, time_budget=None, seed=None):
+    """
+    Dobór (kp, Ti, Td) minimalizujący ważony koszt odpowiedzi skokowej (DEFAULT_WEIGHTS).
+
+    workers: liczba procesów do równoległej oceny kandydatów (domyślnie liczba rdzeni,
+             ale nie więcej niż population // 8 – mniejsze paczki nie opłacają się);
+             1 – ocena w bieżącym procesie.
+    time_budget: opcjonalny limit czasu [s] – po jego przekroczeniu zwracany jest
+                 najlepszy dotąd znaleziony kandydat.
+
+    Koszt rośnie z population·generations·t_end/Tp: przy domyślnych ustawieniach (ok. 1000
+    ocen) na jednym rdzeniu ok. 0.5–1 s na preset, przy Tp = 0.1 s i t_end = 300 s ok. 6 s
+    (aplikacja przycina go przez time_budget).
+
+    Zwraca słownik: kp, Ti, Td (zaokrąglone do suwaków), cost, evaluations, pruned.
+    """
+    rng = np.random.default_rng(seed)
+    args = (vehicle_params, v_ref, v0, Tp, t_end, weights)
+    if workers is None:
+        workers = min(os.cpu_count() or 1, max(population // 8, 1))
+    start = time.perf_counter()
+
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        x = rng.random((population, 3))
+        cost = _evaluate_parallel(executor, workers, _to_params(x), None, args)
+        evaluations, pruned = population, 0
+
+        for _ in range(generations):
+            if time_budget is not None and time.perf_counter() - start > time_budget:
+                break
+            # Trzech różnych dawców (różnych od celu) dla każdego osobnika
+            order = rng.random((population, population))
+            order[np.arange(population), np.arange(population)] = np.inf
+            a, b, c = np.argsort(order, axis=1)[:, :3].T
+            mutant = np.clip(x[a] + mutation * (x[b] - x[c]), 0.0, 1.0)
+            cross = rng.random((population, 3)) < crossover
+            cross[np.arange(population), rng.integers(0, 3, population)] = True
+            trial = np.where(cross, mutant, x)
+
+            trial_cost = _evaluate_parallel(executor, workers, _to_params(trial), cost, args)
+            evaluations += population
+            pruned += int(np.isinf(trial_cost).sum())
+            better = trial_cost <= cost
+            x[better], cost[better] = trial[better], trial_cost[better]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    best = _to_params(x[[np.argmin(cost)]])[0]
+    kp, Ti, Td = snap_to_sliders(best)
+    final_cost = evaluate(np.array([[kp, Ti, Td]]), *args)[0]
+    return {"kp": kp, "Ti": Ti, "Td": Td, "cost": float(final_cost),
+            "evaluations": evaluations + 1, "pruned": pruned}
@@ -0,0 +1,137 @@
+import os
+import threading
+import uuid
+
+from cache import private_dir
+
+# =============================================================================
+# WYKONYWANIE SYMULACJI W TLE
+# =============================================================================
+# Callbacki w tle (Dash background callbacks) z kolejką na diskcache: każde zadanie
+# działa w osobnym procesie, ale proces powstaje dopiero, gdy zwolni się miejsce w puli
+# (TEMPOMAT_WORKERS zadań) i w limicie sesji (TEMPOMAT_USER_LIMIT) – oba liczone w procesie
+# serwera, więc przy kilku workerach WSGI limity dotyczą każdego z nich.
+# Do tego czasu zadanie czeka w kolejce serwera – jako wątek, nie jako proces.
+# Ponowne kliknięcie anuluje poprzednie zadanie (mechanizm oldJob w Dash), również
+# takie, które jeszcze czeka w kolejce.
+# Wymaga: pip install "dash[diskcache]" – bez tego callbacki działają synchronicznie.
+
+MAX_WORKERS = int(os.environ.get("TEMPOMAT_WORKERS", 0)) or os.cpu_count() or 1
+USER_LIMIT = int(os.environ.get("TEMPOMAT_USER_LIMIT", 1))
+RESULT_EXPIRE = 600  # [s] – wyniki zadań nieodebrane przez przeglądarkę
+SESSION_STATE = "session-id"  # komponent dcc.Store z identyfikatorem sesji
+
+try:
+    import diskcache
+    import multiprocess  # noqa: F401 – wymagane przez DiskcacheManager
+    import psutil
+    BACKGROUND_AVAILABLE = os.environ.get("TEMPOMAT_BACKGROUND", "1") != "0"
+except ImportError:
+    diskcache = psutil = None
+    BACKGROUND_AVAILABLE = False
+
+
+def _session_of(context):
+    """Identyfikator sesji z wartości State(SESSION_STATE, ...) wywołania (albo None)."""
+    for item in context.get("states_list") or []:
+        if isinstance(item, dict) and item.get("id") == SESSION_STATE:
+            return item.get("value")
+    return None
+
+
+def _pooled_manager(cache):
+    """DiskcacheManager, który uruchamia proces zadania dopiero po zajęciu miejsca w puli."""
+    from dash import DiskcacheManager
+    from multiprocess import Process
+
+    class PooledDiskcacheManager(DiskcacheManager):
+        """
+        Identyfikator zadania to klucz "job:<hex>" w diskcache (wspólnym dla procesów serwera):
+        ("queued", pid serwera) – czeka w kolejce, ("running", pid procesu) – liczy się.
+        """
+
+        def __init__(self, cache):
+            super().__init__(cache, expire=RESULT_EXPIRE)
+            self._pool = threading.BoundedSemaphore(MAX_WORKERS)
+            self._sessions = {}  # sesja -> [semafor, liczba zadań]
+            self._lock = threading.Lock()
+
+        def _session_slot(self, session_id):
+            with self._lock:
+                slot = self._sessions.setdefault(session_id, [threading.BoundedSemaphore(USER_LIMIT), 0])
+                slot[1] += 1
+                return slot[0]
+
+        def _release_session(self, session_id):
+            with self._lock:
+                slot = self._sessions[session_id]
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._sessions[session_id]
+
+        def call_job_fn(self, key, job_fn, args, context):
+            job = f"job:{uuid.uuid4().hex}"
+            self.handle.set(job, ("queued", os.getpid()))
+            thread = threading.Thread(target=self._dispatch, daemon=True,
+                                      args=(job, _session_of(context), key, job_fn, args, context))
+            thread.start()
+            return job
+
+        def _dispatch(self, job, session_id, key, job_fn, args, context):
+            # Najpierw limit sesji – czekające zadanie użytkownika nie blokuje miejsca w puli
+            user = self._session_slot(session_id) if session_id else None
+            try:
+                if user:
+                    user.acquire()
+                try:
+                    with self._pool:
+                        if self.handle.get(job) is None:  # anulowane w kolejce
+                            return
+                        process = Process(target=job_fn, args=(key, self._make_progress_key(key), args, context))
+                        process.start()
+                        with self.handle.transact():
+                            cancelled = self.handle.get(job) is None  # anulowane w trakcie startu
+                            if not cancelled:
+                                self.handle.set(job, ("running", process.pid))
+                        if cancelled:
+                            super().terminate_job(process.pid)
+                        process.join()
+                finally:
+                    if user:
+                        user.release()
+            finally:
+                if session_id:
+                    self._release_session(session_id)
+                self.handle.delete(job)
+
+        def job_running(self, job):
+            state = self.handle.get(str(job))
+            if state is None:
+                return False
+            status, pid = state
+            if not psutil.pid_exists(pid):  # serwer lub proces zadania padł
+                return False
+            return status == "queued" or psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+
+        def terminate_job(self, job):
+            if job is None:
+                return
+            with self.handle.transact():
+                state = self.handle.pop(str(job), None)
+            if state is not None and state[0] == "running":
+                super().terminate_job(state[1])
+
+        def terminate_unhealthy_job(self, job):
+            if self.handle.get(str(job)) is not None and not self.job_running(job):
+                self.terminate_job(job)
+                return True
+            return False
+
+    return PooledDiskcacheManager(cache)
+
+
+def background_manager():
+    """Menedżer callbacków w tle dla Dash(...) albo None, gdy tryb jest niedostępny."""
+    if not BACKGROUND_AVAILABLE:
+        return None
+    return _pooled_manager(diskcache.Cache(private_dir("background")))
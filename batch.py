@@ -0,0 +1,147 @@
+import numpy as np
+
+from core import V_MAX_REF, VehiclePlant, pid_control_batch, split_force_batch
+from metrics import SimulationResult
+from storage import CHANNELS
+
+# =============================================================================
+# WSADOWY SYMULATOR TEMPOMATU
+# =============================================================================
+# Ten sam model i regulator co CruiseControlSimulator – tablicowe odpowiedniki funkcji
+# z core.py (VehiclePlant.step_*_batch, pid_control_batch, split_force_batch): krok czasowy
+# wykonywany jest jednocześnie dla całej paczki zestawów parametrów (oś "batch").
+
+
+def _as_batch(*values):
+    """Rozgłasza skalary/tablice parametrów do wspólnego kształtu 1D (batch,)."""
+    arrays = np.broadcast_arrays(*[np.atleast_1d(np.asarray(x, dtype=float)) for x in values])
+    if arrays[0].ndim != 1:
+        raise ValueError("Parametry wsadowe muszą być skalarami lub tablicami 1D")
+    return [a.copy() for a in arrays]
+
+
+class BatchStepper:
+    """
+    Stan regulatora i pojazdu dla całej paczki symulacji.
+    Każde wywołanie step() to jeden okres próbkowania Tp (osobny dla każdego wiersza).
+    """
+
+    def __init__(self, kp, Ti, Td, Tp, mass, drag_coeff, max_traction, max_brake, v_ref, v0,
+                 integrator="exact"):
+        if integrator not in ("exact", "euler"):
+            raise ValueError(f"Nieznany integrator: {integrator}")
+        (self.kp, self.Ti, self.Td, self.Tp, self.mass, self.drag_coeff,
+         self.max_traction, self.max_brake, self.v_ref, v0) = _as_batch(
+            kp, Ti, Td, Tp, mass, drag_coeff, max_traction, max_brake, v_ref, v0)
+        self.integrator = integrator
+
+        self.v = v0
+        self.integral_sum = np.zeros_like(v0)
+        self.e_prev = (self.v_ref - v0) / V_MAX_REF
+        self.k = 0
+        self._precompute()
+
+    def __len__(self):
+        return self.v.shape[0]
+
+    def _precompute(self):
+        # Stałe wzmocnienia członów I i D i obiekt dla parametrów wszystkich wierszy
+        self.k_i = self.kp * (self.Tp / self.Ti)
+        self.k_d = self.kp * (self.Td / self.Tp)
+        self.plant = VehiclePlant(self.mass, self.drag_coeff)
+
+    def select(self, mask):
+        """Zostawia w paczce tylko wiersze wskazane maską/indeksami (np. odrzucenie kandydatów)."""
+        for name in ("kp", "Ti", "Td", "Tp", "mass", "drag_coeff", "max_traction", "max_brake",
+                     "v_ref", "v", "integral_sum", "e_prev"):
+            setattr(self, name, getattr(self, name)[mask])
+        self._precompute()
+
+    def advance(self, force):
+        """Przejście obiektu o jeden okres Tp przy stałej sile wypadkowej force."""
+        step = self.plant.step_euler_batch if self.integrator == "euler" else self.plant.step_exact_batch
+        self.v = step(self.v, force, self.Tp)
+        return self.v
+
+    def step(self):
+        """
+        Jeden okres regulatora dla całej paczki. Zwraca wielkości wyznaczone dla
+        bieżącej próbki: (e, delta_e, u, integral_sum, f_trac, f_brake).
+        """
+        return self.control((self.v_ref - self.v) / V_MAX_REF)
+
+    def control(self, e):
+        """Regulator PID dla uchybu e (już znormalizowanego) i przejście obiektu – jak step()."""
+        delta_e = e - self.e_prev if self.k > 0 else np.zeros_like(e)
+        u, self.integral_sum = pid_control_batch(e, delta_e, self.integral_sum, self.kp, self.k_i, self.k_d)
+        self.e_prev = e
+        f_trac, f_brake = split_force_batch(u, self.max_traction, self.max_brake)
+
+        self.advance(f_trac - f_brake)
+        self.k += 1
+        return e, delta_e, u, self.integral_sum, f_trac, f_brake
+
+
+def _run_group(stepper, n_steps, out, idx):
+    """
+    Przebieg paczki o wspólnej liczbie próbek – zapis wprost do out[kanał][idx, :n_steps],
+    tylko dla kanałów obecnych w out.
+    """
+    if len(idx) and idx[-1] - idx[0] == len(idx) - 1:
+        idx = slice(idx[0], idx[-1] + 1)  # wiersze kolejne – zapis bez indeksowania tablicą
+    # Kolejność jak w wyniku BatchStepper.step()
+    names = ("error", "derivative", "control", "integral", "traction", "brake")
+    stored = [(k, out[name]) for k, name in enumerate(names) if name in out]
+    velocity = out.get("velocity")
+
+    if velocity is not None:
+        velocity[idx, 0] = stepper.v
+    for i in range(1, n_steps):
+        values = stepper.step()
+        for k, arr in stored:
+            arr[idx, i - 1] = values[k]
+        if velocity is not None:
+            velocity[idx, i] = stepper.v
+
+    # Ostatnia próbka uzupełniana jak w wersji skalarnej
+    last = n_steps - 1
+    if "error" in out:
+        out["error"][idx, last] = (stepper.v_ref - stepper.v) / V_MAX_REF
+    for name in ("control", "traction", "brake", "integral", "derivative"):
+        if name in out:
+            out[name][idx, last] = out[name][idx, last - 1] if n_steps > 1 else 0.0
+
+
+def simulate_batch(kp, Ti, Td, Tp, mass, drag_coeff, max_traction, max_brake, v_ref, v0, t_end,
+                   integrator="exact", channels=CHANNELS):
+    """
+    Symulacja wielu zestawów parametrów naraz. Wszystkie argumenty mogą być skalarami
+    lub tablicami 1D o wspólnej długości (rozgłaszane jak w NumPy).
+
+    Zwraca słownik tablic o kształcie (batch, czas) z tymi samymi kluczami co
+    CruiseControlSimulator.simulate (metrics – tablice wskaźników po osi batch). Przy różnych
+    Tp / t_end wiersze mają różną liczbę próbek – nadmiarowe kolumny wypełnione są NaN,
+    a długości podaje "n_steps". channels – zapisywane przebiegi (podzbiór CHANNELS; mniej
+    pamięci, ale metrics wymaga velocity, a wskaźniki sterowania – control, traction, brake).
+    """
+    (kp, Ti, Td, Tp, mass, drag_coeff, max_traction, max_brake, v_ref, v0, t_end) = _as_batch(
+        kp, Ti, Td, Tp, mass, drag_coeff, max_traction, max_brake, v_ref, v0, t_end)
+    n_steps = (t_end / Tp).astype(int) + 1
+    batch, n_max = n_steps.shape[0], int(n_steps.max())
+
+    out = {name: np.full((batch, n_max), np.nan) for name in channels}
+
+    # Wiersze grupowane po liczbie próbek – żadna grupa nie liczy kroków "na pusto"
+    for n in np.unique(n_steps):
+        idx = np.flatnonzero(n_steps == n)
+        stepper = BatchStepper(kp[idx], Ti[idx], Td[idx], Tp[idx], mass[idx], drag_coeff[idx],
+                               max_traction[idx], max_brake[idx], v_ref[idx], v0[idx],
+                               integrator=integrator)
+        _run_group(stepper, int(n), out, idx)
+
+    columns = np.arange(n_max)
+    t = columns[None, :] * (t_end / np.maximum(n_steps - 1, 1))[:, None]
+    t[columns[None, :] >= n_steps[:, None]] = np.nan
+
+    out.update({"time": t, "v_ref": v_ref, "n_steps": n_steps})
+    return SimulationResult(out)
@@ -0,0 +1,243 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from core import VEHICLE_PRESETS, CruiseControlSimulator
+from model import simulate_cruise_control
+
+# =============================================================================
+# POMIARY WYDAJNOŚCI
+# =============================================================================
+# python benchmarks.py run -o baseline.json          – pomiar i zapis wyników
+# python benchmarks.py compare baseline.json         – pomiar i porównanie z bazą
+# python benchmarks.py compare baseline.json -c new.json --threshold 15
+# Kod wyjścia 1, gdy któryś pomiar pogorszył się o więcej niż threshold procent
+# albo import modułu przekroczył budżet czasu (zestaw "imports").
+
+TP_VALUES = (0.1, 0.5, 1.0)  # zakres suwaka Tp
+HORIZONS = (60, 300, 3600, 4 * 3600)  # [s] – od czasu z suwaka do kilku godzin
+QUICK_HORIZONS = (60, 300)
+DEFAULT_THRESHOLD = 10.0  # [%]
+DEFAULT_REPEAT = 5
+
+# Kierunek "lepiej" dla każdej wielkości: -1 – mniej znaczy lepiej, +1 – więcej znaczy lepiej
+METRICS = {"seconds": -1, "steps_per_s": +1, "peak_kb": -1, "json_kb": -1, "serialize_s": -1}
+MIN_SECONDS = 5e-3  # [s] – krótsze pomiary czasu są zbyt zaszumione, by je porównywać
+TIMED = {"seconds": "seconds", "steps_per_s": "seconds", "serialize_s": "serialize_s"}
+
+# Budżety czasu importu [s] (świeży interpreter, razem z NumPy / Dash). Moduły obliczeniowe
+# nie mogą wciągać warstwy WWW – procesy robocze i skrypty wsadowe płaciłyby za nią przy starcie.
+IMPORT_BUDGETS = {"core": 0.5, "batch": 0.5, "model": 0.5, "runner": 0.5, "montecarlo": 0.5,
+                  "stability": 0.5, "platoon": 0.5, "surrogate": 0.5, "main": 3.0}
+WEB_MODULES = ("dash", "plotly", "flask")
+
+
+def _measure(fn, repeat):
+    """Najkrótszy czas z repeat wywołań oraz szczyt pamięci z osobnego przebiegu."""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    # tracemalloc spowalnia alokacje – pamięć mierzona poza pomiarem czasu
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak / 1024
+
+
+def _cases(horizons):
+    for preset in VEHICLE_PRESETS:
+        for Tp in TP_VALUES:
+            for horizon in horizons:
+                yield preset, Tp, horizon
+
+
+def bench_model(horizons, repeat):
+    """model.simulate_cruise_control – parametry pojazdu z presetów (ku = napęd max, c1 = opór)."""
+    results = {}
+    for preset, Tp, horizon in _cases(horizons):
+        p = VEHICLE_PRESETS[preset]
+        N = int(horizon / Tp) + 1
+        _, seconds, peak = _measure(lambda: simulate_cruise_control(
+            v_set=25.0, kp=0.6, Ti=6.0, Tp=Tp, N=N, m=p["mass"], ku=p["max_traction"],
+            c1=p["drag_coeff"]), repeat)
+        results[f"model/{preset}/Tp={Tp}/T={horizon}"] = {
+            "steps": N, "seconds": seconds, "steps_per_s": N / seconds, "peak_kb": peak}
+    return results
+
+
+def bench_simulator(horizons, repeat, integrator="exact"):
+    """CruiseControlSimulator.simulate z nastawami domyślnymi aplikacji."""
+    results = {}
+    for preset, Tp, horizon in _cases(horizons):
+        sim = CruiseControlSimulator(VEHICLE_PRESETS[preset], 15, Tp, 5, 0.1)
+        _, seconds, peak = _measure(lambda: sim.simulate(25.0, 0.0, horizon, integrator=integrator), repeat)
+        steps = int(horizon / Tp) + 1
+        results[f"simulator-{integrator}/{preset}/Tp={Tp}/T={horizon}"] = {
+            "steps": steps, "seconds": seconds, "steps_per_s": steps / seconds, "peak_kb": peak}
+    return results
+
+
+def bench_figure(horizons, repeat):
+    """create_simulation_plots + serializacja do JSON (jak przy wysyłce do przeglądarki)."""
+    import plotly.io as pio
+    from main import create_simulation_plots
+
+    results = {}
+    for preset, Tp, horizon in _cases(horizons):
+        params = VEHICLE_PRESETS[preset]
+        res = CruiseControlSimulator(params, 15, Tp, 5, 0.1).simulate(25.0, 0.0, horizon)
+        fig, seconds, peak = _measure(lambda: create_simulation_plots(res, params, history=[res]), repeat)
+        payload, serialize_s, _ = _measure(lambda: pio.to_json(fig, validate=False), repeat)
+        results[f"figure/{preset}/Tp={Tp}/T={horizon}"] = {
+            "steps": len(res["time"]), "seconds": seconds, "peak_kb": peak,
+            "json_kb": len(payload) / 1024, "serialize_s": serialize_s}
+    return results
+
+
+_IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(seconds, ",".join(sorted({{m.split(".")[0] for m in sys.modules}} & set(sys.argv[1:]))))
+"""
+
+
+def bench_imports(horizons, repeat):
+    """Czas importu modułów w świeżym interpreterze i wciągnięte moduły warstwy WWW."""
+    results = {}
+    for module, budget in IMPORT_BUDGETS.items():
+        best, web = np.inf, ""
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE.format(module=module), *WEB_MODULES],
+                                 capture_output=True, text=True, check=True).stdout.split()
+            best, web = min(best, float(out[0])), (out[1] if len(out) > 1 else "")
+        results[f"import/{module}"] = {"seconds": best, "budget_s": budget, "web_modules": web}
+    return results
+
+
+def import_violations(results):
+    """Opisy przekroczeń budżetów importu (pusta lista – wszystko w normie)."""
+    problems = []
+    for name, r in results.items():
+        if not name.startswith("import/"):
+            continue
+        module = name[len("import/"):]
+        if r["seconds"] > r["budget_s"]:
+            problems.append(f"{module}: import {r['seconds']:.3f} s > budżet {r['budget_s']:g} s")
+        if r["web_modules"] and module != "main":
+            problems.append(f"{module}: importuje warstwę WWW ({r['web_modules']})")
+    return problems
+
+
+SUITES = {"model": bench_model, "simulator": bench_simulator, "figure": bench_figure, "imports": bench_imports}
+
+
+def run(suites=None, quick=False, repeat=DEFAULT_REPEAT, log=None):
+    horizons = QUICK_HORIZONS if quick else HORIZONS
+    results = {}
+    for name in suites or SUITES:
+        if log:
+            log(f"[{name}] ...")
+        results.update(SUITES[name](horizons, repeat))
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0], "numpy": np.__version__,
+            "platform": platform.platform(), "quick": quick, "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Lista (nazwa, wielkość, baza, bieżąca, zmiana w % na niekorzyść) dla pomiarów
+    wspólnych dla obu plików; regresja – zmiana większa niż threshold.
+    """
+    rows = []
+    for name, base in baseline["results"].items():
+        cur = current["results"].get(name)
+        if cur is None:
+            continue
+        for metric, direction in METRICS.items():
+            if metric not in base or metric not in cur:
+                continue
+            b, c = base[metric], cur[metric]
+            timed = TIMED.get(metric)
+            if b <= 0 or (timed and max(base[timed], cur[timed]) < MIN_SECONDS):
+                continue
+            worse = -direction * (c - b) / b * 100.0
+            rows.append((name, metric, b, c, worse))
+    return rows
+
+
+def _print_rows(rows, threshold):
+    width = max((len(r[0]) for r in rows), default=10)
+    for name, metric, b, c, worse in rows:
+        flag = "  REGRESJA" if worse > threshold else ""
+        print(f"{name:<{width}}  {metric:<12} {b:>12.4g} -> {c:>12.4g}  {-worse:+7.1f}%{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pomiary wydajności symulatora i wykresów")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="pomiar i zapis wyników do JSON")
+    cmp_p = sub.add_parser("compare", help="porównanie z bazowym plikiem JSON")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("-c", "--current", help="gotowy plik wyników (domyślnie nowy pomiar)")
+    cmp_p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                       help="dopuszczalne pogorszenie w procentach")
+    for p in (run_p, cmp_p):
+        p.add_argument("-o", "--output", help="plik JSON na wyniki bieżącego pomiaru")
+        p.add_argument("--suite", action="append", choices=list(SUITES), help="tylko wybrane zestawy")
+        p.add_argument("--quick", action="store_true", help="tylko krótkie horyzonty (60 i 300 s)")
+        p.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    args = parser.parse_args(argv)
+
+    log = lambda msg: print(msg, file=sys.stderr)  # noqa: E731
+    if args.command == "compare" and args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        current = run(args.suite, args.quick, args.repeat, log)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    violations = import_violations(current["results"])
+    for problem in violations:
+        print(f"BUDŻET IMPORTU: {problem}")
+
+    if args.command == "run":
+        for name, r in current["results"].items():
+            if "peak_kb" not in r:  # czas importu
+                print(f"{name:<40} {r['seconds'] * 1000:>9.2f} ms  (budżet {r['budget_s'] * 1000:.0f} ms)")
+                continue
+            extra = f"  {r['json_kb']:.0f} kB JSON / {r['serialize_s'] * 1000:.1f} ms" if "json_kb" in r else ""
+            rate = f"{r['steps_per_s']:>12.0f} kroków/s" if "steps_per_s" in r else " " * 20
+            print(f"{name:<40} {r['seconds'] * 1000:>9.2f} ms {rate}  {r['peak_kb']:>9.0f} kB{extra}")
+        return 1 if violations else 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    rows = compare(baseline, current, args.threshold)
+    _print_rows(rows, args.threshold)
+    regressions = [r for r in rows if r[4] > args.threshold]
+    print(f"\n{len(rows)} porównań, {len(regressions)} regresji (próg {args.threshold:g}%)")
+    return 1 if regressions or violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
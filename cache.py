@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import pickle
+import stat
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# =============================================================================
+# PAMIĘĆ PODRĘCZNA WYNIKÓW SYMULACJI
+# =============================================================================
+# Dwa poziomy: ograniczony rozmiarem w bajtach LRU w pamięci procesu oraz opcjonalny
+# katalog na dysku (przetrwa restart, współdzielony przez wiele procesów-workerów).
+# Poziom dyskowy czyta pickle, więc jego katalog musi być prywatny (private_dir) –
+# cudzy plik w katalogu oznaczałby wykonanie obcego kodu.
+
+DEFAULT_MAX_MB = 64
+DEFAULT_DISK_MAX_MB = 512
+DATA_DIR = os.environ.get("TEMPOMAT_DATA_DIR") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "tempomat")
+
+
+def private_dir(*parts):
+    """
+    Podkatalog DATA_DIR tylko dla bieżącego użytkownika (prawa 0700, tworzony w razie potrzeby).
+    RuntimeError, gdy katalog (lub DATA_DIR) należy do kogoś innego.
+    """
+    path = _checked_private(DATA_DIR)
+    for part in parts:
+        path = _checked_private(os.path.join(path, part))
+    return path
+
+
+def _checked_private(path):
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or (hasattr(os, "getuid") and st.st_uid != os.getuid()):
+        raise RuntimeError(f"Katalog {path} nie należy do bieżącego użytkownika")
+    if stat.S_IMODE(st.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+def canonical_key(**inputs):
+    """
+    Klucz niezależny od kolejności argumentów i zapisu liczb (15 == 15.0, 0.1 + 0.2 == 0.3).
+    """
+    canonical = {}
+    for name, value in inputs.items():
+        if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool):
+            value = round(float(value), 9)
+        canonical[name] = value
+    return json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+
+
+def estimate_size(value):
+    """Przybliżony rozmiar obiektu w bajtach (tablice NumPy liczone po nbytes)."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class SimulationCache:
+    """
+    Pamięć podręczna LRU z limitem rozmiaru (max_bytes) i opcjonalnym poziomem dyskowym.
+    Zapis na dysk jest atomowy (plik tymczasowy + os.replace), więc katalog może być
+    współdzielony przez kilka procesów serwera.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 2 ** 20, disk_dir=None,
+                 disk_max_bytes=DEFAULT_DISK_MAX_MB * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+        self._entries = OrderedDict()  # klucz -> (wartość, rozmiar)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._memory_put(key, value)
+        return value
+
+    def put(self, key, value):
+        self._memory_put(key, value)
+        self._disk_put(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    # -------------------------------------------------------------------------
+    # Poziom w pamięci
+    # -------------------------------------------------------------------------
+    def _memory_put(self, key, value):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+
+    # -------------------------------------------------------------------------
+    # Poziom dyskowy
+    # -------------------------------------------------------------------------
+    def _path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".pkl")
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                stored_key, value = pickle.load(f)
+            os.utime(path)  # znacznik LRU dla sprzątania katalogu
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return value if stored_key == key else None
+
+    def _disk_put(self, key, value):
+        if not self.disk_dir:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        if self.disk_max_bytes:
+            self._disk_evict()
+
+    def _disk_evict(self):
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".pkl"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.disk_dir, name))
+            except FileNotFoundError:  # usunięty równolegle przez inny proces
+                continue
+            files.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.disk_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def cache_from_env(default_disk_dir=None):
+    """
+    Konfiguracja przez zmienne środowiskowe:
+    TEMPOMAT_CACHE_MB – limit pamięci (domyślnie 64 MB, 0 wyłącza cache),
+    TEMPOMAT_CACHE_DIR – katalog poziomu dyskowego (domyślnie default_disk_dir; musi być
+    prywatny – sprawdzane jak w private_dir), TEMPOMAT_CACHE_DISK_MB – jego limit (domyślnie 512 MB).
+    """
+    disk_dir = os.environ.get("TEMPOMAT_CACHE_DIR") or default_disk_dir
+    return SimulationCache(
+        max_bytes=float(os.environ.get("TEMPOMAT_CACHE_MB", DEFAULT_MAX_MB)) * 2 ** 20,
+        disk_dir=_checked_private(disk_dir) if disk_dir else None,
+        disk_max_bytes=float(os.environ.get("TEMPOMAT_CACHE_DISK_MB", DEFAULT_DISK_MAX_MB)) * 2 ** 20,
+    )
@@ -0,0 +1,465 @@
+import math
+
+import numpy as np
+
+from integrators import AdaptiveIntegrator
+from metrics import SimulationResult
+from storage import STORE_BLOCK, write_result
+
+# Model pojazdu i regulatora bez zależności od Dash (tylko NumPy) – do użycia
+# w skryptach, procesach roboczych i obu aplikacjach (main.py, judasz.py).
+# Ten sam obiekt (VehiclePlant) służy CruiseControlSimulator, model.py i wsadowemu
+# BatchStepper (batch.py). Przejście obiektu i regulator mają wersję na liczbach (pętla
+# symulacji – zwykła arytmetyka float) i tablicową (*_batch) o tych samych działaniach
+# w tej samej kolejności – wyniki są identyczne bit w bit (tests/test_batch.py).
+
+V_MAX_REF = 50.0  # normalizacja uchybu
+
+
+# =============================================================================
+# JEDNOSTKI
+# =============================================================================
+def ms_to_kmh(v_ms): return v_ms * 3.6
+
+
+def kmh_to_ms(v_kmh): return v_kmh / 3.6
+
+
+# =============================================================================
+# PRESETY POJAZDÓW
+# =============================================================================
+VEHICLE_PRESETS = {
+    "city_car": {
+        "name": "🚗 Samochód osobowy",
+        "mass": 1200,  # kg
+        "drag_coeff": 50,  # współczynnik oporów ruchu
+        "max_traction": 3500,  # N
+        "max_brake": 7000,  # N
+        "color": "#FF6B35",  # turkusowy/pomarańczowy
+    },
+    "truck": {
+        "name": "🚛 Ciężarówka",
+        "mass": 25000,  # kg
+        "drag_coeff": 300,  # współczynnik oporów ruchu [N·s/m]
+        "max_traction": 40000,  # N
+        "max_brake": 80000,  # N
+        "color": "#FF6B35",  # pomarańczowy
+    },
+    "sports_car": {
+        "name": "🏎️ Samochód sportowy",
+        "mass": 1600,  # kg
+        "drag_coeff": 80,  # współczynnik oporów ruchu
+        "max_traction": 14000,  # N
+        "max_brake": 28000,  # N
+        "color": "#E63946",  # czerwony
+    }
+}
+
+
+# =============================================================================
+# MODEL POJAZDU I REGULATORY
+# =============================================================================
+class VehiclePlant:
+    """
+    Ruch wzdłużny: m·dv/dt = F - c1·v - c2·(v + w)·|v + w|, v >= 0, gdzie F – siła
+    napędu/hamowania pomniejszona o zakłócenia (stała w okresie próbkowania), w – wiatr
+    czołowy. Przejście o okres dt: step_exact (tylko c2 = 0), step_euler, step_adaptive –
+    na liczbach; step_exact_batch i step_euler_batch – na tablicach (paczka BatchStepper).
+    """
+
+    def __init__(self, mass, drag_coeff, quad_drag=0.0, rtol=1e-6, atol=1e-8):
+        self.mass = mass
+        self.drag_coeff = drag_coeff
+        self.quad_drag = quad_drag
+        self.adaptive = AdaptiveIntegrator(rtol, atol)  # stan i liczniki trybu "adaptive"
+        self._zoh = None  # (dt, b > 0, b lub 1, exp(-b·dt/m)) dla ostatniego dt
+
+    def resistance(self, v, wind=0.0):
+        f = self.drag_coeff * v
+        if self.quad_drag:
+            v_air = v + wind
+            f = f + self.quad_drag * v_air * abs(v_air)
+        return f
+
+    def zoh_coefficients(self, dt):
+        """
+        Współczynniki rozwiązania dokładnego dla okresu dt: (b > 0, b – albo 1 przy b = 0,
+        exp(-b·dt/m)). Liczone raz dla danego dt; parametry i dt mogą być tablicami.
+        """
+        if self._zoh is None or self._zoh[0] is not dt:
+            if np.any(self.quad_drag):
+                raise ValueError("Dyskretyzacja dokładna wymaga oporu liniowego (quad_drag = 0)")
+            has_drag = self.drag_coeff > 0
+            safe_b = np.where(has_drag, self.drag_coeff, 1.0)
+            decay = np.exp(-safe_b * dt / self.mass)
+            if decay.ndim == 0:  # zwykłe liczby – szybsza arytmetyka w step_exact
+                has_drag, safe_b, decay = bool(has_drag), float(safe_b), float(decay)
+            self._zoh = (dt, has_drag, safe_b, decay)
+        return self._zoh[1:]
+
+    def step_exact(self, v_start, force, dt):
+        """
+        Dokładne przejście o krok dt dla m·dv/dt = F - b·v przy sile stałej w okresie
+        próbkowania (ekstrapolator zerowego rzędu) – koszt O(1) niezależnie od dt.
+        """
+        has_drag, b, decay = self.zoh_coefficients(dt)
+        if has_drag:
+            v_inf = force / b
+            v_end = v_inf + (v_start - v_inf) * decay
+        else:
+            v_end = v_start + force * dt / self.mass
+        # Ograniczenie v >= 0: rozwiązanie jest monotoniczne w okresie, więc v_end < 0 oznacza
+        # zatrzymanie przed końcem kroku (przy F < 0) – pojazd stoi wtedy do końca okresu
+        return v_end if v_end > 0 else 0.0
+
+    def step_exact_batch(self, v_start, force, dt):
+        """step_exact dla tablic – parametry, v_start, force i dt rozgłaszane jak w NumPy."""
+        has_drag, safe_b, decay = self.zoh_coefficients(dt)
+        v_inf = force / safe_b
+        v_end = np.where(has_drag, v_inf + (v_start - v_inf) * decay, v_start + force * dt / self.mass)
+        return np.maximum(v_end, 0.0)
+
+    def step_euler(self, v_start, force, dt, dt_sim=0.001, wind=0.0):
+        """Metoda Eulera z podkrokiem dt_sim (dt_sim = dt – jeden krok na okres, jak w model.py)."""
+        v_current = v_start
+        n_substeps = int(dt / dt_sim)
+        b, c2 = self.drag_coeff, self.quad_drag
+        for _ in range(n_substeps):
+            f_drag = b * v_current
+            if c2:
+                v_air = v_current + wind
+                f_drag = f_drag + c2 * v_air * abs(v_air)
+            dv_dt = (force - f_drag) / self.mass
+            v_current = v_current + dv_dt * dt_sim
+            v_current = max(0, v_current)
+        return v_current
+
+    def step_euler_batch(self, v_start, force, dt, dt_sim=0.001):
+        """step_euler dla tablic (bez wiatru) – dt może być inne w każdym wierszu."""
+        v_current = v_start
+        n_substeps = (np.asarray(dt) / dt_sim).astype(int)
+        b, c2, m = self.drag_coeff, self.quad_drag, self.mass
+        quadratic = np.any(c2)
+        for j in range(int(n_substeps.max(initial=0))):
+            f_drag = b * v_current
+            if quadratic:
+                f_drag = f_drag + c2 * v_current * abs(v_current)
+            v_next = np.maximum(0.0, v_current + (force - f_drag) / m * dt_sim)
+            v_current = np.where(j < n_substeps, v_next, v_current)
+        return v_current
+
+    def step_adaptive(self, v_start, force, dt, wind=0.0, grade=None, x=0.0):
+        """
+        Dormand–Prince 5(4) ze zmiennym krokiem (granice kroków w chwilach próbkowania);
+        chwila zatrzymania v = 0 wyznaczana jako zdarzenie, dalej pojazd stoi do końca okresu.
+        grade(x): opcjonalna siła zależna od przejechanej drogi – stan to wtedy (v, x),
+        a wynik – para (v, x) zamiast samej prędkości.
+        """
+        m = self.mass
+        if grade is None:
+            if v_start <= 0 and force - self.resistance(0.0, wind) <= 0:
+                return 0.0  # postój – siła nie pokonuje zakłóceń
+
+            def rhs(t, v):
+                return (force - self.resistance(v, wind)) / m
+
+            _, v_end, stopped = self.adaptive.integrate(rhs, 0.0, v_start, dt, event=lambda v: v)
+            return 0.0 if stopped else v_end
+
+        if v_start <= 0 and force - self.resistance(0.0, wind) - grade(x) <= 0:
+            return 0.0, x
+
+        def rhs(t, y):
+            return np.array([(force - self.resistance(y[0], wind) - grade(y[1])) / m, y[0]])
+
+        _, y_end, stopped = self.adaptive.integrate(rhs, 0.0, np.array([v_start, x]), dt,
+                                                    event=lambda y: y[0])
+        return (0.0 if stopped else float(y_end[0])), float(y_end[1])
+
+
+class IncrementalPI:
+    """
+    Regulator PI w postaci przyrostowej (model.py): u = u_prev + kp·(Δe + Tp/Ti·e),
+    z nasyceniem do [u_min, u_max]. Wywołanie z uchybem e zwraca nowe sterowanie.
+    """
+
+    def __init__(self, kp, Ti, Tp, u_min=0.0, u_max=1.0):
+        self.kp = kp
+        self.Ti = Ti
+        self.Tp = Tp
+        self.u_min = u_min
+        self.u_max = u_max
+        self.u_prev = 0.0
+        self.e_prev = 0.0
+
+    def __call__(self, e):
+        delta_e = e - self.e_prev
+        u = self.u_prev + self.kp * (delta_e + (self.Tp / self.Ti) * e)
+        u = min(max(u, self.u_min), self.u_max)
+        self.u_prev, self.e_prev = u, e
+        return u
+
+
+def pid_control(e, delta_e, integral_sum, kp, k_i, k_d):
+    """
+    Regulator PID z nasyceniem do [-1, 1] i anti-windupem (k_i = kp·Tp/Ti, k_d = kp·Td/Tp):
+    suma uchybów rośnie tylko poza nasyceniem lub gdy uchyb z niego wyprowadza.
+    Zwraca (u, nowa suma).
+    """
+    u_raw = kp * e + k_i * integral_sum + k_d * delta_e
+    if abs(u_raw) < 1.0 or e * u_raw < 0:
+        integral_sum += e
+    return min(max(u_raw, -1.0), 1.0), integral_sum
+
+
+def pid_control_batch(e, delta_e, integral_sum, kp, k_i, k_d):
+    """pid_control dla tablic (paczka BatchStepper) – te same działania w tej samej kolejności."""
+    u_raw = kp * e + k_i * integral_sum + k_d * delta_e
+    integrate = (np.abs(u_raw) < 1.0) | (e * u_raw < 0)
+    return np.clip(u_raw, -1.0, 1.0), integral_sum + np.where(integrate, e, 0.0)
+
+
+def split_force(u, max_traction, max_brake):
+    """Podział sterowania u na siłę napędu i hamowania: (f_trac, f_brake)."""
+    if u >= 0:
+        return u * max_traction, 0.0
+    return 0.0, -u * max_brake
+
+
+def split_force_batch(u, max_traction, max_brake):
+    """split_force dla tablic."""
+    return np.where(u >= 0, u * max_traction, 0.0), np.where(u < 0, -u * max_brake, 0.0)
+
+
+# =============================================================================
+# KLASA SYMULACJI TEMPOMATU
+# =============================================================================
+# Parametry, względem których simulate(..., sensitivities=True) liczy pochodne prędkości
+SENSITIVITY_PARAMS = ("mass", "drag_coeff", "max_traction", "max_brake", "kp", "Ti", "Td")
+_M, _B, _FT, _FB, _KP, _TI, _TD = range(len(SENSITIVITY_PARAMS))
+
+
+class CruiseControlSimulator:
+    """
+    Symulator tempomatu z regulatorem PID i mechanizmem anti-windup.
+    Model oparty na równaniu: m·dv/dt = F_trac - F_brake - b·v
+    """
+
+    V_MAX_REF = V_MAX_REF
+
+    def __init__(self, vehicle_params, kp, Tp, Ti, Td):
+        self.mass = vehicle_params["mass"]
+        self.drag_coeff = vehicle_params["drag_coeff"]
+        self.max_traction = vehicle_params["max_traction"]
+        self.max_brake = vehicle_params["max_brake"]
+        self.kp = kp
+        self.Tp = Tp
+        self.Ti = Ti
+        self.Td = Td
+        self.plant = VehiclePlant(self.mass, self.drag_coeff)
+
+    @property
+    def adaptive(self):
+        """Stan i liczniki trybu "adaptive"."""
+        return self.plant.adaptive
+
+    def _integrator(self, integrator):
+        """
+        integrator: "exact" – dyskretyzacja dokładna (domyślnie),
+                    "euler" – metoda Eulera z podkrokiem 1 ms (tryb referencyjny),
+                    "adaptive" – Dormand–Prince ze zmiennym krokiem (self.adaptive).
+        """
+        if integrator == "exact":
+            return self.plant.step_exact
+        if integrator == "euler":
+            return self.plant.step_euler
+        if integrator == "adaptive":
+            return self.plant.step_adaptive
+        raise ValueError(f"Nieznany integrator: {integrator}")
+
+    def initial_state(self, v_ref, v0):
+        """Stan regulatora i pojazdu przed pierwszą próbką (słownik zgodny z JSON)."""
+        return {
+            "step": 0, "v": float(v0), "integral_sum": 0.0,
+            "e_prev": (v_ref - v0) / self.V_MAX_REF, "f_trac": 0.0, "f_brake": 0.0,
+            "u": 0.0, "delta_e": 0.0
+        }
+
+    def _control_step(self, state, v_ref, step):
+        """
+        Jeden okres próbkowania: regulator PID z anti-windupem i przejście obiektu.
+        Aktualizuje state w miejscu; zwraca (e, delta_e, u, integral_sum, f_trac, f_brake).
+        """
+        e = (v_ref - state["v"]) / self.V_MAX_REF
+        delta_e = e - state["e_prev"] if state["step"] > 0 else 0.0
+
+        u, integral_sum = pid_control(e, delta_e, state["integral_sum"], self.kp,
+                                      self.kp * (self.Tp / self.Ti), self.kp * (self.Td / self.Tp))
+        f_trac, f_brake = split_force(u, self.max_traction, self.max_brake)
+        state["integral_sum"], state["e_prev"] = integral_sum, e
+        state["f_trac"], state["f_brake"] = f_trac, f_brake
+        state["u"], state["delta_e"] = u, delta_e
+
+        state["v"] = step(state["v"], f_trac - f_brake, self.Tp)
+        state["step"] += 1
+        return e, delta_e, state["u"], state["integral_sum"], state["f_trac"], state["f_brake"]
+
+    def _sensitivities(self, v, e, delta_e, u, integral, force):
+        """
+        Pochodne prędkości względem SENSITIVITY_PARAMS – tablica (parametry, czas) – z przebiegu
+        simulate (integrator "exact"). Różniczkowane jest to samo odwzorowanie co w _control_step,
+        w gałęzi wybranej w danym okresie: w nasyceniu sterowanie nie zależy od parametrów,
+        przy zatrzymanym całkowaniu suma się nie zmienia, a pojazd, który stanął w trakcie okresu
+        (v = 0 na końcu przy F < 0), kończy go z v = 0 niezależnie od parametrów. Przełączenia
+        gałęzi nie mają pochodnej – wynik to pochodna jednostronna, z tej strony, którą wybiera
+        _control_step: przy |u_raw| = 1 dokładnie (np. city_car, kp = 5, duży skok) – strona
+        nasycenia (du = 0), przy u = 0 – strona napędu, przy v = 0 na końcu okresu i F < 0 –
+        strona postoju.
+
+        Stan x = (dv, dS, de_prev) spełnia x[k+1] = J[k]·x[k] + G[k], gdzie J i G zależą tylko
+        od przebiegu – liczone są wektorowo po czasie; w pętli zostaje jedno mnożenie 3×3.
+        """
+        kp, Tp, Ti, Td = self.kp, self.Tp, self.Ti, self.Td
+        m, b, V = self.mass, self.drag_coeff, self.V_MAX_REF
+        v_next = v[1:]
+        v, e, delta_e, u, force = v[:-1], e[:-1], delta_e[:-1], u[:-1], force[:-1]
+        integral_prev = np.concatenate([[0.0], integral[:-2]])  # suma przed aktualizacją
+        n = len(v)
+        k_I, k_D = kp * Tp / Ti, kp * Td / Tp
+
+        # Regulator: du = U_v·dv + U_s·dS + U_e·de_prev + jawne pochodne po kp, Ti, Td
+        u_raw = kp * e + k_I * integral_prev + k_D * delta_e
+        linear = (np.abs(u_raw) < 1.0).astype(float)
+        integrate = ((linear > 0) | (e * u_raw < 0)).astype(float)
+        d_on = np.ones(n)
+        d_on[0] = 0.0  # w pierwszym kroku delta_e = 0
+        U_v = -linear * (kp + k_D * d_on) / V
+        U_s = linear * k_I
+        U_e = -linear * k_D * d_on
+        explicit = np.zeros((n, len(SENSITIVITY_PARAMS)))
+        explicit[:, _KP] = linear * (e + Tp / Ti * integral_prev + Td / Tp * delta_e)
+        explicit[:, _TI] = -linear * kp * Tp / Ti ** 2 * integral_prev
+        explicit[:, _TD] = linear * kp / Tp * delta_e
+
+        # Siła: F = u·max_traction albo u·max_brake
+        traction = u >= 0
+        f_max = np.where(traction, self.max_traction, self.max_brake)
+        explicit_f = np.zeros_like(explicit)
+        explicit_f[:, _FT] = np.where(traction, u, 0.0)
+        explicit_f[:, _FB] = np.where(traction, 0.0, u)
+
+        # Obiekt: v' = a·v + c·F (rozwiązanie dokładne) i jego pochodne po m, b
+        explicit_v = np.zeros_like(explicit)
+        if b > 0:
+            a = math.exp(-b * Tp / m)
+            c = (1 - a) / b
+            v_inf = force / b
+            explicit_v[:, _B] = -force / b ** 2 * (1 - a) - (v - v_inf) * Tp / m * a
+            explicit_v[:, _M] = (v - v_inf) * b * Tp / m ** 2 * a
+        else:
+            a, c = 1.0, Tp / m
+            explicit_v[:, _B] = -force * Tp ** 2 / (2 * m ** 2) - v * Tp / m
+            explicit_v[:, _M] = -force * Tp / m ** 2
+        moving = (~((v_next == 0) & (force < 0))).astype(float)
+        gain = moving * c * f_max
+
+        J = np.zeros((n, 3, 3))
+        J[:, 0, 0] = moving * a + gain * U_v
+        J[:, 0, 1] = gain * U_s
+        J[:, 0, 2] = gain * U_e
+        J[:, 1, 0] = -integrate / V
+        J[:, 1, 1] = 1.0
+        J[:, 2, 0] = -1.0 / V
+        G = gain[:, None] * explicit + (moving * c)[:, None] * explicit_f + moving[:, None] * explicit_v
+
+        sens = np.zeros((n + 1, len(SENSITIVITY_PARAMS)))
+        x = np.zeros((3, len(SENSITIVITY_PARAMS)))
+        for k in range(n):
+            x = J[k] @ x
+            x[0] += G[k]
+            sens[k + 1] = x[0]
+        return sens.T
+
+    def simulate(self, v_ref, v0, t_end, integrator="exact", out_dir=None, channels=None,
+                 sensitivities=False):
+        """
+        out_dir: katalog na wyniki w plikach mapowanych w pamięci (storage.StoredResult)
+                 zamiast tablic w RAM – zapis blokami w trakcie symulacji;
+        channels: przy out_dir – lista kanałów albo słownik kanał -> dtype (domyślnie
+                  wszystkie, float32). Oś czasu nie jest zapisywana.
+        sensitivities: w tym samym przebiegu pochodne prędkości względem SENSITIVITY_PARAMS
+                  (wynik["sensitivity"][nazwa] – tablica jak "velocity"); tylko "exact", bez out_dir.
+        """
+        step = self._integrator(integrator)
+        n_steps = int(t_end / self.Tp) + 1
+        if sensitivities and (integrator != "exact" or out_dir is not None):
+            raise ValueError("Wrażliwości liczone są tylko dla integratora exact, bez out_dir")
+        if out_dir is not None:
+            chunks = self.simulate_chunks(v_ref, v0, t_end, STORE_BLOCK, integrator=integrator)
+            return write_result(out_dir, chunks, n_steps, t_end, v_ref, channels)
+
+        t = np.linspace(0, t_end, n_steps)
+        v = np.zeros(n_steps)
+        e = np.zeros(n_steps)
+        u = np.zeros(n_steps)
+        f_trac = np.zeros(n_steps)
+        f_brake = np.zeros(n_steps)
+        integral = np.zeros(n_steps)
+        derivative = np.zeros(n_steps)
+
+        state = self.initial_state(v_ref, v0)
+        v[0] = v0
+        for i in range(1, n_steps):
+            (e[i - 1], derivative[i - 1], u[i - 1], integral[i - 1],
+             f_trac[i - 1], f_brake[i - 1]) = self._control_step(state, v_ref, step)
+            v[i] = state["v"]
+
+        e[-1] = (v_ref - v[-1]) / self.V_MAX_REF
+        u[-1] = u[-2] if len(u) > 1 else 0
+        f_trac[-1] = f_trac[-2] if len(f_trac) > 1 else 0
+        f_brake[-1] = f_brake[-2] if len(f_brake) > 1 else 0
+        integral[-1] = state["integral_sum"]
+        derivative[-1] = derivative[-2] if len(derivative) > 1 else 0
+
+        # Wskaźniki jakości (res.metrics) liczone dopiero przy pierwszym odczycie
+        result = SimulationResult({
+            "time": t, "velocity": v, "error": e, "control": u,
+            "traction": f_trac, "brake": f_brake, "integral": integral,
+            "derivative": derivative, "v_ref": v_ref
+        })
+        if sensitivities:
+            sens = self._sensitivities(v, e, derivative, u, integral, f_trac - f_brake)
+            result["sensitivity"] = dict(zip(SENSITIVITY_PARAMS, sens))
+        return result
+
+    def simulate_chunks(self, v_ref, v0, t_end, chunk_size=1000, state=None, integrator="exact"):
+        """
+        Symulacja strumieniowa – generator bloków po chunk_size próbek z tymi samymi
+        kanałami co simulate (poza v_ref). Przebieg jest identyczny jak w simulate.
+
+        state: stan z initial_state / poprzedniego wywołania – pozwala wznowić symulację
+        od miejsca, w którym przerwano (jest aktualizowany w miejscu po każdym bloku).
+        """
+        step = self._integrator(integrator)
+        n_steps = int(t_end / self.Tp) + 1
+        dt_axis = t_end / (n_steps - 1) if n_steps > 1 else 0.0  # jak np.linspace w simulate
+        if state is None:
+            state = self.initial_state(v_ref, v0)
+
+        while state["step"] < n_steps:
+            k0 = state["step"]
+            k1 = min(k0 + chunk_size, n_steps)
+            v, e, u, f_trac, f_brake, integral, derivative = (np.empty(k1 - k0) for _ in range(7))
+            for j in range(k1 - k0):
+                v[j] = state["v"]
+                if state["step"] < n_steps - 1:
+                    (e[j], derivative[j], u[j], integral[j],
+                     f_trac[j], f_brake[j]) = self._control_step(state, v_ref, step)
+                else:
+                    # Ostatnia próbka – wielkości z poprzedniego okresu (jak w simulate)
+                    e[j] = (v_ref - state["v"]) / self.V_MAX_REF
+                    u[j], derivative[j], integral[j] = state["u"], state["delta_e"], state["integral_sum"]
+                    f_trac[j], f_brake[j] = state["f_trac"], state["f_brake"]
+                    state["step"] += 1
+            yield {"time": np.arange(k0, k1) * dt_axis, "velocity": v, "error": e, "control": u,
+                   "traction": f_trac, "brake": f_brake, "integral": integral, "derivative": derivative}
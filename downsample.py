@@ -0,0 +1,77 @@
+import numpy as np
+
+# =============================================================================
+# DECYMACJA PRZEBIEGÓW DO WYKRESÓW
+# =============================================================================
+# Przeglądarka nie potrzebuje więcej punktów niż pikseli – przebiegi są przerzedzane
+# po stronie serwera z zachowaniem kształtu (ekstrema / LTTB).
+
+MAX_POINTS_PER_TRACE = 4000  # budżet punktów na jeden przebieg
+WEBGL_THRESHOLD = 2000  # powyżej tej liczby punktów przebieg rysowany przez WebGL
+BLOCK_SAMPLES = 1 << 20  # próbek czytanych naraz (przebiegi w plikach mapowanych w pamięci)
+
+
+def minmax_indices(y, n_out):
+    """
+    Indeksy próbek zachowujące minimum i maksimum w każdym z n_out/2 przedziałów
+    (plus pierwsza i ostatnia próbka). Wektorowo, blokami po ok. BLOCK_SAMPLES próbek –
+    długi przebieg z pliku mapowanego w pamięci nie jest wczytywany w całości.
+    """
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    n_buckets = max((n_out - 2) // 2, 1)
+    size = -(-n // n_buckets)  # ceil
+    n_buckets = -(-n // size)
+    lo = np.empty(n_buckets, dtype=np.int64)
+    hi = np.empty(n_buckets, dtype=np.int64)
+    per_block = max(BLOCK_SAMPLES // size, 1)
+    for b0 in range(0, n_buckets, per_block):
+        b1 = min(b0 + per_block, n_buckets)
+        block = np.asarray(y[b0 * size:b1 * size])
+        block = np.pad(block, (0, (b1 - b0) * size - len(block)), mode="edge").reshape(b1 - b0, size)
+        lo[b0:b1] = block.argmin(axis=1)
+        hi[b0:b1] = block.argmax(axis=1)
+    offsets = np.arange(n_buckets) * size
+    idx = np.concatenate(([0], offsets + lo, offsets + hi, [n - 1]))
+    return np.unique(np.minimum(idx, n - 1))
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets (Steinarsson 2013) – indeksy n_out próbek."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    idx = np.empty(n_out, dtype=int)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Średnia następnego przedziału (dla ostatniego – ostatnia próbka)
+        nxt_stop = edges[i + 2] if i + 2 < len(edges) else n
+        x_avg = x[stop:nxt_stop].mean()
+        y_avg = y[stop:nxt_stop].mean()
+        # Punkt tworzący z poprzednio wybranym i średnią kolejnego największy trójkąt
+        area = np.abs((x[a] - x_avg) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (y_avg - y[a]))
+        a = start + int(area.argmax())
+        idx[i + 1] = a
+    return idx
+
+
+def downsample(x, y, max_points=MAX_POINTS_PER_TRACE, method="minmax"):
+    """Przerzedza przebieg (x, y) do co najwyżej max_points punktów."""
+    if max_points is None or len(y) <= max_points:
+        return x, y
+    if method == "minmax":
+        idx = minmax_indices(y, max_points)
+    elif method == "lttb":
+        idx = lttb_indices(x, y, max_points)
+    else:
+        raise ValueError(f"Nieznana metoda decymacji: {method}")
+    # Indeksowanie bez np.asarray – memmap / storage.ImplicitTime czytają tylko wybrane próbki
+    take = lambda a: np.asarray(a)[idx] if isinstance(a, (list, tuple)) else np.asarray(a[idx])  # noqa: E731
+    return take(x), take(y)
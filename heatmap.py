@@ -0,0 +1,71 @@
+import numpy as np
+
+from batch import BatchStepper
+from metrics import StepMetrics
+
+# =============================================================================
+# MAPA WSKAŹNIKÓW JAKOŚCI NA SIATCE NASTAW (kp × Ti)
+# =============================================================================
+# Cała siatka liczona jest jedną paczką BatchStepper, a wskaźniki zbierane blokami
+# (StepMetrics) – przebiegi nie są przechowywane. Siatki kolejnych poziomów są
+# zagnieżdżone (co drugi węzeł drobniejszej to węzeł grubszej), więc doprecyzowanie
+# liczy tylko nowe węzły. Wartości węzłów leżą na podziałce suwaków aplikacji.
+
+GRID = {"kp": (1.0, 49.0), "Ti": (0.2, 9.8)}
+LEVELS = (7, 13, 25)  # węzłów na oś na kolejnych poziomach
+METRICS = ("overshoot", "settling_time", "itae")
+BLOCK_STEPS = 256  # próbek na blok przy zbieraniu wskaźników
+
+
+def grid_axis(name, level):
+    """Węzły osi name ("kp" | "Ti") na poziomie level (zaokrąglone do 0.1 jak suwaki)."""
+    lo, hi = GRID[name]
+    return np.round(np.linspace(lo, hi, LEVELS[level]), 1)
+
+
+def evaluate_gains(vehicle_params, v_ref, v0, t_end, Tp, Td, kp, Ti, block=BLOCK_STEPS):
+    """Wskaźniki jakości (słownik tablic jak kp) dla par nastaw (kp[i], Ti[i]) przy wspólnym Td."""
+    kp = np.asarray(kp, dtype=float)
+    stepper = BatchStepper(kp, np.asarray(Ti, dtype=float), Td, Tp, vehicle_params["mass"],
+                           vehicle_params["drag_coeff"], vehicle_params["max_traction"],
+                           vehicle_params["max_brake"], v_ref, v0)
+    acc = StepMetrics(v_ref, np.full(len(stepper), float(v0)))
+    n_steps = int(t_end / Tp) + 1
+    dt = t_end / max(n_steps - 1, 1)
+    u, f_trac, f_brake = (np.zeros(len(stepper)) for _ in range(3))
+    for k0 in range(0, n_steps, block):
+        k1 = min(k0 + block, n_steps)
+        shape = (len(stepper), k1 - k0)
+        v, control, traction, brake = np.empty(shape), np.empty(shape), np.empty(shape), np.empty(shape)
+        for j, k in enumerate(range(k0, k1)):
+            v[:, j] = stepper.v
+            if k < n_steps - 1:
+                _, _, u, _, f_trac, f_brake = stepper.step()
+            # Ostatnia próbka – sterowanie z poprzedniego okresu (jak w simulate)
+            control[:, j], traction[:, j], brake[:, j] = u, f_trac, f_brake
+        acc.update(np.arange(k0, k1) * dt, v, control, traction, brake)
+    result = acc.result()
+    return {name: np.asarray(result[name]).reshape(kp.shape) for name in METRICS}
+
+
+def gain_map(vehicle_params, v_ref, v0, t_end, Tp, Td, level=0, previous=None):
+    """
+    Mapa wskaźników na siatce poziomu level: słownik z osiami "kp", "Ti" i tablicami
+    (len(Ti), len(kp)) dla każdego wskaźnika z METRICS.
+    previous – wynik poziomu level - 1; jego węzły nie są liczone ponownie.
+    """
+    kp, Ti = grid_axis("kp", level), grid_axis("Ti", level)
+    KP, TI = np.meshgrid(kp, Ti)
+    todo = np.ones(KP.shape, dtype=bool)
+    out = {"level": level, "kp": kp, "Ti": Ti}
+    for name in METRICS:
+        out[name] = np.full(KP.shape, np.nan)
+    if previous is not None:
+        for name in METRICS:
+            out[name][::2, ::2] = previous[name]
+        todo[::2, ::2] = False
+
+    values = evaluate_gains(vehicle_params, v_ref, v0, t_end, Tp, Td, KP[todo], TI[todo])
+    for name in METRICS:
+        out[name][todo] = values[name]
+    return out
@@ -0,0 +1,165 @@
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import time
+import uuid
+
+import numpy as np
+
+from cache import private_dir
+from storage import STORE_DTYPE
+
+# =============================================================================
+# HISTORIA PRZEBIEGÓW SESJI (PO STRONIE SERWERA)
+# =============================================================================
+# Każda sesja (session-id z przeglądarki) ma bufor cykliczny ostatnich HISTORY_RUNS
+# przebiegów: parametry w <id>.json i prędkość jako surowy float32 (storage.STORE_DTYPE)
+# w <id>.f32 – dopisywana blokami przy symulacji strumieniowej. Przeglądarka zna tylko
+# identyfikatory; do wykresu trafiają wybrane przebiegi, już przerzedzone.
+# Pliki w katalogu (a nie w pamięci procesu), bo symulacje liczą procesy w tle, a serwer
+# może mieć kilka workerów. Łączny rozmiar ograniczony jest przez HISTORY_MB – po
+# przekroczeniu usuwane są najdawniej zapisane przebiegi wszystkich sesji.
+# Rozmiar liczony jest w pamięci (licznik współdzielony z procesami zadań uruchamianymi
+# przez fork); katalog przeglądany jest tylko przy starcie i po przekroczeniu limitu.
+# Przy kilku workerach WSGI każdy ma własny licznik – limit jest wtedy przybliżony.
+
+HISTORY_DIR = os.environ.get("TEMPOMAT_HISTORY_DIR")  # domyślnie private_dir("history")
+HISTORY_RUNS = int(os.environ.get("TEMPOMAT_HISTORY_RUNS", 8))  # przebiegów na sesję
+HISTORY_MB = float(os.environ.get("TEMPOMAT_HISTORY_MB", 64))  # wszystkich sesji razem
+_ID = re.compile(r"[0-9a-f]{8,64}")
+
+
+class RunHistory:
+    """Bufor cykliczny przebiegów dla każdej sesji z limitem liczby przebiegów i bajtów."""
+
+    def __init__(self, directory=HISTORY_DIR, max_runs=HISTORY_RUNS, max_bytes=HISTORY_MB * 2 ** 20):
+        self.directory = directory or private_dir("history")
+        self.max_runs = max_runs
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._bytes = multiprocessing.Value("q", sum(size for *_, size in self._scan()))
+
+    def _session_dir(self, session_id):
+        # Identyfikatory przychodzą z przeglądarki – tylko szesnastkowe, bez ścieżek
+        if not isinstance(session_id, str) or not _ID.fullmatch(session_id):
+            raise ValueError("Niepoprawny identyfikator sesji")
+        return os.path.join(self.directory, session_id)
+
+    def _path(self, session_id, run_id, ext):
+        if not isinstance(run_id, str) or not _ID.fullmatch(run_id):
+            raise ValueError("Niepoprawny identyfikator przebiegu")
+        return os.path.join(self._session_dir(session_id), run_id + ext)
+
+    def add(self, session_id, params, t_end, n_steps, velocity):
+        """
+        Nowy przebieg sesji (velocity – całość albo pierwszy blok, reszta przez extend).
+        params – słownik parametrów do opisu; zwraca identyfikator przebiegu.
+        """
+        os.makedirs(self._session_dir(session_id), exist_ok=True)
+        # Identyfikatory rosną w czasie – kolejność sortowania to kolejność przebiegów
+        run_id = f"{time.time_ns():016x}{uuid.uuid4().hex[:8]}"
+        meta = json.dumps({"params": params, "t_end": float(t_end), "n_steps": int(n_steps),
+                           "created": time.time()})
+        self._append(session_id, run_id, velocity)
+        tmp_path = self._path(session_id, run_id, ".json.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(meta)
+        os.replace(tmp_path, self._path(session_id, run_id, ".json"))
+        self._grow(len(meta))
+
+        for old in self.run_ids(session_id)[:-self.max_runs]:
+            self._remove(session_id, old)
+        self._evict()
+        return run_id
+
+    def extend(self, session_id, run_id, velocity):
+        """Dopisanie kolejnego bloku prędkości (symulacja strumieniowa)."""
+        self._append(session_id, run_id, velocity)
+        self._evict()
+
+    def _append(self, session_id, run_id, velocity):
+        data = np.ascontiguousarray(velocity, dtype=STORE_DTYPE).tobytes()
+        with open(self._path(session_id, run_id, ".f32"), "ab") as f:
+            f.write(data)
+        self._grow(len(data))
+
+    def run_ids(self, session_id):
+        """Identyfikatory przebiegów sesji od najstarszego."""
+        try:
+            names = os.listdir(self._session_dir(session_id))
+        except (FileNotFoundError, ValueError):
+            return []
+        return sorted(name[:-len(".json")] for name in names if name.endswith(".json"))
+
+    def runs(self, session_id):
+        """Opisy przebiegów sesji od najstarszego: [{"id", "params", "t_end", "n_steps", "created"}, ...]."""
+        out = []
+        for run_id in self.run_ids(session_id):
+            try:
+                with open(self._path(session_id, run_id, ".json")) as f:
+                    out.append({"id": run_id, **json.load(f)})
+            except (OSError, ValueError):  # usunięty równolegle
+                continue
+        return out
+
+    def load(self, session_id, run_id):
+        """(czas, prędkość float32) albo None; przebieg strumieniowy – tylko zapisana część."""
+        try:
+            with open(self._path(session_id, run_id, ".json")) as f:
+                meta = json.load(f)
+            velocity = np.fromfile(self._path(session_id, run_id, ".f32"), dtype=STORE_DTYPE)
+        except (OSError, ValueError):
+            return None
+        dt = meta["t_end"] / max(meta["n_steps"] - 1, 1)
+        return np.arange(len(velocity)) * dt, velocity
+
+    def _grow(self, size):
+        with self._bytes.get_lock():
+            self._bytes.value += size
+
+    def _remove(self, session_id, run_id):
+        for ext in (".json", ".f32"):
+            try:
+                path = self._path(session_id, run_id, ext)
+                size = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._grow(-size)
+
+    def _scan(self):
+        """Wszystkie przebiegi: [(id, sesja, rozmiar w bajtach), ...]."""
+        files = []
+        for session_id in os.listdir(self.directory):
+            if not _ID.fullmatch(session_id):
+                continue
+            for run_id in self.run_ids(session_id):
+                try:
+                    size = sum(os.path.getsize(self._path(session_id, run_id, ext)) for ext in (".json", ".f32"))
+                except FileNotFoundError:
+                    continue
+                files.append((run_id, session_id, size))
+        return files
+
+    def _evict(self):
+        """Po przekroczeniu max_bytes usuwa najstarsze przebiegi (wszystkich sesji)."""
+        if self._bytes.value <= self.max_bytes:
+            return
+        files = self._scan()  # stan faktyczny – pliki mogły dopisać inne procesy
+        total = sum(size for *_, size in files)
+        for run_id, session_id, size in sorted(files):
+            if total <= self.max_bytes:
+                break
+            self._remove(session_id, run_id)
+            total -= size
+            if not self.run_ids(session_id):
+                shutil.rmtree(self._session_dir(session_id), ignore_errors=True)
+        with self._bytes.get_lock():
+            self._bytes.value = total
+
+    def stats(self):
+        sessions = [s for s in os.listdir(self.directory) if _ID.fullmatch(s)]
+        return {"sessions": len(sessions), "runs": sum(len(self.run_ids(s)) for s in sessions),
+                "bytes": self._bytes.value, "max_runs": self.max_runs, "max_bytes": self.max_bytes}
@@ -0,0 +1,146 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# =============================================================================
+# POMIAR CZASU ETAPÓW OBSŁUGI ŻĄDAŃ
+# =============================================================================
+# TEMPOMAT_INSTRUMENT=1 włącza pomiar etapów (stage("simulate"), stage("figure"), ...):
+# - nagłówek Server-Timing w odpowiedzi (widoczny w narzędziach deweloperskich przeglądarki),
+#   z etapem "dash" = czas żądania poza zmierzonymi etapami (serializacja JSON, narzut Dash),
+# - histogramy w formacie Prometheus pod /metrics.
+# TEMPOMAT_PROFILE=1 dodatkowo próbkuje stos wątku w etapach oznaczonych profile=True
+# (zagregowane stosy w formacie "folded" dla flamegraph.pl / speedscope pod /metrics/profile).
+# Domyślnie wyłączone – stage() zwraca wtedy pusty kontekst.
+# Callbacki w tle (background.py) działają w osobnych procesach – ich etapy nie trafiają
+# do nagłówków ani /metrics; do pomiarów można uruchomić aplikację z TEMPOMAT_BACKGROUND=0.
+
+ENABLED = os.environ.get("TEMPOMAT_INSTRUMENT", "0") == "1"
+PROFILE_ENABLED = ENABLED and os.environ.get("TEMPOMAT_PROFILE", "0") == "1"
+PROFILE_INTERVAL = float(os.environ.get("TEMPOMAT_PROFILE_INTERVAL_MS", 1.0)) / 1000
+PROFILE_MAX_DEPTH = 40
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # [s]
+
+_NULL = nullcontext()
+_local = threading.local()
+_lock = threading.Lock()
+_histograms = {}  # etap -> [liczności kubełków..., suma, liczba]
+_profile = Counter()  # stos "folded" -> liczba próbek
+
+
+def _observe(name, seconds):
+    with _lock:
+        h = _histograms.get(name)
+        if h is None:
+            h = _histograms[name] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                h[i] += 1
+        h[-2] += seconds
+        h[-1] += 1
+
+
+class _Sampler(threading.Thread):
+    """Próbkowanie stosu wskazanego wątku co PROFILE_INTERVAL (bez instrumentacji kodu)."""
+
+    def __init__(self, thread_id):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.done = threading.Event()
+        self.samples = Counter()
+
+    def run(self):
+        while not self.done.wait(PROFILE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+
+@contextmanager
+def _stage(name, profile):
+    sampler = None
+    if profile and PROFILE_ENABLED:
+        sampler = _Sampler(threading.get_ident())
+        sampler.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if sampler is not None:
+            sampler.done.set()
+            sampler.join()
+            with _lock:
+                _profile.update(sampler.samples)
+        _observe(name, seconds)
+        timings = getattr(_local, "timings", None)
+        if timings is not None:
+            timings.append((name, seconds))
+
+
+def stage(name, profile=False):
+    """Kontekst mierzący czas etapu name (profile=True – także próbkowanie stosu)."""
+    if not ENABLED:
+        return _NULL
+    return _stage(name, profile)
+
+
+def prometheus_text():
+    """Histogramy etapów w formacie tekstowym Prometheus (0.0.4)."""
+    lines = ["# HELP tempomat_stage_seconds Czas etapów obsługi żądań",
+             "# TYPE tempomat_stage_seconds histogram"]
+    with _lock:
+        histograms = {name: list(h) for name, h in _histograms.items()}
+    for name, h in sorted(histograms.items()):
+        for bound, count in zip(BUCKETS, h):
+            lines.append(f'tempomat_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+        lines.append(f'tempomat_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {h[-1]}')
+        lines.append(f'tempomat_stage_seconds_sum{{stage="{name}"}} {h[-2]}')
+        lines.append(f'tempomat_stage_seconds_count{{stage="{name}"}} {h[-1]}')
+    return "\n".join(lines) + "\n"
+
+
+def profile_text():
+    with _lock:
+        return "".join(f"{stack} {count}\n" for stack, count in _profile.most_common())
+
+
+def install(server):
+    """Podpięcie pomiarów do serwera Flask aplikacji (bez TEMPOMAT_INSTRUMENT=1 – nic nie robi)."""
+    if not ENABLED:
+        return
+
+    @server.before_request
+    def _start_request():
+        _local.timings = []
+        _local.start = time.perf_counter()
+
+    @server.after_request
+    def _server_timing(response):
+        timings = getattr(_local, "timings", None)
+        if timings is None:
+            return response
+        total = time.perf_counter() - _local.start
+        _local.timings = None
+        if timings:
+            # Czas poza etapami: dekodowanie wejścia, serializacja wyniku, narzut Dash
+            other = max(total - sum(seconds for _, seconds in timings), 0.0)
+            timings = timings + [("dash", other)]
+            _observe("dash", other)
+            response.headers["Server-Timing"] = ", ".join(
+                f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings)
+        return response
+
+    server.add_url_rule("/metrics", "metrics", lambda: (prometheus_text(), 200, {
+        "Content-Type": "text/plain; version=0.0.4; charset=utf-8"}))
+    server.add_url_rule("/metrics/profile", "metrics_profile", lambda: (profile_text(), 200, {
+        "Content-Type": "text/plain; charset=utf-8"}))
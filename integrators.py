@@ -0,0 +1,134 @@
+import math
+
+import numpy as np
+
+# =============================================================================
+# CAŁKOWANIE ZE ZMIENNYM KROKIEM
+# =============================================================================
+# Metoda Dormanda–Prince'a 5(4) z kontrolą błędu (Hairer, Nørsett, Wanner – ODE I, II.5).
+# Chwile próbkowania regulatora są twardymi granicami całkowania: krok nigdy ich nie
+# przekracza, a długość ostatniego udanego kroku przechodzi na kolejny okres, więc
+# przy ustalonej jeździe jeden krok obejmuje cały okres Tp. Zdarzenia (np. v = 0)
+# lokalizowane są na interpolacji gęstej rzędu 4.
+
+C2, C3, C4, C5 = 1 / 5, 3 / 10, 4 / 5, 8 / 9
+A21 = 1 / 5
+A31, A32 = 3 / 40, 9 / 40
+A41, A42, A43 = 44 / 45, -56 / 15, 32 / 9
+A51, A52, A53, A54 = 19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729
+A61, A62, A63, A64, A65 = 9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656
+B1, B3, B4, B5, B6 = 35 / 384, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84
+# Różnica rozwiązań rzędu 5 i 4 (szacowanie błędu lokalnego)
+E1, E3, E4, E5, E6, E7 = 71 / 57600, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40
+# Interpolacja gęsta (Shampine): y(t + θh) = y + h·Σ k_i·(P_i · [θ, θ², θ³, θ⁴])
+P = np.array([
+    [1, -8048581381 / 2820520608, 8663915743 / 2820520608, -12715105075 / 11282082432],
+    [0, 131558114200 / 32700410799, -68118460800 / 10900136933, 87487479700 / 32700410799],
+    [0, -1754552775 / 470086768, 14199869525 / 1410260304, -10690763975 / 1880347072],
+    [0, 127303824393 / 49829197408, -318862633887 / 49829197408, 701980252875 / 199316789632],
+    [0, -282668133 / 205662961, 2019193451 / 616988883, -1453857185 / 822651844],
+    [0, 40617522 / 29380423, -110615467 / 29380423, 69997945 / 29380423],
+])  # wiersze dla k1, k3, k4, k5, k6, k7 (k2 ma zerowe współczynniki)
+
+SAFETY = 0.9
+MIN_FACTOR, MAX_FACTOR = 0.2, 10.0
+EVENT_TOL = 1e-12  # względna dokładność położenia zdarzenia w kroku
+
+
+class AdaptiveIntegrator:
+    """
+    Całkowanie dy/dt = f(t, y) odcinkami [t0, t1] (y – liczba lub mała tablica).
+    Liczniki n_eval / n_steps / n_rejected sumują się po wszystkich wywołaniach.
+    """
+
+    def __init__(self, rtol=1e-6, atol=1e-8, h_init=None, h_max=math.inf):
+        self.rtol = rtol
+        self.atol = atol
+        self.h = h_init
+        self.h_max = h_max
+        self.n_eval = 0
+        self.n_steps = 0
+        self.n_rejected = 0
+
+    def _error_norm(self, err, y, y_new):
+        if isinstance(err, float):  # układ skalarny – bez narzutu wywołań NumPy
+            return abs(err) / (self.atol + self.rtol * max(abs(y), abs(y_new)))
+        scale = self.atol + self.rtol * np.maximum(np.abs(y), np.abs(y_new))
+        return float(np.max(np.abs(err) / scale))
+
+    def _initial_step(self, f, t0, y0, f0, span):
+        """Pierwszy krok z oszacowania skali rozwiązania i pochodnej (ODE I, II.4)."""
+        scale = self.atol + self.rtol * np.abs(y0)
+        d0 = float(np.max(np.abs(y0) / scale))
+        d1 = float(np.max(np.abs(f0) / scale))
+        h0 = 1e-6 if d0 < 1e-5 or d1 < 1e-5 else 0.01 * d0 / d1
+        h0 = min(h0, span)
+        f1 = f(t0 + h0, y0 + h0 * f0)
+        self.n_eval += 1
+        d2 = float(np.max(np.abs(f1 - f0) / scale)) / h0
+        h1 = max(1e-6, h0 * 1e-3) if max(d1, d2) <= 1e-15 else (0.01 / max(d1, d2)) ** (1 / 5)
+        return min(100 * h0, h1, span)
+
+    def integrate(self, f, t0, y0, t1, event=None):
+        """
+        Całkowanie od t0 do t1 (t1 – twarda granica, np. następna chwila próbkowania).
+
+        event(y): opcjonalna funkcja zdarzenia – całkowanie kończy się, gdy zmieni ona
+        znak z dodatniego na ujemny (lub osiągnie zero).
+        Zwraca (t, y, hit): hit=True oznacza zatrzymanie w chwili zdarzenia t < t1.
+        """
+        t, y = t0, y0
+        k1 = f(t, y)
+        self.n_eval += 1
+        if self.h is None:
+            self.h = self._initial_step(f, t0, y0, k1, t1 - t0)
+
+        while t < t1:
+            h = min(self.h, self.h_max)
+            last = h >= t1 - t
+            if last:
+                h = t1 - t
+            k2 = f(t + C2 * h, y + h * A21 * k1)
+            k3 = f(t + C3 * h, y + h * (A31 * k1 + A32 * k2))
+            k4 = f(t + C4 * h, y + h * (A41 * k1 + A42 * k2 + A43 * k3))
+            k5 = f(t + C5 * h, y + h * (A51 * k1 + A52 * k2 + A53 * k3 + A54 * k4))
+            k6 = f(t + h, y + h * (A61 * k1 + A62 * k2 + A63 * k3 + A64 * k4 + A65 * k5))
+            y_new = y + h * (B1 * k1 + B3 * k3 + B4 * k4 + B5 * k5 + B6 * k6)
+            k7 = f(t + h, y_new)  # FSAL – pierwszy etap następnego kroku
+            self.n_eval += 6
+
+            err = h * (E1 * k1 + E3 * k3 + E4 * k4 + E5 * k5 + E6 * k6 + E7 * k7)
+            norm = self._error_norm(err, y, y_new)
+            if norm > 1.0:
+                self.h = h * max(MIN_FACTOR, SAFETY * norm ** -0.2)
+                self.n_rejected += 1
+                continue
+
+            self.n_steps += 1
+            factor = MAX_FACTOR if norm == 0 else min(MAX_FACTOR, SAFETY * norm ** -0.2)
+            # Krok skrócony do granicy przedziału nie zmniejsza kroku dla kolejnego okresu
+            self.h = max(self.h, h * factor) if last else h * factor
+
+            if event is not None and event(y_new) <= 0 < event(y):
+                K = (k1, k3, k4, k5, k6, k7)
+                theta = self._locate(event, y, h, K)
+                return t + theta * h, self._dense(y, h, K, theta), True
+            t = t1 if last else t + h
+            y, k1 = y_new, k7
+        return t, y, False
+
+    @staticmethod
+    def _dense(y, h, K, theta):
+        weights = P @ np.array([theta, theta ** 2, theta ** 3, theta ** 4])
+        return y + h * sum(w * k for w, k in zip(weights, K))
+
+    def _locate(self, event, y, h, K):
+        """Położenie zdarzenia w kroku (ułamek θ ∈ (0, 1]) – bisekcja na interpolacji gęstej."""
+        lo, hi = 0.0, 1.0
+        while hi - lo > EVENT_TOL:
+            mid = 0.5 * (lo + hi)
+            if event(self._dense(y, h, K, mid)) > 0:
+                lo = mid
+            else:
+                hi = mid
+        return hi
@@ -1,150 +1,106 @@
+import time
+import uuid
+from functools import lru_cache
+
 import numpy as np
-from dash import Dash, html, dcc, callback, Output, Input, State
+from dash import Dash, html, dcc, callback, Output, Input, State, Patch, no_update
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from api import install as install_api
+from autotune import autotune
+from background import BACKGROUND_AVAILABLE, background_manager
+from cache import cache_from_env, canonical_key, private_dir
+from core import VEHICLE_PRESETS, CruiseControlSimulator, kmh_to_ms, ms_to_kmh
+from downsample import MAX_POINTS_PER_TRACE, WEBGL_THRESHOLD, downsample
+from heatmap import LEVELS, gain_map
+from history import HISTORY_RUNS, RunHistory
+from instrumentation import install as install_instrumentation, stage
+from metrics import StepMetrics
+from montecarlo import monte_carlo
+from surrogate import load_surrogate
+
 # =============================================================================
-# PRESETY POJAZDÓW
+# KONWERSJE I WYKRESY
 # =============================================================================
-VEHICLE_PRESETS = {
-    "city_car": {
-        "name": "🚗 Samochód osobowy",
-        "mass": 1200,  # kgdescription": "Wysokowydajny pojazd sportowy - szybka reakcja"
-        "drag_coeff": 50,  # współczynnik oporów ruchu
-        "max_traction": 3500,  # N
-        "max_brake": 7000,  # N
-        "color": "#FF6B35",  # turkusowy
-    },
-    "truck": {
-        "name": "🚛 Ciężarówka",
-        "mass": 25000,  # kg
-        "drag_coeff": 300,  # współczynnik oporów ruchu [N·s/m]
-        "max_traction": 40000,  # N
-        "max_brake": 80000,  # N
-        "color": "#FF6B35",  # pomarańczowy
-    },
-    "sports_car": {
-        "name": "🏎️ Samochód sportowy",
-        "mass": 1600,  # kg
-        "drag_coeff": 80,  # współczynnik oporów ruchu
-        "max_traction": 14000,  # N
-        "max_brake": 28000,  # N
-        "color": "#E63946",  # czerwony
-    }
-}
+# Stała kolejność przebiegów – aktualizacje częściowe (Patch) odwołują się do indeksów
+# Przebiegi z historii sesji (pod bieżącym) – po jednym miejscu na każdy przebieg bufora
+TRACE_HISTORY = tuple(range(HISTORY_RUNS))
+TRACE_VELOCITY, TRACE_SETPOINT, TRACE_TRACTION, TRACE_BRAKE, TRACE_DRAG, TRACE_PREVIEW = range(HISTORY_RUNS, HISTORY_RUNS + 6)
+HISTORY_COLORS = ('#6C757D', '#8D99AE', '#A8DADC', '#B5838D', '#CDB4DB', '#90A955', '#F4A261', '#6D6875')
 
 
-# =============================================================================
-# KLASA SYMULACJI TEMPOMATU
-# =============================================================================
-class CruiseControlSimulator:
+def _series(x, y, max_points, convert=None):
     """
-    Symulator tempomatu z regulatorem PID i mechanizmem anti-windup.
-    Model oparty na równaniu: m·dv/dt = F_trac - F_brake - b·v
+    Przebieg przerzedzony do budżetu punktów; długie serie rysowane przez WebGL.
+    convert (np. ms_to_kmh) stosowane dopiero po przerzedzeniu – przebiegi z plików
+    mapowanych w pamięci (storage.py) czytane są tylko w wybranych próbkach.
     """
+    x, y = downsample(x, y, max_points)
+    if convert is not None:
+        y = convert(y)
+    return {"x": np.asarray(x), "y": y, "type": "scattergl" if len(x) > WEBGL_THRESHOLD else "scatter"}
 
-    def __init__(self, vehicle_params, kp, Tp, Ti, Td):
-        self.mass = vehicle_params["mass"]
-        self.drag_coeff = vehicle_params["drag_coeff"]
-        self.max_traction = vehicle_params["max_traction"]
-        self.max_brake = vehicle_params["max_brake"]
-        self.kp = kp
-        self.Tp = Tp
-        self.Ti = Ti
-        self.Td = Td
-
-    def simulate(self, v_ref, v0, t_end):
-        dt = self.Tp
-        dt_sim = 0.001
-        n_steps = int(t_end / dt) + 1
-
-        t = np.linspace(0, t_end, n_steps)
-        v = np.zeros(n_steps)
-        e = np.zeros(n_steps)
-        u = np.zeros(n_steps)
-        f_trac = np.zeros(n_steps)
-        f_brake = np.zeros(n_steps)
-        integral = np.zeros(n_steps)
-        derivative = np.zeros(n_steps)
-
-        v[0] = v0
-        integral_sum = 0.0
-        v_max_ref = 50.0  # normalizacja
-        e_prev = (v_ref - v0) / v_max_ref
-
-        for i in range(1, n_steps):
-            e_raw = v_ref - v[i - 1]
-            e[i - 1] = e_raw / v_max_ref
-
-            delta_e = e[i - 1] - e_prev if i > 1 else 0.0
-            derivative[i - 1] = delta_e
-
-            u_P = self.kp * e[i - 1]
-            u_I = self.kp * (self.Tp / self.Ti) * integral_sum
-            u_D = self.kp * (self.Td / self.Tp) * delta_e
-
-            u_raw = u_P + u_I + u_D
-            u_normalized = u_raw
-
-            u[i - 1] = np.clip(u_normalized, -1.0, 1.0)
-
-            if abs(u_normalized) < 1.0 or (e[i - 1] * u_normalized < 0):
-                integral_sum += e[i - 1]
-
-            integral[i - 1] = integral_sum
-            e_prev = e[i - 1]
-
-            if u[i - 1] >= 0:
-                f_trac[i - 1] = u[i - 1] * self.max_traction
-                f_brake[i - 1] = 0
-            else:
-                f_trac[i - 1] = 0
-                f_brake[i - 1] = -u[i - 1] * self.max_brake
-
-            v_current = v[i - 1]
-            n_substeps = int(dt / dt_sim)
-            for _ in range(n_substeps):
-                f_drag = self.drag_coeff * v_current
-                dv_dt = (f_trac[i - 1] - f_brake[i - 1] - f_drag) / self.mass
-                v_current = v_current + dv_dt * dt_sim
-                v_current = max(0, v_current)
-            v[i] = v_current
-
-        e[-1] = (v_ref - v[-1]) / v_max_ref
-        u[-1] = u[-2] if len(u) > 1 else 0
-        f_trac[-1] = f_trac[-2] if len(f_trac) > 1 else 0
-        f_brake[-1] = f_brake[-2] if len(f_brake) > 1 else 0
-        integral[-1] = integral_sum
-        derivative[-1] = derivative[-2] if len(derivative) > 1 else 0
-
-        return {
-            "time": t, "velocity": v, "error": e, "control": u,
-            "traction": f_trac, "brake": f_brake, "integral": integral,
-            "derivative": derivative, "v_ref": v_ref
-        }
 
+def figure_updates(results, vehicle_params, show_kmh=True, max_points=MAX_POINTS_PER_TRACE):
+    """Część wykresu zależna od wyniku symulacji: dane przebiegów, wartość zadana i tytuł."""
+    t = results["time"]
+    to_kn = lambda f: f / 1000  # noqa: E731
+    drag_kn = lambda v: vehicle_params["drag_coeff"] * v / 1000  # noqa: E731
+    return {
+        "traces": {
+            TRACE_VELOCITY: _series(t, results["velocity"], max_points, ms_to_kmh if show_kmh else None),
+            TRACE_TRACTION: _series(t, results["traction"], max_points, to_kn),
+            TRACE_BRAKE: _series(t, results["brake"], max_points, to_kn),
+            TRACE_DRAG: _series(t, results["velocity"], max_points, drag_kn),
+        },
+        "v_ref": ms_to_kmh(results["v_ref"]) if show_kmh else results["v_ref"],
+        "title": f"<b>Symulacja - {vehicle_params['name']}</b>",
+        "color": vehicle_params["color"],
+    }
 
-# =============================================================================
-# KONWERSJE I WYKRESY
-# =============================================================================
-def ms_to_kmh(v_ms): return v_ms * 3.6
 
+def figure_patch(updates):
+    """Częściowa aktualizacja wykresu – do przeglądarki trafiają tylko zmienione pola."""
+    patch = Patch()
+    for index, trace in updates["traces"].items():
+        patch["data"][index]["x"] = trace["x"]
+        patch["data"][index]["y"] = trace["y"]
+        patch["data"][index]["type"] = trace["type"]
+    patch["data"][TRACE_VELOCITY]["line"]["color"] = updates["color"]
+    patch["layout"]["shapes"][0]["y0"] = updates["v_ref"]
+    patch["layout"]["shapes"][0]["y1"] = updates["v_ref"]
+    patch["layout"]["shapes"][0]["visible"] = True
+    patch["layout"]["title"]["text"] = updates["title"]
+    patch["layout"]["title"]["font"]["color"] = updates["color"]
+    return patch
 
-def kmh_to_ms(v_kmh): return v_kmh / 3.6
 
+def preview_patch(time, velocity, show_kmh=True):
+    """Aktualizacja samego przebiegu podglądu (pusty – podgląd wyłączony)."""
+    patch = Patch()
+    patch["data"][TRACE_PREVIEW]["x"] = time
+    patch["data"][TRACE_PREVIEW]["y"] = ms_to_kmh(velocity) if show_kmh else velocity
+    return patch
+
+
+def stream_updates(chunk, vehicle_params, v_ref, n_steps, show_kmh=True):
+    """
+    Aktualizacja dla jednego bloku symulacji strumieniowej – budżet punktów dzielony
+    proporcjonalnie między bloki, typ przebiegu zależny od długości całej symulacji.
+    """
+    budget = max(-(-MAX_POINTS_PER_TRACE * len(chunk["time"]) // n_steps), 2)
+    updates = figure_updates({**chunk, "v_ref": v_ref}, vehicle_params, show_kmh, budget)
+    trace_type = "scattergl" if min(n_steps, MAX_POINTS_PER_TRACE) > WEBGL_THRESHOLD else "scatter"
+    for trace in updates["traces"].values():
+        trace["type"] = trace_type
+    return updates
 
-def create_simulation_plots(results, vehicle_params, show_kmh=True, previous_results=None):
-    color = vehicle_params["color"]
-    t = results["time"]
 
-    if show_kmh:
-        v = ms_to_kmh(results["velocity"])
-        v_ref = ms_to_kmh(results["v_ref"])
-        v_unit = "km/h"
-    else:
-        v = results["velocity"]
-        v_ref = results["v_ref"]
-        v_unit = "m/s"
+def create_figure_layout(vehicle_params, show_kmh=True):
+    """Szkielet wykresu: układ, osie, style i puste przebiegi w kolejności TRACE_*."""
+    color = vehicle_params["color"]
+    v_unit = "km/h" if show_kmh else "m/s"
 
     fig = make_subplots(
         rows=1, cols=2, shared_xaxes=False, horizontal_spacing=0.08,
@@ -152,27 +108,27 @@ def create_simulation_plots(results, vehicle_params, show_kmh=True, previous_res
         subplot_titles=("Prędkość pojazdu", "Siły i sygnał sterujący")
     )
 
-    # Poprzedni przebieg
-    if previous_results is not None:
-        t_prev = previous_results["time"]
-        v_prev = ms_to_kmh(previous_results["velocity"]) if show_kmh else previous_results["velocity"]
+    # Przebiegi z historii (wypełniane przez overlay_history; puste – ukryte w legendzie)
+    for slot in TRACE_HISTORY:
         fig.add_trace(go.Scatter(
-            x=t_prev, y=v_prev, mode='lines', name=f'Poprzedni [{v_unit}]',
-            line=dict(color='#6C757D', width=2, dash='dot'),
+            x=[], y=[], mode='lines', showlegend=False,
+            line=dict(color=HISTORY_COLORS[slot % len(HISTORY_COLORS)], width=2, dash='dot'),
             hovertemplate='%{y:.2f}'  # ZAOKRĄGLENIE
         ), row=1, col=1)
 
     # Aktualny przebieg
     fig.add_trace(go.Scatter(
-        x=t, y=v, mode='lines', name=f'Prędkość [{v_unit}]',
+        x=[], y=[], mode='lines', name=f'Prędkość [{v_unit}]',
         line=dict(color=color, width=3),
         hovertemplate='%{y:.2f}'  # ZAOKRĄGLENIE
     ), row=1, col=1)
 
+    # Wartość zadana jako kształt (linia pozioma) zamiast serii o długości przebiegu;
+    # pusty przebieg zostawia jedynie wpis w legendzie
+    fig.add_hline(y=0, visible=False, line=dict(color='#00D9A5', width=2, dash='dash'), row=1, col=1)
     fig.add_trace(go.Scatter(
-        x=t, y=[v_ref] * len(t), mode='lines', name=f'Zadana [{v_unit}]',
-        line=dict(color='#00D9A5', width=2, dash='dash'),
-        hovertemplate='%{y:.2f}'  # ZAOKRĄGLENIE
+        x=[None], y=[None], mode='lines', name=f'Zadana [{v_unit}]',
+        line=dict(color='#00D9A5', width=2, dash='dash'), hoverinfo='skip'
     ), row=1, col=1)
 
     # Wykresy sił
@@ -183,24 +139,30 @@ def create_simulation_plots(results, vehicle_params, show_kmh=True, previous_res
     # ), row=1, col=2)
 
     fig.add_trace(go.Scatter(
-        x=t, y=results["traction"] / 1000, mode='lines', name='Napęd [kN]',
+        x=[], y=[], mode='lines', name='Napęd [kN]',
         line=dict(color='#03DAC6', width=2),
         hovertemplate='%{y:.2f}'  # ZAOKRĄGLENIE
     ), row=1, col=2)
 
     fig.add_trace(go.Scatter(
-        x=t, y=results["brake"] / 1000, mode='lines', name='Hamowanie [kN]',
+        x=[], y=[], mode='lines', name='Hamowanie [kN]',
         line=dict(color='#CF6679', width=2),
         hovertemplate='%{y:.2f}'  # ZAOKRĄGLENIE
     ), row=1, col=2)
 
-    f_drag = vehicle_params["drag_coeff"] * results["velocity"] / 1000
     fig.add_trace(go.Scatter(
-        x=t, y=f_drag, mode='lines', name='Opory [kN]',
+        x=[], y=[], mode='lines', name='Opory [kN]',
         line=dict(color='#FFAB40', width=2, dash='dot'),
         hovertemplate='%{y:.2f}'  # ZAOKRĄGLENIE
     ), row=1, col=2)
 
+    # Podgląd z przybliżenia odpowiedzi (surrogate.py) – aktualizowany przy przesuwaniu suwaków
+    fig.add_trace(go.Scatter(
+        x=[], y=[], mode='lines', name=f'Podgląd [{v_unit}]',
+        line=dict(color='#BB86FC', width=2, dash='dash'), opacity=0.8,
+        hovertemplate='%{y:.2f}'  # ZAOKRĄGLENIE
+    ), row=1, col=1)
+
     fig.update_layout(
         height=500, showlegend=True, template="plotly_dark",
         paper_bgcolor='#1E1E1E', plot_bgcolor='#2D2D2D',
@@ -217,11 +179,158 @@ def create_simulation_plots(results, vehicle_params, show_kmh=True, previous_res
     return fig
 
 
+def create_simulation_plots(results, vehicle_params, show_kmh=True, history=(),
+                            max_points=MAX_POINTS_PER_TRACE):
+    """
+    Pełny wykres (szkielet + dane) – np. do eksportu poza aplikacją.
+    history – wcześniejsze wyniki do porównania (najwyżej HISTORY_RUNS).
+    """
+    fig = create_figure_layout(vehicle_params, show_kmh)
+    updates = figure_updates(results, vehicle_params, show_kmh, max_points)
+    for index, previous in zip(TRACE_HISTORY, history):
+        updates["traces"][index] = {**_series(previous["time"], previous["velocity"], max_points,
+                                              ms_to_kmh if show_kmh else None), "showlegend": True}
+
+    fig_dict = fig.to_plotly_json()
+    for index, trace in updates["traces"].items():
+        fig_dict["data"][index].update(trace)
+    fig = go.Figure(fig_dict)
+    fig.update_shapes(y0=updates["v_ref"], y1=updates["v_ref"], visible=True)
+    return fig
+
+
+def _rgba(hex_color, alpha):
+    r, g, b = (int(hex_color[i:i + 2], 16) for i in (1, 3, 5))
+    return f"rgba({r},{g},{b},{alpha})"
+
+
+def create_fan_chart(mc, vehicle_params, show_kmh=True):
+    """Wykres wachlarzowy Monte Carlo: pasma percentyli prędkości i siły wypadkowej."""
+    color = vehicle_params["color"]
+    v_unit = "km/h" if show_kmh else "m/s"
+    q = mc["percentiles"]
+    t = mc["time"]
+
+    fig = make_subplots(
+        rows=1, cols=2, shared_xaxes=False, horizontal_spacing=0.08,
+        subplot_titles=(f"Prędkość – {mc['n_samples']} wariantów", "Siła wypadkowa (napęd - hamowanie)")
+    )
+    channels = [
+        (ms_to_kmh(mc["velocity"]) if show_kmh else mc["velocity"], f"[{v_unit}]", color, (1, 1)),
+        (mc["force"] / 1000, "[kN]", "#03DAC6", (1, 2)),
+    ]
+    for values, unit, line_color, (row, col) in channels:
+        # Pasma od najszerszego (np. 5–95%) do najwęższego, dalej mediana
+        for i in range(len(q) // 2):
+            lo, hi = values[i], values[len(q) - 1 - i]
+            name = f"{q[i]}–{q[len(q) - 1 - i]}% {unit}"
+            fig.add_trace(go.Scatter(x=t, y=hi, mode='lines', line=dict(width=0), showlegend=False,
+                                     legendgroup=name, hoverinfo='skip'), row=row, col=col)
+            fig.add_trace(go.Scatter(
+                x=t, y=lo, mode='lines', line=dict(width=0), fill='tonexty', name=name, legendgroup=name,
+                fillcolor=_rgba(line_color, 0.2 + 0.2 * i), hoverinfo='skip'
+            ), row=row, col=col)
+        fig.add_trace(go.Scatter(
+            x=t, y=values[len(q) // 2], mode='lines', name=f'Mediana {unit}',
+            line=dict(color=line_color, width=2), hovertemplate='%{y:.2f}'
+        ), row=row, col=col)
+
+    fig.update_layout(
+        height=450, showlegend=True, template="plotly_dark",
+        paper_bgcolor='#1E1E1E', plot_bgcolor='#2D2D2D',
+        title=dict(text=f"<b>Analiza Monte Carlo - {vehicle_params['name']}</b>", font=dict(size=18, color=color), x=0.5),
+        legend=dict(orientation="h", y=-0.25, x=0.5, xanchor="center"),
+        font=dict(family="Arial", color='#E0E0E0'), hovermode='x unified'
+    )
+    fig.update_xaxes(title_text="Czas [s]", gridcolor='#444', row=1, col=1)
+    fig.update_xaxes(title_text="Czas [s]", gridcolor='#444', row=1, col=2)
+    fig.update_yaxes(title_text=f"Prędkość [{v_unit}]", gridcolor='#444', row=1, col=1)
+    fig.update_yaxes(title_text="Siła [kN]", gridcolor='#444', row=1, col=2)
+
+    return fig
+
+
+MAP_LABELS = {"itae": "ITAE [m·s]", "overshoot": "Przeregulowanie [%]", "settling_time": "Czas regulacji [s]"}
+
+
+def create_gain_map(gmap, metric, vehicle_params):
+    """Mapa cieplna wskaźnika na siatce kp × Ti (kliknięcie komórki – symulacja z tymi nastawami)."""
+    n = len(gmap["kp"])
+    status = "" if gmap["level"] == len(LEVELS) - 1 else " – doprecyzowywanie..."
+    fig = go.Figure(go.Heatmap(
+        x=gmap["kp"], y=gmap["Ti"], z=gmap[metric], colorscale="Viridis",
+        colorbar=dict(title=dict(text=MAP_LABELS[metric], side="right")),
+        hovertemplate="Kp=%{x}<br>Ti=%{y}<br>%{z:.1f}<extra></extra>"
+    ))
+    fig.update_layout(
+        height=450, template="plotly_dark", paper_bgcolor='#1E1E1E', plot_bgcolor='#2D2D2D',
+        title=dict(text=f"<b>Mapa nastaw - {vehicle_params['name']}</b> (siatka {n}×{n}{status})",
+                   font=dict(size=18, color=vehicle_params["color"]), x=0.5),
+        font=dict(family="Arial", color='#E0E0E0'),
+        xaxis=dict(title="Kp", gridcolor='#444'), yaxis=dict(title="Ti [s]", gridcolor='#444')
+    )
+    return fig
+
+
 # =============================================================================
 # APLIKACJA DASH
 # =============================================================================
-app = Dash(__name__)
-app.title = "Symulator Tempomatu"
+# Poziom dyskowy (prywatny katalog użytkownika) dokłada create_app – import modułu
+# niczego nie zapisuje na dysku
+SIMULATION_CACHE = cache_from_env()
+RUN_HISTORY = None
+
+STREAM_CHUNK = 1000  # próbek na blok – dłuższe symulacje wysyłane są strumieniowo
+STREAM_INTERVAL_MS = 100
+MC_SAMPLES = 1000  # wariantów parametrów w analizie Monte Carlo
+AUTOTUNE_BUDGET = 2.0  # [s] – limit czasu doboru nastaw, potem najlepszy dotąd kandydat
+# Zadania w tle to osobne procesy – mogą liczyć na puli procesów (None: wg liczby rdzeni);
+# bez menedżera zadań obliczenia zostają w procesie serwera
+JOB_WORKERS = None if BACKGROUND_AVAILABLE else 1
+
+
+def run_history():
+    """Historia przebiegów sesji – tworzona przy pierwszym użyciu (create_app albo proces zadania)."""
+    global RUN_HISTORY
+    if RUN_HISTORY is None:
+        RUN_HISTORY = RunHistory()
+    return RUN_HISTORY
+
+
+def cache_stats():
+    return {**SIMULATION_CACHE.stats(), "history": run_history().stats()}
+
+
+def run_label(run):
+    """Opis przebiegu z historii (lista wyboru i legenda)."""
+    p = run["params"]
+    return (f"{time.strftime('%H:%M:%S', time.localtime(run['created']))} · Kp={p['kp']:g} Ti={p['Ti']:g} "
+            f"Td={p['Td']:g} Tp={p['Tp']:g} · {p['v_ref']:g} km/h · {VEHICLE_PRESETS[p['vehicle']]['name']}")
+
+
+def record_run(session_id, run, n_steps, velocity, selected):
+    """
+    Zapis przebiegu w historii sesji. Zwraca (opcje listy historii, wybór, identyfikator):
+    dotychczasowy wybór bez usuniętych przebiegów, a gdy pusty – poprzedni przebieg.
+    """
+    if not session_id:
+        return no_update, no_update, None
+    names = ("vehicle", "v_ref", "v0", "t_end", "kp", "Tp", "Ti", "Td")
+    run_id = run_history().add(session_id, dict(zip(names, run)), run[3], n_steps, velocity)
+    runs = run_history().runs(session_id)
+    ids = [r["id"] for r in runs]
+    selected = [i for i in selected or [] if i in ids]
+    if not selected and len(ids) > 1:
+        selected = [ids[-2]]
+    options = [{'label': run_label(r), 'value': r["id"]} for r in reversed(runs)]
+    return options, selected, run_id
+
+
+def stream_metrics(metrics, chunk, vehicle_params):
+    """Dołożenie bloku symulacji strumieniowej do akumulatora wskaźników."""
+    control = chunk["traction"] / vehicle_params["max_traction"] - chunk["brake"] / vehicle_params["max_brake"]
+    return metrics.update(chunk["time"], chunk["velocity"], control, chunk["traction"], chunk["brake"])
+
 
 DARK_BG = '#121212'
 DARK_CARD = '#1E1E1E'
@@ -229,136 +338,245 @@ DARK_CARD_LIGHTER = '#2D2D2D'
 DARK_TEXT = '#E0E0E0'
 DARK_TEXT_SECONDARY = '#A0A0A0'
 ACCENT_COLOR = '#BB86FC'
+HEATMAP_PANEL_STYLE = {'backgroundColor': DARK_CARD, 'borderRadius': '10px', 'padding': '10px', 'marginTop': '15px'}
+
+
+def _fmt(value, fmt, unit, missing="—"):
+    return missing if value is None or not np.isfinite(value) else f"{value:{fmt}} {unit}"
+
+
+def metrics_panel(metrics):
+    """Wskaźniki jakości regulacji pod wykresami (None – symulacja w toku)."""
+    if metrics is None:
+        return html.Span("⏳ Wskaźniki pojawią się po zakończeniu symulacji...",
+                         style={'color': DARK_TEXT_SECONDARY})
+    items = [
+        ("Czas narastania (10–90%)", _fmt(metrics["rise_time"], ".1f", "s")),
+        ("Przeregulowanie", _fmt(metrics["overshoot"], ".1f", "%")),
+        ("Czas regulacji (±2%)", _fmt(metrics["settling_time"], ".1f", "s", missing="nie osiągnięto")),
+        ("Uchyb ustalony", _fmt(ms_to_kmh(metrics["steady_state_error"]), ".2f", "km/h")),
+        ("IAE", _fmt(metrics["iae"], ".1f", "m")),
+        ("ITAE", _fmt(metrics["itae"], ".0f", "m·s")),
+        ("Wysiłek sterowania ∫|u|dt", _fmt(metrics["control_effort"], ".1f", "s")),
+        ("Impuls hamowania", _fmt(metrics["brake_impulse"] / 1000, ".1f", "kN·s")),
+    ]
+    return html.Div([
+        html.Div([
+            html.Div(label, style={'color': DARK_TEXT_SECONDARY, 'fontSize': '12px'}),
+            html.Div(value, style={'fontWeight': 'bold', 'fontSize': '16px'}),
+        ], style={'padding': '8px 12px', 'backgroundColor': DARK_CARD_LIGHTER, 'borderRadius': '5px'})
+        for label, value in items
+    ], style={'display': 'flex', 'flexWrap': 'wrap', 'gap': '10px'})
 
-app.layout = html.Div([
 
-    # 1. SEKCJA INFORMACYJNA (NAMIARY NA AUTORÓW)
-    html.Div([
-        html.H1("Symulator Tempomatu", style={'color': ACCENT_COLOR, 'marginBottom': '10px'}),
-        html.Div([
-            html.P("Autorzy: Filip Godzich, Dawid Majdziński (Grupa Lab5)", style={'fontSize': '18px', 'fontWeight': 'bold'}),
-            html.P("Nr indeksu: 166462, 166379", style={'color': DARK_TEXT_SECONDARY}),
-            html.P("Projekt tempomatu - Podstawy Automatyki",
-                   style={'color': DARK_TEXT_SECONDARY, 'fontStyle': 'italic'}),
-        ])
-    ], style={'textAlign': 'center', 'padding': '20px', 'backgroundColor': DARK_CARD, 'marginBottom': '20px'}),
-
-    # 2. SEKCJA MODELU MATEMATYCZNEGO (ROZWIJANA)
-    # html.Details([
-    #     html.Summary("📐 Równowaga sił i model matematyczny (kliknij aby rozwinąć)",
-    #                  style={'cursor': 'pointer', 'fontSize': '16px', 'fontWeight': 'bold', 'color': ACCENT_COLOR,
-    #                         'marginBottom': '10px'}),
-    #     html.Div([
-    #         dcc.Markdown(r'''
-    #         Model dynamiki pojazdu oparty jest na **II zasadzie dynamiki Newtona**:
-    #
-    #         $$m \cdot \frac{dv(t)}{dt} = F_{nap}(t) - F_{ham}(t) - F_{op}(t)$$
-    #
-    #         Gdzie:
-    #         * $m$ - masa pojazdu [kg]
-    #         * $F_{nap}$ - siła napędowa [N]
-    #         * $F_{ham}$ - siła hamowania [N]
-    #         * $F_{op} = b \cdot v(t)$ - siła oporów ruchu proporcjonalna do prędkości
-    #         ''', mathjax=True)
-    #     ], style={'padding': '20px', 'backgroundColor': DARK_CARD_LIGHTER, 'borderRadius': '5px'})
-    # ], style={'backgroundColor': DARK_CARD, 'padding': '10px', 'borderRadius': '5px', 'marginBottom': '20px'}),
-
-    # 3. GŁÓWNY INTERFEJS SYMULATORA
-    html.Div([
-        # LEWY PANEL - SUWAKI
+@lru_cache(maxsize=None)
+def build_layout():
+    """Układ strony – budowany przy pierwszym wczytaniu (nie przy imporcie modułu)."""
+    return html.Div([
+
+        # 1. SEKCJA INFORMACYJNA (NAMIARY NA AUTORÓW)
         html.Div([
+            html.H1("Symulator Tempomatu", style={'color': ACCENT_COLOR, 'marginBottom': '10px'}),
             html.Div([
-                html.Label("🚙 Typ pojazdu:", style={'fontWeight': 'bold', 'color': DARK_TEXT}),
-                dcc.Dropdown(
-                    id='vehicle-dropdown',
-                    options=[{'label': v['name'], 'value': k} for k, v in VEHICLE_PRESETS.items()],
-                    value='city_car',
-                    clearable=False,
-                    style={'marginTop': '5px', 'backgroundColor': DARK_CARD_LIGHTER, 'color': '#000'}
-                ),
-            ], style={'marginBottom': '20px'}),
-
-            html.Hr(style={'borderColor': '#333'}),
-            html.H4("📊 Parametry", style={'color': ACCENT_COLOR}),
-
-            html.Label("🎯 Prędkość zadana [km/h]:"),
-            dcc.Slider(
-                id='speed-slider', min=30, max=150, step=5, value=90,
-                marks={i: f'{i}' for i in range(30, 151, 30)}
-            ),
-
-            html.Label("🚦 Prędkość początkowa [km/h]:", style={'marginTop': '15px'}),
-            dcc.Slider(
-                id='initial-speed-slider', min=0, max=120, step=5, value=0,
-                marks={i: f'{i}' for i in range(0, 121, 30)}
-            ),
-
-            html.Label("⏱️ Czas [s]:", style={'marginTop': '15px'}),
-            dcc.Slider(
-                id='time-slider', min=60, max=300, step=30, value=120,
-                marks={i: f'{i}' for i in range(60, 301, 60)}
-            ),
-
-            html.Hr(style={'borderColor': '#333', 'marginTop': '20px'}),
-            html.H4("⚙️ Regulator PID", style={'color': ACCENT_COLOR}),
-
-            html.Label("Kp (Wzmocnienie):"),
-            dcc.Slider(
-                id='kp-slider', min=1, max=50, step=1, value=15,
-                marks={i: f'{i}' for i in range(0, 51, 10)}
-            ),
-
-            html.Label("Tp (Próbkowanie):", style={'marginTop': '10px'}),
-            dcc.Slider(
-                id='tp-slider', min=0.1, max=1.0, step=0.1, value=0.5,
-                marks={0.1: '0.1', 0.5: '0.5', 1.0: '1.0'}
-            ),
-
-            html.Label("Ti (Zdwojenie):", style={'marginTop': '10px'}),
-            dcc.Slider(
-                id='ti-slider', min=0.1, max=10, step=0.1, value=5,
-                marks={i: f'{i}' for i in range(0, 11, 2)}
-            ),
-
-            html.Label("Td (Wyprzedzenie):", style={'marginTop': '10px'}),
-            dcc.Slider(
-                id='td-slider', min=0, max=5, step=0.1, value=0.1,
-                marks={i: f'{i}' for i in range(0, 6, 1)}
-            ),
-
-            html.Button('🚀 Uruchom symulację', id='simulate-button', n_clicks=0,
-                        style={'width': '100%', 'backgroundColor': ACCENT_COLOR, 'border': 'none',
-                               'padding': '15px', 'fontWeight': 'bold', 'marginTop': '20px', 'borderRadius': '5px'})
-        ], style={'width': '300px', 'padding': '20px', 'backgroundColor': DARK_CARD, 'borderRadius': '10px',
-                  'marginRight': '20px'}),
-
-        # PRAWY PANEL - WYKRESY
+                html.P("Autorzy: Filip Godzich, Dawid Majdziński (Grupa Lab5)", style={'fontSize': '18px', 'fontWeight': 'bold'}),
+                html.P("Nr indeksu: 166462, 166379", style={'color': DARK_TEXT_SECONDARY}),
+                html.P("Projekt tempomatu - Podstawy Automatyki",
+                       style={'color': DARK_TEXT_SECONDARY, 'fontStyle': 'italic'}),
+            ])
+        ], style={'textAlign': 'center', 'padding': '20px', 'backgroundColor': DARK_CARD, 'marginBottom': '20px'}),
+
+        # 2. SEKCJA MODELU MATEMATYCZNEGO (ROZWIJANA)
+        # html.Details([
+        #     html.Summary("📐 Równowaga sił i model matematyczny (kliknij aby rozwinąć)",
+        #                  style={'cursor': 'pointer', 'fontSize': '16px', 'fontWeight': 'bold', 'color': ACCENT_COLOR,
+        #                         'marginBottom': '10px'}),
+        #     html.Div([
+        #         dcc.Markdown(r'''
+        #         Model dynamiki pojazdu oparty jest na **II zasadzie dynamiki Newtona**:
+        #
+        #         $$m \cdot \frac{dv(t)}{dt} = F_{nap}(t) - F_{ham}(t) - F_{op}(t)$$
+        #
+        #         Gdzie:
+        #         * $m$ - masa pojazdu [kg]
+        #         * $F_{nap}$ - siła napędowa [N]
+        #         * $F_{ham}$ - siła hamowania [N]
+        #         * $F_{op} = b \cdot v(t)$ - siła oporów ruchu proporcjonalna do prędkości
+        #         ''', mathjax=True)
+        #     ], style={'padding': '20px', 'backgroundColor': DARK_CARD_LIGHTER, 'borderRadius': '5px'})
+        # ], style={'backgroundColor': DARK_CARD, 'padding': '10px', 'borderRadius': '5px', 'marginBottom': '20px'}),
+
+        # 3. GŁÓWNY INTERFEJS SYMULATORA
         html.Div([
-            html.Div(id='vehicle-params-display',
-                     style={'padding': '15px', 'backgroundColor': DARK_CARD, 'marginBottom': '15px',
-                            'borderRadius': '10px'}),
+            # LEWY PANEL - SUWAKI
             html.Div([
-                dcc.Loading(
-                    type="circle", color=ACCENT_COLOR,
-                    children=[dcc.Graph(id='simulation-graph', style={'height': '550px'})]
-                )
-            ], style={'backgroundColor': DARK_CARD, 'borderRadius': '10px', 'padding': '10px'})
-        ], style={'flex': '1'})
+                html.Div([
+                    html.Label("🚙 Typ pojazdu:", style={'fontWeight': 'bold', 'color': DARK_TEXT}),
+                    dcc.Dropdown(
+                        id='vehicle-dropdown',
+                        options=[{'label': v['name'], 'value': k} for k, v in VEHICLE_PRESETS.items()],
+                        value='city_car',
+                        clearable=False,
+                        style={'marginTop': '5px', 'backgroundColor': DARK_CARD_LIGHTER, 'color': '#000'}
+                    ),
+                ], style={'marginBottom': '20px'}),
+
+                html.Hr(style={'borderColor': '#333'}),
+                html.H4("📊 Parametry", style={'color': ACCENT_COLOR}),
+
+                html.Label("🎯 Prędkość zadana [km/h]:"),
+                dcc.Slider(
+                    id='speed-slider', min=30, max=150, step=5, value=90,
+                    marks={i: f'{i}' for i in range(30, 151, 30)}
+                ),
+
+                html.Label("🚦 Prędkość początkowa [km/h]:", style={'marginTop': '15px'}),
+                dcc.Slider(
+                    id='initial-speed-slider', min=0, max=120, step=5, value=0,
+                    marks={i: f'{i}' for i in range(0, 121, 30)}
+                ),
+
+                html.Label("⏱️ Czas [s]:", style={'marginTop': '15px'}),
+                dcc.Slider(
+                    id='time-slider', min=60, max=300, step=30, value=120,
+                    marks={i: f'{i}' for i in range(60, 301, 60)}
+                ),
+
+                html.Hr(style={'borderColor': '#333', 'marginTop': '20px'}),
+                html.H4("⚙️ Regulator PID", style={'color': ACCENT_COLOR}),
+
+                html.Label("Kp (Wzmocnienie):"),
+                dcc.Slider(
+                    id='kp-slider', min=1, max=50, step=1, value=15,
+                    marks={i: f'{i}' for i in range(0, 51, 10)}
+                ),
+
+                html.Label("Tp (Próbkowanie):", style={'marginTop': '10px'}),
+                dcc.Slider(
+                    id='tp-slider', min=0.1, max=1.0, step=0.1, value=0.5,
+                    marks={0.1: '0.1', 0.5: '0.5', 1.0: '1.0'}
+                ),
+
+                html.Label("Ti (Zdwojenie):", style={'marginTop': '10px'}),
+                dcc.Slider(
+                    id='ti-slider', min=0.1, max=10, step=0.1, value=5,
+                    marks={i: f'{i}' for i in range(0, 11, 2)}
+                ),
+
+                html.Label("Td (Wyprzedzenie):", style={'marginTop': '10px'}),
+                dcc.Slider(
+                    id='td-slider', min=0, max=5, step=0.1, value=0.1,
+                    marks={i: f'{i}' for i in range(0, 6, 1)}
+                ),
+
+                html.Button('🎛️ Dobierz nastawy PID', id='autotune-button', n_clicks=0,
+                            style={'width': '100%', 'backgroundColor': DARK_CARD_LIGHTER, 'color': DARK_TEXT,
+                                   'border': f'1px solid {ACCENT_COLOR}', 'padding': '10px', 'marginTop': '20px',
+                                   'borderRadius': '5px'}),
+
+                html.Button('🎲 Analiza Monte Carlo', id='montecarlo-button', n_clicks=0,
+                            style={'width': '100%', 'backgroundColor': DARK_CARD_LIGHTER, 'color': DARK_TEXT,
+                                   'border': f'1px solid {ACCENT_COLOR}', 'padding': '10px', 'marginTop': '10px',
+                                   'borderRadius': '5px'}),
+
+                html.Button('🗺️ Mapa nastaw Kp × Ti', id='heatmap-button', n_clicks=0,
+                            style={'width': '100%', 'backgroundColor': DARK_CARD_LIGHTER, 'color': DARK_TEXT,
+                                   'border': f'1px solid {ACCENT_COLOR}', 'padding': '10px', 'marginTop': '10px',
+                                   'borderRadius': '5px'}),
+
+                dcc.Checklist(
+                    id='preview-toggle', value=['on'],
+                    options=[{'label': ' Podgląd na żywo (przybliżony)', 'value': 'on'}],
+                    style={'marginTop': '20px', 'color': DARK_TEXT_SECONDARY}
+                ),
 
-    ], style={'display': 'flex', 'alignItems': 'flex-start'}),
+                html.Button('🚀 Uruchom symulację', id='simulate-button', n_clicks=0,
+                            style={'width': '100%', 'backgroundColor': ACCENT_COLOR, 'border': 'none',
+                                   'padding': '15px', 'fontWeight': 'bold', 'marginTop': '20px', 'borderRadius': '5px'}),
 
-    dcc.Store(id='previous-results-store'),
+                html.Label("Porównaj z przebiegami:", style={'marginTop': '20px', 'display': 'block'}),
+                dcc.Dropdown(
+                    id='history-select', multi=True, options=[], placeholder="Historia sesji...",
+                    style={'backgroundColor': DARK_CARD_LIGHTER, 'color': '#000', 'marginTop': '5px'}
+                )
+            ], style={'width': '300px', 'padding': '20px', 'backgroundColor': DARK_CARD, 'borderRadius': '10px',
+                      'marginRight': '20px'}),
 
-], style={
-    'maxWidth': '100%',
-    'margin': '0',
-    'padding': '20px',
-    'fontFamily': 'Arial, sans-serif',
-    'backgroundColor': DARK_BG,
-    'minHeight': '100vh',
-    'boxSizing': 'border-box',
-    'color': DARK_TEXT
-})
+            # PRAWY PANEL - WYKRESY
+            html.Div([
+                html.Div(id='vehicle-params-display',
+                         style={'padding': '15px', 'backgroundColor': DARK_CARD, 'marginBottom': '15px',
+                                'borderRadius': '10px'}),
+                html.Div([
+                    dcc.Loading(
+                        type="circle", color=ACCENT_COLOR,
+                        # Bez wskaźnika przy dokładaniu bloków (extendData) w trybie strumieniowym
+                        target_components={'simulation-graph': 'figure'},
+                        children=[dcc.Graph(id='simulation-graph', figure=create_figure_layout(VEHICLE_PRESETS['city_car']),
+                                      style={'height': '550px'})]
+                    )
+                ], style={'backgroundColor': DARK_CARD, 'borderRadius': '10px', 'padding': '10px'}),
+                html.Div(id='metrics-display',
+                         style={'padding': '15px', 'backgroundColor': DARK_CARD, 'marginTop': '15px',
+                                'borderRadius': '10px'}),
+                dcc.Loading(
+                    type="circle", color=ACCENT_COLOR,
+                    children=[html.Div(id='montecarlo-display', style={'marginTop': '15px'})]
+                ),
+                html.Div([
+                    dcc.Dropdown(
+                        id='heatmap-metric', value='itae', clearable=False,
+                        options=[{'label': label, 'value': k} for k, label in MAP_LABELS.items()],
+                        style={'width': '300px', 'backgroundColor': DARK_CARD_LIGHTER, 'color': '#000'}
+                    ),
+                    dcc.Loading(type="circle", color=ACCENT_COLOR,
+                                children=[dcc.Graph(id='heatmap-graph', style={'height': '450px'})])
+                ], id='heatmap-panel', style={'display': 'none'})
+            ], style={'flex': '1'})
+
+        ], style={'display': 'flex', 'alignItems': 'flex-start'}),
+
+        dcc.Interval(id='stream-interval', interval=STREAM_INTERVAL_MS, disabled=True),
+        dcc.Store(id='stream-state'),
+        # Poziomy mapy nastaw – każdy kolejny liczony po zapisaniu poprzedniego
+        *[dcc.Store(id=f'heatmap-level-{level}') for level in range(len(LEVELS))],
+
+    ], style={
+        'maxWidth': '100%',
+        'margin': '0',
+        'padding': '20px',
+        'fontFamily': 'Arial, sans-serif',
+        'backgroundColor': DARK_BG,
+        'minHeight': '100vh',
+        'boxSizing': 'border-box',
+        'color': DARK_TEXT
+    })
+
+
+def create_layout():
+    # Identyfikator sesji (nowy przy każdym wczytaniu strony) – limit zadań na użytkownika
+    return html.Div([build_layout(), dcc.Store(id='session-id', data=uuid.uuid4().hex)])
+
+
+def create_app():
+    """
+    Fabryka aplikacji, np. dla serwera WSGI z wieloma workerami:
+    gunicorn -w 4 "main:create_app().server"
+    """
+    global SIMULATION_CACHE
+    if BACKGROUND_AVAILABLE:
+        # Callbacki w tle liczą się w osobnych procesach – wyniki muszą trafić na dysk,
+        # żeby były widoczne dla kolejnych zadań
+        SIMULATION_CACHE = cache_from_env(default_disk_dir=private_dir("results"))
+    run_history()  # przed pierwszym zadaniem w tle – licznik rozmiaru współdzielony przez fork
+    app = Dash(__name__, background_callback_manager=background_manager())
+    app.title = "Symulator Tempomatu"
+    app.layout = create_layout
+    app.server.add_url_rule("/cache-stats", "cache_stats", cache_stats)
+    for name in VEHICLE_PRESETS:  # otwarcie tablic podglądu (np.memmap) przy starcie serwera
+        load_surrogate(name)
+    install_instrumentation(app.server)  # TEMPOMAT_INSTRUMENT=1: Server-Timing i /metrics
+    install_api(app.server)  # POST /api/simulate – symulacje wsadowe dla innych narzędzi
+    return app
 
 
 @callback(Output('vehicle-params-display', 'children'), Input('vehicle-dropdown', 'value'))
@@ -375,31 +593,282 @@ def update_params(v_type):
 
 @callback(
     Output('simulation-graph', 'figure'),
-    Output('previous-results-store', 'data'),
+    Output('metrics-display', 'children'),
+    Output('stream-state', 'data'),
+    Output('stream-interval', 'disabled'),
+    Output('history-select', 'options'), Output('history-select', 'value'),
     Input('simulate-button', 'n_clicks'),
     State('vehicle-dropdown', 'value'),
     State('speed-slider', 'value'), State('initial-speed-slider', 'value'),
     State('time-slider', 'value'), State('kp-slider', 'value'),
     State('tp-slider', 'value'), State('ti-slider', 'value'),
-    State('td-slider', 'value'), State('previous-results-store', 'data')
+    State('td-slider', 'value'), State('history-select', 'value'), State('session-id', 'data'),
+    background=BACKGROUND_AVAILABLE
 )
-def run_simulation(n, v_type, v_ref_kmh, v0_kmh, t_sim, kp, Tp, Ti, Td, prev_data):
+def run_simulation(n, v_type, v_ref_kmh, v0_kmh, t_sim, kp, Tp, Ti, Td, selected=None, session_id=None):
     params = VEHICLE_PRESETS[v_type]
     v_ref = kmh_to_ms(v_ref_kmh)
     v0 = kmh_to_ms(v0_kmh)
 
+    key = canonical_key(vehicle=v_type, v_ref=v_ref_kmh, v0=v0_kmh, t_end=t_sim,
+                        kp=kp, Tp=Tp, Ti=Ti, Td=Td)
+    run = [v_type, v_ref_kmh, v0_kmh, t_sim, kp, Tp, Ti, Td]
+    with stage("cache"):
+        updates = SIMULATION_CACHE.get("fig:" + key)
+    if updates is not None:
+        with stage("history"):
+            options, selected, _ = record_run(session_id, run, len(updates["velocity"]), updates["velocity"],
+                                              selected)
+        return figure_patch(updates), metrics_panel(updates["metrics"]), None, True, options, selected
+
+    sim = CruiseControlSimulator(params, kp, Tp, Ti, Td)
+    n_steps = int(t_sim / Tp) + 1
+    if n_steps > STREAM_CHUNK:
+        # Długi przebieg: pierwszy blok od razu, kolejne dokładane przez stream_simulation.
+        # Między blokami serwer nie przechowuje niczego – stan regulatora wraca w stream-state.
+        state = sim.initial_state(v_ref, v0)
+        with stage("simulate", profile=True):
+            chunk = next(sim.simulate_chunks(v_ref, v0, t_sim, STREAM_CHUNK, state=state))
+        with stage("metrics"):
+            metrics = stream_metrics(StepMetrics(v_ref, v0), chunk, params)
+        with stage("history"):
+            options, selected, run_id = record_run(session_id, run, n_steps, chunk["velocity"], selected)
+        stream = {"run": [v_type, v_ref, v0, t_sim, kp, Tp, Ti, Td], "state": state,
+                  "metrics": metrics.to_state(), "history": run_id}
+        with stage("figure"):
+            patch = figure_patch(stream_updates(chunk, params, v_ref, n_steps))
+        return patch, metrics_panel(None), stream, False, options, selected
+
+    with stage("cache"):
+        res = SIMULATION_CACHE.get("sim:" + key)
+    if res is None:
+        with stage("simulate", profile=True):
+            res = sim.simulate(v_ref, v0, t_sim)
+        with stage("cache"):
+            SIMULATION_CACHE.put("sim:" + key, res)
+    with stage("figure"):
+        updates = figure_updates(res, params, show_kmh=True)
+    with stage("metrics"):
+        updates["metrics"] = res.metrics
+    # Prędkość w float32 – do historii sesji także przy trafieniu w pamięć podręczną
+    updates["velocity"] = np.asarray(res["velocity"], dtype=np.float32)
+    with stage("cache"):
+        SIMULATION_CACHE.put("fig:" + key, updates)
+    with stage("history"):
+        options, selected, _ = record_run(session_id, run, len(updates["velocity"]), updates["velocity"],
+                                          selected)
+
+    with stage("figure"):
+        patch = figure_patch(updates)
+    return patch, metrics_panel(updates["metrics"]), None, True, options, selected
+
+
+@callback(
+    Output('kp-slider', 'value'), Output('ti-slider', 'value'), Output('td-slider', 'value'),
+    Input('autotune-button', 'n_clicks'),
+    State('vehicle-dropdown', 'value'),
+    State('speed-slider', 'value'), State('initial-speed-slider', 'value'),
+    State('time-slider', 'value'), State('tp-slider', 'value'), State('session-id', 'data'),
+    background=BACKGROUND_AVAILABLE,
+    running=[(Output('autotune-button', 'disabled'), True, False)],
+    prevent_initial_call=True
+)
+def run_autotune(n, v_type, v_ref_kmh, v0_kmh, t_sim, Tp, session_id=None):
+    best = autotune(VEHICLE_PRESETS[v_type], kmh_to_ms(v_ref_kmh), kmh_to_ms(v0_kmh),
+                    Tp=Tp, t_end=t_sim, workers=JOB_WORKERS,
+                    time_budget=AUTOTUNE_BUDGET)
+    return best["kp"], best["Ti"], best["Td"]
+
+
+@callback(
+    Output('montecarlo-display', 'children'),
+    Input('montecarlo-button', 'n_clicks'),
+    State('vehicle-dropdown', 'value'),
+    State('speed-slider', 'value'), State('initial-speed-slider', 'value'),
+    State('time-slider', 'value'), State('kp-slider', 'value'),
+    State('tp-slider', 'value'), State('ti-slider', 'value'),
+    State('td-slider', 'value'), State('session-id', 'data'),
+    background=BACKGROUND_AVAILABLE,
+    running=[(Output('montecarlo-button', 'disabled'), True, False)],
+    prevent_initial_call=True
+)
+def run_montecarlo(n, v_type, v_ref_kmh, v0_kmh, t_sim, kp, Tp, Ti, Td, session_id=None):
+    params = VEHICLE_PRESETS[v_type]
+    with stage("montecarlo"):
+        mc = monte_carlo(params, kp, Ti, Td, Tp, kmh_to_ms(v_ref_kmh), kmh_to_ms(v0_kmh), t_sim,
+                         n_samples=MC_SAMPLES, workers=JOB_WORKERS)
+    return html.Div([
+        dcc.Graph(figure=create_fan_chart(mc, params), style={'height': '450px'})
+    ], style={'backgroundColor': DARK_CARD, 'borderRadius': '10px', 'padding': '10px'})
+
+
+def cached_gain_map(args, level):
+    """Poziom level mapy nastaw z pamięci podręcznej; brakujące poziomy liczone od najgrubszego."""
+    v_type, v_ref_kmh, v0_kmh, t_sim, Tp, Td = args
+    key = "map:" + canonical_key(vehicle=v_type, v_ref=v_ref_kmh, v0=v0_kmh, t_end=t_sim, Tp=Tp, Td=Td,
+                                 level=level)
+    gmap = SIMULATION_CACHE.get(key)
+    if gmap is None:
+        previous = cached_gain_map(args, level - 1) if level > 0 else None
+        gmap = gain_map(VEHICLE_PRESETS[v_type], kmh_to_ms(v_ref_kmh), kmh_to_ms(v0_kmh), t_sim, Tp, Td,
+                        level, previous)
+        SIMULATION_CACHE.put(key, gmap)
+    return gmap
+
+
+@callback(
+    Output('heatmap-graph', 'figure'),
+    Output('heatmap-level-0', 'data'),
+    Output('heatmap-panel', 'style'),
+    Input('heatmap-button', 'n_clicks'),
+    State('vehicle-dropdown', 'value'),
+    State('speed-slider', 'value'), State('initial-speed-slider', 'value'),
+    State('time-slider', 'value'), State('tp-slider', 'value'),
+    State('td-slider', 'value'), State('heatmap-metric', 'value'), State('session-id', 'data'),
+    background=BACKGROUND_AVAILABLE,
+    running=[(Output('heatmap-button', 'disabled'), True, False)],
+    prevent_initial_call=True
+)
+def run_gain_map(n, v_type, v_ref_kmh, v0_kmh, t_sim, Tp, Td, metric, session_id=None):
+    # Najpierw siatka gruba (kilkadziesiąt przebiegów), drobniejsze poziomy w kolejnych callbackach
+    args = [v_type, v_ref_kmh, v0_kmh, t_sim, Tp, Td]
+    with stage("gain_map"):
+        gmap = cached_gain_map(args, 0)
+    return create_gain_map(gmap, metric, VEHICLE_PRESETS[v_type]), {"args": args}, HEATMAP_PANEL_STYLE
+
+
+def _register_refinement(level):
+    @callback(
+        Output('heatmap-graph', 'figure', allow_duplicate=True),
+        Output(f'heatmap-level-{level}', 'data'),
+        Input(f'heatmap-level-{level - 1}', 'data'),
+        State('heatmap-metric', 'value'), State('session-id', 'data'),
+        background=BACKGROUND_AVAILABLE,
+        prevent_initial_call=True
+    )
+    def refine_gain_map(previous, metric, session_id=None):
+        with stage("gain_map"):
+            gmap = cached_gain_map(previous["args"], level)
+        return create_gain_map(gmap, metric, VEHICLE_PRESETS[previous["args"][0]]), previous
+
+
+for _level in range(1, len(LEVELS)):
+    _register_refinement(_level)
+
+
+@callback(
+    Output('heatmap-graph', 'figure', allow_duplicate=True),
+    Input('heatmap-metric', 'value'),
+    [State(f'heatmap-level-{level}', 'data') for level in range(len(LEVELS))],
+    prevent_initial_call=True
+)
+def change_map_metric(metric, *levels):
+    # Najdrobniejszy gotowy poziom bieżącej mapy – wszystkie wskaźniki są już w pamięci podręcznej
+    if not levels[0]:
+        return no_update
+    level = max(i for i, data in enumerate(levels) if data and data["args"] == levels[0]["args"])
+    args = levels[0]["args"]
+    return create_gain_map(cached_gain_map(args, level), metric, VEHICLE_PRESETS[args[0]])
+
+
+@callback(
+    Output('kp-slider', 'value', allow_duplicate=True),
+    Output('ti-slider', 'value', allow_duplicate=True),
+    Output('simulate-button', 'n_clicks'),
+    Input('heatmap-graph', 'clickData'),
+    State('simulate-button', 'n_clicks'),
+    prevent_initial_call=True
+)
+def select_gains(click, n_clicks):
+    # Nastawy z klikniętej komórki trafiają na suwaki, a symulacja startuje jak po kliknięciu przycisku
+    point = click["points"][0]
+    return point["x"], point["y"], (n_clicks or 0) + 1
+
+
+@callback(
+    Output('simulation-graph', 'extendData'),
+    Output('metrics-display', 'children', allow_duplicate=True),
+    Output('stream-state', 'data', allow_duplicate=True),
+    Output('stream-interval', 'disabled', allow_duplicate=True),
+    Input('stream-interval', 'n_intervals'),
+    State('stream-state', 'data'), State('session-id', 'data'),
+    prevent_initial_call=True
+)
+def stream_simulation(n, stream, session_id=None):
+    if not stream:
+        return no_update, no_update, None, True
+
+    v_type, v_ref, v0, t_sim, kp, Tp, Ti, Td = stream["run"]
+    params = VEHICLE_PRESETS[v_type]
     sim = CruiseControlSimulator(params, kp, Tp, Ti, Td)
-    res = sim.simulate(v_ref, v0, t_sim)
+    state = stream["state"]
+    with stage("simulate", profile=True):
+        chunk = next(sim.simulate_chunks(v_ref, v0, t_sim, STREAM_CHUNK, state=state), None)
+    if chunk is None:
+        return no_update, no_update, None, True
+
+    n_steps = int(t_sim / Tp) + 1
+    if stream.get("history"):
+        with stage("history"):
+            run_history().extend(session_id, stream["history"], chunk["velocity"])
+    with stage("figure"):
+        traces = stream_updates(chunk, params, v_ref, n_steps)["traces"]
+        indices = list(traces)
+        extend = [{"x": [traces[i]["x"] for i in indices], "y": [traces[i]["y"] for i in indices]}, indices]
+    with stage("metrics"):
+        metrics = stream_metrics(StepMetrics.from_state(stream["metrics"]), chunk, params)
+    if state["step"] >= n_steps:
+        return extend, metrics_panel(metrics.result()), None, True
+    stream["metrics"] = metrics.to_state()
+    return extend, no_update, stream, False
+
+
+PREVIEW_SLIDERS = ('speed-slider', 'initial-speed-slider', 'time-slider', 'kp-slider', 'tp-slider', 'ti-slider',
+                   'td-slider')
 
-    prev_res = None
-    if prev_data:
-        prev_res = {"time": np.array(prev_data["time"]), "velocity": np.array(prev_data["velocity"])}
 
-    fig = create_simulation_plots(res, params, show_kmh=True, previous_results=prev_res)
-    current_data = {"time": res["time"].tolist(), "velocity": res["velocity"].tolist()}
+@callback(
+    Output('simulation-graph', 'figure', allow_duplicate=True),
+    Input('preview-toggle', 'value'), Input('vehicle-dropdown', 'value'),
+    [Input(slider, 'drag_value') for slider in PREVIEW_SLIDERS],
+    [State(slider, 'value') for slider in PREVIEW_SLIDERS],
+    prevent_initial_call=True
+)
+def preview_response(enabled, v_type, dragged, values):
+    # Przebieg z przybliżenia (ułamek ms) w trakcie przeciągania; przycisk liczy dokładnie.
+    # drag_value bywa puste przed pierwszym przeciągnięciem – wtedy bieżąca wartość suwaka.
+    surrogate = load_surrogate(v_type)
+    if not enabled or surrogate is None:
+        return preview_patch(np.empty(0), np.empty(0))
+    v_ref_kmh, v0_kmh, t_sim, kp, Tp, Ti, Td = (d if d is not None else v for d, v in zip(dragged, values))
+    with stage("preview"):
+        time, velocity = surrogate.velocity(kp, Ti, Td, Tp, kmh_to_ms(v_ref_kmh), kmh_to_ms(v0_kmh), t_sim)
+        return preview_patch(time, velocity)
+
 
-    return fig, current_data
+@callback(
+    Output('simulation-graph', 'figure', allow_duplicate=True),
+    Input('history-select', 'value'),
+    State('session-id', 'data'),
+    prevent_initial_call=True
+)
+def overlay_history(selected, session_id):
+    # Przebiegi leżą na serwerze – do przeglądarki trafiają tylko wybrane, już przerzedzone
+    runs = {r["id"]: r for r in run_history().runs(session_id)} if session_id else {}
+    selected = [run_id for run_id in selected or [] if run_id in runs]
+    patch = Patch()
+    with stage("history"):
+        for slot, index in enumerate(TRACE_HISTORY):
+            loaded = run_history().load(session_id, selected[slot]) if slot < len(selected) else None
+            trace = _series(*loaded, MAX_POINTS_PER_TRACE, ms_to_kmh) if loaded else {"x": [], "y": []}
+            patch["data"][index]["x"] = trace["x"]
+            patch["data"][index]["y"] = trace["y"]
+            patch["data"][index]["type"] = trace.get("type", "scatter")
+            patch["data"][index]["showlegend"] = loaded is not None
+            if loaded is not None:
+                patch["data"][index]["name"] = run_label(runs[selected[slot]])
+    return patch
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='127.0.0.1', port=8050)
\ No newline at end of file
+    create_app().run(debug=True, host='127.0.0.1', port=8050)
\ No newline at end of file
@@ -0,0 +1,176 @@
+import numpy as np
+
+# =============================================================================
+# WSKAŹNIKI JAKOŚCI ODPOWIEDZI SKOKOWEJ
+# =============================================================================
+# Jedno przejście po próbkach (również blokami – symulacja strumieniowa) i wektorowo
+# po dowolnej liczbie osi wsadowych: oś czasu jest zawsze ostatnia. Próbki NaN
+# (wypełnienie z simulate_batch) są pomijane.
+
+SETTLING_BAND = 0.02  # pasmo ±2% wielkości skoku
+RISE_LOW, RISE_HIGH = 0.1, 0.9
+
+_INTEGRALS = ("iae", "ise", "itae", "control_effort", "traction_impulse", "brake_impulse")
+
+
+def _first_time(mask, t):
+    """Chwila pierwszej próbki spełniającej mask (NaN, jeśli brak)."""
+    found = mask.any(axis=-1)
+    idx = mask.argmax(axis=-1)
+    return np.where(found, np.take_along_axis(t, idx[..., None], axis=-1)[..., 0], np.nan)
+
+
+def _last_time(mask, t):
+    """Chwila ostatniej próbki spełniającej mask (NaN, jeśli brak)."""
+    found = mask.any(axis=-1)
+    idx = mask.shape[-1] - 1 - mask[..., ::-1].argmax(axis=-1)
+    return np.where(found, np.take_along_axis(t, idx[..., None], axis=-1)[..., 0], np.nan)
+
+
+class StepMetrics:
+    """
+    Akumulator wskaźników: czas narastania (10–90%), przeregulowanie, czas regulacji,
+    uchyb ustalony, IAE/ISE/ITAE i koszt sterowania. Kolejne bloki podaje się do update().
+    """
+
+    def __init__(self, v_ref, v0, band=SETTLING_BAND):
+        self.v_ref = np.asarray(v_ref, dtype=float)
+        self.v0 = np.asarray(v0, dtype=float)
+        shape = np.broadcast_shapes(self.v_ref.shape, self.v0.shape)
+        self.v_ref = np.broadcast_to(self.v_ref, shape).copy()
+        self.v0 = np.broadcast_to(self.v0, shape).copy()
+        self.band = band
+
+        step = self.v_ref - self.v0
+        self.direction = np.where(step >= 0, 1.0, -1.0)
+        self.step_size = np.abs(step)
+
+        nan = np.full(shape, np.nan)
+        self.t_low, self.t_high = nan.copy(), nan.copy()
+        self.peak_excess = np.full(shape, -np.inf)
+        self.t_last_outside = nan.copy()
+        self.last_outside = np.zeros(shape, dtype=bool)
+        self.v_final = nan.copy()
+        self.integrals = {name: np.zeros(shape) for name in _INTEGRALS}
+        # Ostatnia próbka poprzedniego bloku – całkowanie metodą trapezów przez granicę bloków
+        self.t_prev = nan.copy()
+        self.prev = {name: nan.copy() for name in _INTEGRALS}
+
+    def update(self, time, velocity, control=None, traction=None, brake=None):
+        t = np.asarray(time, dtype=float)
+        v = np.asarray(velocity, dtype=float)
+        t = np.broadcast_to(t, v.shape)
+        if v.shape[-1] == 0:
+            return self
+        v_ref = self.v_ref[..., None]
+        err = v_ref - v
+        abs_err = np.abs(err)
+        valid = ~np.isnan(v)
+
+        # Czas narastania – pierwsze przekroczenia 10% i 90% skoku
+        progress = self.direction[..., None] * (v - self.v0[..., None])
+        for attr, level in (("t_low", RISE_LOW), ("t_high", RISE_HIGH)):
+            current = getattr(self, attr)
+            setattr(self, attr, np.where(np.isnan(current),
+                                         _first_time(progress >= level * self.step_size[..., None], t), current))
+
+        # Przeregulowanie – największe wyjście ponad wartość zadaną w kierunku skoku
+        excess = np.where(valid, -self.direction[..., None] * err, -np.inf)
+        self.peak_excess = np.fmax(self.peak_excess, excess.max(axis=-1))
+
+        # Czas regulacji – ostatnia próbka poza pasmem
+        outside = valid & (abs_err > self.band * self.step_size[..., None])
+        self.t_last_outside = np.where(outside.any(axis=-1), _last_time(outside, t), self.t_last_outside)
+        last_valid = _last_time(valid, t)
+        has_valid = ~np.isnan(last_valid)
+        idx = valid.shape[-1] - 1 - valid[..., ::-1].argmax(axis=-1)
+        self.last_outside = np.where(has_valid, np.take_along_axis(outside, idx[..., None], -1)[..., 0],
+                                     self.last_outside)
+        self.v_final = np.where(has_valid, np.take_along_axis(v, idx[..., None], -1)[..., 0], self.v_final)
+
+        # Całki (trapezy) – bieżący blok poprzedzony ostatnią próbką poprzedniego
+        integrands = {
+            "iae": abs_err, "ise": err ** 2, "itae": t * abs_err,
+            "control_effort": np.abs(control) if control is not None else None,
+            "traction_impulse": traction, "brake_impulse": brake,
+        }
+        t_ext = np.concatenate([self.t_prev[..., None], t], axis=-1)
+        dt = np.diff(t_ext, axis=-1)
+        for name, values in integrands.items():
+            if values is None:
+                continue
+            values = np.broadcast_to(np.asarray(values, dtype=float), v.shape)
+            ext = np.concatenate([self.prev[name][..., None], values], axis=-1)
+            segments = 0.5 * (ext[..., 1:] + ext[..., :-1]) * dt
+            self.integrals[name] = self.integrals[name] + np.nansum(segments, axis=-1)
+            self.prev[name] = np.where(has_valid, np.take_along_axis(values, idx[..., None], -1)[..., 0],
+                                       self.prev[name])
+        self.t_prev = np.where(has_valid, last_valid, self.t_prev)
+        return self
+
+    def result(self):
+        """Słownik wskaźników – skalary dla pojedynczej symulacji, tablice dla wsadu."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            relative = np.where(self.step_size > 0, self.peak_excess / self.step_size, np.nan)
+            out = {
+                "rise_time": self.t_high - self.t_low,
+                "overshoot": np.maximum(relative, 0.0) * 100.0,  # [%]
+                "settling_time": np.where(self.last_outside, np.nan,
+                                          np.where(np.isnan(self.t_last_outside), 0.0, self.t_last_outside)),
+                "steady_state_error": self.v_ref - self.v_final,
+                **self.integrals,
+            }
+        if self.v_ref.ndim == 0:
+            return {k: float(v) for k, v in out.items()}
+        return out
+
+    # -------------------------------------------------------------------------
+    # Zapis stanu (np. w dcc.Store między blokami symulacji strumieniowej)
+    # -------------------------------------------------------------------------
+    _STATE_FIELDS = ("v_ref", "v0", "t_low", "t_high", "peak_excess", "t_last_outside",
+                     "last_outside", "v_final", "t_prev")
+
+    def to_state(self):
+        state = {name: np.asarray(getattr(self, name)).tolist() for name in self._STATE_FIELDS}
+        state["band"] = self.band
+        state["integrals"] = {k: v.tolist() for k, v in self.integrals.items()}
+        state["prev"] = {k: v.tolist() for k, v in self.prev.items()}
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        acc = cls(state["v_ref"], state["v0"], state["band"])
+        for name in cls._STATE_FIELDS:
+            # JSON zapisuje NaN/inf jako None (dcc.Store) – stąd konwersja przez float
+            value = np.array(state[name], dtype=bool if name == "last_outside" else float)
+            setattr(acc, name, value)
+        acc.integrals = {k: np.array(v, dtype=float) for k, v in state["integrals"].items()}
+        acc.prev = {k: np.array(v, dtype=float) for k, v in state["prev"].items()}
+        return acc
+
+
+def step_metrics(time, velocity, v_ref, v0=None, control=None, traction=None, brake=None,
+                 band=SETTLING_BAND):
+    """
+    Wskaźniki odpowiedzi skokowej dla przebiegu (lub wsadu przebiegów, oś czasu ostatnia).
+    v0 – prędkość początkowa (domyślnie pierwsza próbka).
+    """
+    velocity = np.asarray(velocity, dtype=float)
+    if v0 is None:
+        v0 = velocity[..., 0]
+    return StepMetrics(v_ref, v0, band).update(time, velocity, control, traction, brake).result()
+
+
+class SimulationResult(dict):
+    """
+    Wynik CruiseControlSimulator.simulate / simulate_batch – zwykły słownik tablic
+    z dodatkowym atrybutem metrics liczonym dopiero przy pierwszym odczycie.
+    """
+
+    @property
+    def metrics(self):
+        if "_metrics" not in self.__dict__:
+            velocity = np.asarray(self["velocity"])
+            self._metrics = step_metrics(self["time"], velocity, self["v_ref"], velocity[..., 0],
+                                         self.get("control"), self.get("traction"), self.get("brake"))
+        return self._metrics
@@ -1,5 +1,59 @@
+from collections import namedtuple
+from functools import cached_property
+
 import numpy as np
 
+from core import IncrementalPI, VehiclePlant
+from metrics import step_metrics
+
+
+class CruiseControlRun(namedtuple("CruiseControlRun", ["t", "v", "u", "e"])):
+    """
+    Wynik simulate_cruise_control – rozpakowywany jak dawniej (t, v, u, e);
+    wskaźniki jakości (metrics) liczone dopiero przy pierwszym odczycie.
+    """
+    v_set = None
+    rhs_evaluations = None  # liczba obliczeń prawej strony równania ruchu
+
+    @cached_property
+    def metrics(self):
+        return step_metrics(self.t, self.v, self.v_set, self.v[0], control=self.u)
+
+
+def _per_sample(values, N, name):
+    """Skalar albo przebieg o długości N -> wektor N próbek."""
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 0:
+        return np.full(N, float(values))
+    if values.shape != (N,):
+        raise ValueError(f"{name}: oczekiwano skalara lub {N} próbek, otrzymano kształt {values.shape}")
+    return values
+
+
+class _GradeProfile:
+    """
+    Siła grawitacji z profilu trasy po przejechanej drodze – interpolacja liniowa
+    z indeksem odcinka przesuwanym razem z pojazdem (zamortyzowane O(1) na zapytanie).
+    """
+
+    def __init__(self, x_nodes, force_nodes):
+        # Listy Pythona – szybszy dostęp do pojedynczych elementów w pętli
+        self.x = x_nodes.tolist()
+        self.F = force_nodes.tolist()
+        self.j = 0
+
+    def force(self, x):
+        xs, j = self.x, self.j
+        while j < len(xs) - 1 and xs[j + 1] <= x:
+            j += 1
+        while j > 0 and xs[j] > x:  # etapy metody adaptacyjnej mogą sięgać wstecz
+            j -= 1
+        self.j = j
+        if x <= xs[0] or j == len(xs) - 1:
+            return self.F[j]
+        w = (x - xs[j]) / (xs[j + 1] - xs[j])
+        return self.F[j] + w * (self.F[j + 1] - self.F[j])
+
 
 def simulate_cruise_control(
         v_set=20.0,  # Prędkość zadana [m/s]
@@ -12,11 +66,27 @@ def simulate_cruise_control(
         ku=3000.0,  # Wzmocnienie napędu [N]
         c1=30.0,  # Opory toczenia [kg/s]
         c2=2.5,  # Opór aerodynamiczny [kg/m]
-        slope=0.0  # Nachylenie drogi [rad]
+        slope=0.0,  # Nachylenie drogi [rad] – stałe albo N próbek w czasie
+        slope_profile=None,  # Profil trasy (położenia [m] lub chwile [s], nachylenia [rad])
+        profile_axis="distance",  # Oś profilu: "distance" albo "time"
+        wind=0.0,  # Prędkość wiatru czołowego [m/s] – stała albo N próbek
+        load=0.0,  # Dodatkowa siła oporu [N] (np. przyczepa) – stała albo N próbek
+        integrator="euler",  # "euler" (krok Tp) albo "adaptive" (Dormand–Prince)
+        rtol=1e-6, atol=1e-8  # Tolerancje trybu "adaptive"
 ):
     """
     Symulacja układu tempomatu metodą Eulera (rozwiązanie rekurencyjne).
+
+    Profil slope_profile interpolowany jest liniowo (poza zakresem – wartości skrajne).
+    Dla osi "distance" nachylenie odczytywane jest po przejechanej drodze indeksem
+    przesuwanym razem z pojazdem, więc koszt kroku nie zależy od długości trasy.
+
+    W trybie "adaptive" ruch pojazdu między próbkami (sterowanie stałe w okresie Tp)
+    całkowany jest ze zmiennym krokiem, a zatrzymanie (v = 0) wyznaczane jako zdarzenie
+    zamiast obcinania prędkości po kroku.
     """
+    if integrator not in ("euler", "adaptive"):
+        raise ValueError(f"Nieznany integrator: {integrator}")
     g = 9.81
 
     # Inicjalizacja tablic
@@ -27,42 +97,60 @@ def simulate_cruise_control(
     # Warunki początkowe
     v[0] = v0
 
-    # Zmienne pomocnicze dla algorytmu przyrostowego
-    u_prev = 0.0
-    e_prev = 0.0
+    # Obiekt i regulator ze wspólnego silnika (core.py): opór c1·v + c2·(v + w)·|v + w|,
+    # regulator PI w postaci przyrostowej z sterowaniem w zakresie 0% - 100%
+    plant = VehiclePlant(m, c1, c2, rtol, atol)
+    controller = IncrementalPI(kp, Ti, Tp)
+    step_adaptive = plant.step_adaptive
+
+    # Zakłócenia liczone z góry dla całego przebiegu (siła w kroku n -> n+1)
+    t = np.arange(N) * Tp
+    F_ext = _per_sample(load, N, "load") + m * g * np.sin(_per_sample(slope, N, "slope"))
+    wind = _per_sample(wind, N, "wind")
+
+    grade = None
+    if slope_profile is not None:
+        x_nodes, slope_nodes = (np.asarray(a, dtype=float) for a in slope_profile)
+        if profile_axis == "time":
+            F_ext += m * g * np.sin(np.interp(t, x_nodes, slope_nodes))
+        elif profile_axis == "distance":
+            grade = _GradeProfile(x_nodes, m * g * np.sin(slope_nodes))
+        else:
+            raise ValueError(f"Nieznana oś profilu: {profile_axis}")
+    F_ext, wind = F_ext.tolist(), wind.tolist()
+    x = 0.0  # przejechana droga [m]
 
     for n in range(1, N):
         # 1. Obliczenie uchybu regulacji
         e[n] = v_set - v[n - 1]
 
         # 2. Regulator PI – algorytm przyrostowy
-        # delta_u = kp * (delta_e + (Tp/Ti)*e)
-        delta_e = e[n] - e_prev
-        du = kp * (delta_e + (Tp / Ti) * e[n])
+        u[n] = controller(e[n])
 
-        u[n] = u_prev + du
+        # 3. Siła napędu pomniejszona o zakłócenia (nachylenie drogi, obciążenie), stała w okresie
+        force = ku * u[n] - F_ext[n - 1]
 
-        # Ograniczenie sterowania (nasycenie 0% - 100%)
-        u[n] = np.clip(u[n], 0.0, 1.0)
+        # 4. Model fizyczny pojazdu
+        if integrator == "adaptive":
+            # Siły stałe w okresie próbkowania; przy profilu po drodze stan to (v, x)
+            if grade is None:
+                v[n] = step_adaptive(v[n - 1], force, Tp, wind[n - 1])
+            else:
+                v[n], x = step_adaptive(v[n - 1], force, Tp, wind[n - 1], grade.force, x)
+        else:
+            # Równanie różnicowe (Metoda Eulera, jeden krok na okres) – plant.step_euler
+            # z dt_sim = Tp rozpisany w pętli, bez wywołania na każdą próbkę
+            if grade is not None:
+                force -= grade.force(x)
+            v_prev = v[n - 1]
+            f_drag = c1 * v_prev
+            if c2:
+                v_air = v_prev + wind[n - 1]
+                f_drag = f_drag + c2 * v_air * abs(v_air)
+            v[n] = max(0, v_prev + (force - f_drag) / m * Tp)
+            x += Tp * v_prev
 
-        # 3. Zakłócenie (Nachylenie drogi - stałe dla całego przebiegu)
-        current_slope = slope
-
-        # 4. Model fizyczny pojazdu (Bilans sił)
-        F_drive = ku * u[n]
-        F_resist = c1 * v[n - 1] + c2 * (v[n - 1] ** 2)
-        F_gravity = m * g * np.sin(current_slope)
-
-        # Równanie różnicowe (Metoda Eulera)
-        v[n] = v[n - 1] + (Tp / m) * (F_drive - F_resist - F_gravity)
-
-        # Zabezpieczenie przed ujemną prędkością
-        if v[n] < 0:
-            v[n] = 0.0
-
-        # Zapamiętanie stanu do następnego kroku
-        u_prev = u[n]
-        e_prev = e[n]
-
-    t = np.arange(N) * Tp
-    return t, v, u, e
\ No newline at end of file
+    run = CruiseControlRun(t, v, u, e)
+    run.v_set = v_set
+    run.rhs_evaluations = plant.adaptive.n_eval if integrator == "adaptive" else N - 1
+    return run
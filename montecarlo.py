@@ -0,0 +1,171 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from batch import BatchStepper
+
+# =============================================================================
+# ANALIZA MONTE CARLO – ODPORNOŚĆ NA NIEPEWNOŚĆ PARAMETRÓW POJAZDU
+# =============================================================================
+# Parametry pojazdu losowane są jako mnożniki wartości z presetu, warianty liczone
+# paczkami (BatchStepper), a każda paczka od razu redukowana do histogramów w chwilach
+# próbkowania – pełny zbiór przebiegów nigdy nie jest przechowywany. Pamięć zależy
+# tylko od liczby kolumn czasu i przedziałów histogramu; percentyle odczytywane są
+# z histogramów na końcu (dokładność – szerokość przedziału).
+
+# Rozkłady mnożników: ("normal", średnia, odchylenie) | ("uniform", od, do) | ("lognormal", mediana, sigma)
+DEFAULT_UNCERTAINTY = {
+    "mass": ("uniform", 1.0, 1.35),  # ładunek: do +35% masy własnej
+    "drag_coeff": ("normal", 1.0, 0.10),
+    "max_traction": ("normal", 1.0, 0.05),
+    "max_brake": ("normal", 1.0, 0.08),
+}
+PERCENTILES = (5, 25, 50, 75, 95)
+N_BINS = 512
+MAX_COLUMNS = 1000  # kolumn czasu w histogramach (dłuższe przebiegi – co k-ta próbka)
+CHUNK_SIZE = 256  # wariantów w jednej paczce
+MIN_FACTOR = 0.05  # dolne ograniczenie mnożnika (rozkład normalny bywa ujemny)
+
+
+def _draw(rng, spec, n):
+    kind, a, b = spec
+    if kind == "normal":
+        return rng.normal(a, b, n)
+    if kind == "uniform":
+        return rng.uniform(a, b, n)
+    if kind == "lognormal":
+        return a * rng.lognormal(0.0, b, n)
+    raise ValueError(f"Nieznany rozkład: {kind}")
+
+
+def sample_parameters(vehicle_params, n, uncertainty=None, rng=None):
+    """n wylosowanych wariantów parametrów pojazdu – słownik tablic (mass, drag_coeff, ...)."""
+    rng = rng if rng is not None else np.random.default_rng()
+    uncertainty = DEFAULT_UNCERTAINTY if uncertainty is None else uncertainty
+    out = {}
+    for name in ("mass", "drag_coeff", "max_traction", "max_brake"):
+        factor = _draw(rng, uncertainty[name], n) if name in uncertainty else np.ones(n)
+        out[name] = vehicle_params[name] * np.maximum(factor, MIN_FACTOR)
+    return out
+
+
+class StreamingPercentiles:
+    """
+    Histogramy (kolumna czasu × przedział) na stałym zakresie [lo, hi]; wartości spoza
+    zakresu trafiają do skrajnych przedziałów. Histogramy z wielu procesów można sumować.
+    """
+
+    def __init__(self, n_columns, lo, hi, n_bins=N_BINS):
+        self.lo, self.hi, self.n_bins = float(lo), float(hi), n_bins
+        self.counts = np.zeros((n_columns, n_bins), dtype=np.int64)
+
+    def add(self, values):
+        """values – tablica (kolumny, warianty)."""
+        n_columns = self.counts.shape[0]
+        scale = self.n_bins / (self.hi - self.lo)
+        idx = np.clip(((values - self.lo) * scale).astype(np.int64), 0, self.n_bins - 1)
+        idx += np.arange(n_columns)[:, None] * self.n_bins
+        self.counts += np.bincount(idx.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+
+    def merge(self, counts):
+        self.counts += counts
+
+    def percentiles(self, q):
+        """Tablica (len(q), kolumny) – interpolacja liniowa wewnątrz przedziału."""
+        cdf = np.cumsum(self.counts, axis=1)
+        total = cdf[:, -1:]
+        width = (self.hi - self.lo) / self.n_bins
+        out = np.empty((len(q), self.counts.shape[0]))
+        for i, p in enumerate(q):
+            target = p / 100.0 * total
+            idx = np.minimum((cdf < target).sum(axis=1), self.n_bins - 1)
+            rows = np.arange(len(idx))
+            below = np.where(idx > 0, cdf[rows, np.maximum(idx - 1, 0)], 0)
+            in_bin = np.maximum(self.counts[rows, idx], 1)
+            frac = np.clip((target[:, 0] - below) / in_bin, 0.0, 1.0)
+            out[i] = self.lo + (idx + frac) * width
+        return out
+
+
+def _simulate_chunk(params, kp, Ti, Td, Tp, v_ref, v0, n_steps, stride, ranges, n_bins):
+    """Paczka wariantów -> histogramy prędkości i siły wypadkowej (wykonywane w procesie puli)."""
+    stepper = BatchStepper(kp, Ti, Td, Tp, params["mass"], params["drag_coeff"],
+                           params["max_traction"], params["max_brake"], v_ref, v0)
+    n_columns = -(-n_steps // stride)
+    velocity = np.empty((n_columns, len(stepper)))
+    force = np.empty((n_columns, len(stepper)))
+    f_net = np.zeros(len(stepper))
+    for k in range(n_steps):
+        v = stepper.v
+        if k < n_steps - 1:
+            _, _, _, _, f_trac, f_brake = stepper.step()
+            f_net = f_trac - f_brake
+        # Ostatnia próbka – siła z poprzedniego okresu (jak w CruiseControlSimulator.simulate)
+        if k % stride == 0:
+            velocity[k // stride] = v
+            force[k // stride] = f_net
+
+    out = {}
+    for name, values in (("velocity", velocity), ("force", force)):
+        hist = StreamingPercentiles(n_columns, *ranges[name], n_bins)
+        hist.add(values)
+        out[name] = hist.counts
+    return out
+
+
+def monte_carlo(vehicle_params, kp, Ti, Td, Tp, v_ref, v0, t_end, n_samples=2000, uncertainty=None,
+                percentiles=PERCENTILES, n_bins=N_BINS, max_columns=MAX_COLUMNS,
+                chunk_size=CHUNK_SIZE, workers=None, seed=None):
+    """
+    Obwiednie percentylowe prędkości [m/s] i siły wypadkowej F_trac - F_ham [N]
+    dla n_samples wariantów parametrów pojazdu.
+
+    workers: liczba procesów (domyślnie liczba rdzeni); 1 – obliczenia w bieżącym procesie.
+    Zwraca słownik: time, percentiles, velocity i force – tablice (len(percentiles), len(time)).
+    """
+    rng = np.random.default_rng(seed)
+    n_steps = int(t_end / Tp) + 1
+    stride = -(-n_steps // max_columns)
+    time = np.arange(0, n_steps, stride) * (t_end / max(n_steps - 1, 1))
+
+    # Zakresy histogramów z fizyki: prędkość ustalona przy pełnym napędzie F_max / b,
+    # siła wypadkowa od -F_ham_max do F_nap_max (z zapasem na rozrzut parametrów)
+    chunks = []
+    for start in range(0, n_samples, chunk_size):
+        chunks.append(sample_parameters(vehicle_params, min(chunk_size, n_samples - start), uncertainty, rng))
+    max_traction = max(c["max_traction"].max() for c in chunks)
+    max_brake = max(c["max_brake"].max() for c in chunks)
+    v_terminal = max((c["max_traction"] / np.maximum(c["drag_coeff"], 1e-9)).max() for c in chunks)
+    v_hi = min(max(v0, v_ref, v_terminal), 3.0 * max(v0, v_ref, 1.0))
+    ranges = {"velocity": (0.0, v_hi), "force": (-max_brake, max_traction)}
+
+    hists = {name: StreamingPercentiles(len(time), *ranges[name], n_bins) for name in ranges}
+    args = (kp, Ti, Td, Tp, v_ref, v0, n_steps, stride, ranges, n_bins)
+
+    if workers is None:
+        workers = min(os.cpu_count() or 1, len(chunks))
+    if workers <= 1:
+        for params in chunks:
+            for name, counts in _simulate_chunk(params, *args).items():
+                hists[name].merge(counts)
+    else:
+        # Co najwyżej 2 paczki na proces w locie – pamięć wyników nie rośnie z n_samples
+        with ProcessPoolExecutor(workers) as executor:
+            pending = set()
+            for params in chunks:
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for name, counts in future.result().items():
+                            hists[name].merge(counts)
+                pending.add(executor.submit(_simulate_chunk, params, *args))
+            for future in pending:
+                for name, counts in future.result().items():
+                    hists[name].merge(counts)
+
+    return {
+        "time": time, "percentiles": list(percentiles), "n_samples": n_samples,
+        "velocity": hists["velocity"].percentiles(percentiles),
+        "force": hists["force"].percentiles(percentiles),
+    }
@@ -0,0 +1,153 @@
+import numpy as np
+
+from batch import BatchStepper
+from core import V_MAX_REF, VEHICLE_PRESETS
+
+# =============================================================================
+# KOLUMNA POJAZDÓW (PLATOON) Z ADAPTACYJNYM TEMPOMATEM
+# =============================================================================
+# Pojazd 0 (lider) jedzie z tempomatem za profilem prędkości zadanej. Pozostałe pojazdy
+# mają ten sam regulator PID (BatchStepper.control) z wyborem uchybu jak w ACC:
+#   e = min(v_set - v, (odstęp - d_zad) / h) / V_MAX_REF,   d_zad = d_0 + h·v
+# (uchyb odstępu przeliczony na prędkość przez czas odstępu h), więc przy wolnej drodze
+# pojazd utrzymuje v_set, a za poprzednikiem – odstęp d_zad.
+# Stan wszystkich pojazdów to tablice po osi pojazdów; jeden krok pętli to jeden okres Tp
+# dla całej kolumny. Zamiast przebiegów zbierane są w locie wskaźniki na pojazd
+# (minimalny odstęp, odchyłki prędkości, wzmocnienie zaburzenia wzdłuż kolumny).
+# Położenie całkowane jest dokładnie (ZOH) razem z prędkością; zderzenia są tylko
+# rejestrowane – pojazdy mogą się "przenikać".
+
+HEADWAY = 1.5  # czas odstępu h [s]
+STANDSTILL_GAP = 5.0  # odstęp w bezruchu d_0 [m]
+VEHICLE_LENGTH = 5.0  # [m]
+
+
+class PlatoonStepper(BatchStepper):
+    """BatchStepper dla kolumny: wiersz i jedzie za wierszem i - 1, wiersz 0 – lider."""
+
+    def __init__(self, kp, Ti, Td, Tp, mass, drag_coeff, max_traction, max_brake, v_set, v0,
+                 headway=HEADWAY, standstill=STANDSTILL_GAP, length=VEHICLE_LENGTH):
+        if np.ndim(Tp) != 0:
+            raise ValueError("Kolumna pojazdów ma wspólny okres próbkowania Tp")
+        super().__init__(kp, Ti, Td, Tp, mass, drag_coeff, max_traction, max_brake, v_set, v0)
+        n = len(self)
+        self.headway = np.broadcast_to(np.asarray(headway, dtype=float), (n,)).copy()
+        self.standstill = np.broadcast_to(np.asarray(standstill, dtype=float), (n,)).copy()
+        self.length = np.broadcast_to(np.asarray(length, dtype=float), (n,)).copy()
+        if n > 1 and (self.headway[1:] <= 0).any():
+            raise ValueError("Czas odstępu headway musi być dodatni")
+        # Start w równowadze: odstępy zadane dla prędkości początkowych
+        gaps = self.standstill + self.headway * self.v
+        self.x = -np.concatenate([[0.0], np.cumsum(gaps[1:] + self.length[:-1])])
+        self.e_prev = self.error()
+
+    def gap(self):
+        """Odstęp do poprzednika [m] (lider – inf)."""
+        return np.concatenate([[np.inf], self.x[:-1] - self.length[:-1] - self.x[1:]])
+
+    def error(self):
+        gap_speed = np.empty_like(self.v)
+        gap_speed[0] = np.inf
+        gap_speed[1:] = (self.gap()[1:] - self.standstill[1:]) / self.headway[1:] - self.v[1:]
+        return np.minimum(self.v_ref - self.v, gap_speed) / V_MAX_REF
+
+    def step(self, v_ref=None):
+        """Jeden okres Tp dla całej kolumny; v_ref – bieżąca prędkość zadana lidera."""
+        if v_ref is not None:
+            self.v_ref[0] = v_ref
+        return self.control(self.error())
+
+    def advance(self, force):
+        # Droga w okresie z rozwiązania dokładnego (przed aktualizacją prędkości);
+        # jeśli pojazd staje w trakcie okresu – droga do zatrzymania. Współczynniki te same
+        # co w przejściu prędkości (VehiclePlant.zoh_coefficients, liczone raz dla Tp)
+        has_drag, b, decay = self.plant.zoh_coefficients(self.Tp)
+        v, m = self.v, self.mass
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tau = m / b
+            v_inf = force / b
+            dx_drag = np.where(
+                v_inf + (v - v_inf) * decay >= 0,
+                v_inf * self.Tp + (v - v_inf) * tau * (1 - decay),
+                v_inf * tau * np.log((v - v_inf) / -v_inf) + tau * v)
+            dx_free = np.where(v + force * self.Tp / m >= 0, v * self.Tp + force * self.Tp ** 2 / (2 * m),
+                               v ** 2 * m / (2 * -force))
+        self.x = self.x + np.where(has_drag, dx_drag, dx_free)
+        return super().advance(force)
+
+
+def fleet(vehicles):
+    """Lista nazw presetów lub słowników parametrów -> słownik tablic (mass, drag_coeff, ...)."""
+    params = [VEHICLE_PRESETS[v] if isinstance(v, str) else v for v in vehicles]
+    return {k: np.array([p[k] for p in params], dtype=float)
+            for k in ("mass", "drag_coeff", "max_traction", "max_brake")}
+
+
+def mixed_fleet(n, shares=None, rng=None):
+    """n pojazdów wylosowanych z presetów (shares – udziały presetów, domyślnie równe)."""
+    rng = rng if rng is not None else np.random.default_rng()
+    names = list(VEHICLE_PRESETS)
+    p = None if shares is None else np.array([shares.get(k, 0.0) for k in names]) / sum(shares.values())
+    return fleet(rng.choice(names, size=n, p=p))
+
+
+def simulate_platoon(vehicles, kp, Ti, Td, Tp, v_ref, v0, t_end, v_set=None, headway=HEADWAY,
+                     standstill=STANDSTILL_GAP, length=VEHICLE_LENGTH, record_every=None):
+    """
+    Symulacja kolumny pojazdów (vehicles – wynik fleet()/mixed_fleet() albo lista presetów).
+
+    v_ref: prędkość zadana lidera [m/s] – liczba albo tablica wartości w kolejnych próbkach;
+    v_set: prędkość tempomatu pojazdów za liderem (domyślnie max(v_ref)). Nastawy kp/Ti/Td,
+    headway, standstill i length – liczby albo tablice po pojazdach.
+    record_every: co ile próbek zapisać prędkości i odstępy (domyślnie – bez przebiegów).
+
+    Zwraca słownik tablic po pojazdach: min_gap [m] i t_min_gap [s], t_collision [s] (NaN –
+    bez zderzenia), max_speed_dev (max |v - v(0)|), speed_dev_l2 (√∫(v - v(0))² dt),
+    amplification i amplification_l2 – stosunek odchyłki do odchyłki poprzednika
+    (> 1 – zaburzenie rośnie wzdłuż kolumny, brak stabilności ciągu; lider – NaN).
+    """
+    if not isinstance(vehicles, dict):
+        vehicles = fleet(vehicles)
+    n_steps = int(t_end / Tp) + 1
+    profile = np.broadcast_to(np.asarray(v_ref, dtype=float), (n_steps,))
+    v_set = profile.max() if v_set is None else v_set
+    stepper = PlatoonStepper(kp, Ti, Td, Tp, vehicles["mass"], vehicles["drag_coeff"], vehicles["max_traction"],
+                             vehicles["max_brake"], v_set, v0, headway, standstill, length)
+    n = len(stepper)
+    dt = t_end / max(n_steps - 1, 1)
+
+    v_start = stepper.v.copy()
+    min_gap = np.full(n, np.inf)
+    t_min_gap = np.full(n, np.nan)
+    t_collision = np.full(n, np.nan)
+    max_dev = np.zeros(n)
+    energy = np.zeros(n)
+    records = {"time": [], "velocity": [], "gap": []} if record_every else None
+
+    for k in range(n_steps):
+        t = k * dt
+        gap = stepper.gap()
+        closer = gap < min_gap
+        min_gap = np.where(closer, gap, min_gap)
+        t_min_gap = np.where(closer, t, t_min_gap)
+        t_collision = np.where(np.isnan(t_collision) & (gap <= 0), t, t_collision)
+        dev = stepper.v - v_start
+        np.maximum(max_dev, np.abs(dev), out=max_dev)
+        energy += dev ** 2 * (dt if 0 < k < n_steps - 1 else dt / 2)  # wzór trapezów
+        if records is not None and k % record_every == 0:
+            records["time"].append(t)
+            records["velocity"].append(stepper.v.copy())
+            records["gap"].append(gap)
+        if k < n_steps - 1:
+            stepper.step(profile[k])
+
+    l2 = np.sqrt(energy)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        amplification = np.concatenate([[np.nan], max_dev[1:] / max_dev[:-1]])
+        amplification_l2 = np.concatenate([[np.nan], l2[1:] / l2[:-1]])
+    out = {"min_gap": min_gap, "t_min_gap": t_min_gap, "t_collision": t_collision,
+           "max_speed_dev": max_dev, "speed_dev_l2": l2,
+           "amplification": amplification, "amplification_l2": amplification_l2}
+    if records is not None:
+        out.update({k: np.array(v) for k, v in records.items()})
+    return out
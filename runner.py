@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+import numpy as np
+
+from batch import CHANNELS, simulate_batch
+from core import VEHICLE_PRESETS, CruiseControlSimulator
+from metrics import step_metrics
+
+# =============================================================================
+# WSADOWE URUCHAMIANIE SCENARIUSZY (BEZ INTERFEJSU WWW)
+# =============================================================================
+# python runner.py scenariusze.jsonl -o wyniki/ [--workers 8] [--chunk-size 64]
+#
+# Jeden scenariusz na wiersz (prędkości w m/s), np.:
+# {"id": "a1", "vehicle": "truck", "kp": 15, "Tp": 0.5, "Ti": 5, "Td": 0.1,
+#  "v_ref": 25, "v0": 0, "t_end": 600}
+# "vehicle" to nazwa presetu albo słownik parametrów (mass, drag_coeff, max_traction,
+# max_brake); opcjonalnie "integrator": "exact" | "euler" | "adaptive".
+#
+# Wiersze czytane są strumieniowo i dzielone na paczki po chunk_size scenariuszy;
+# każda paczka trafia do osobnego pliku chunk-NNNNNN.npz (kolumnowo: kanały
+# sklejone w jedną tablicę float32 + offsets, wskaźniki jakości jako kolumny).
+# manifest.jsonl zapisywany jest po każdej zakończonej paczce – przerwane uruchomienie
+# wznawia się tym samym poleceniem (gotowe paczki są pomijane).
+
+DEFAULT_CHUNK_SIZE = 64
+DEFAULT_CHANNELS = ("velocity", "traction", "brake")
+METRIC_CHANNELS = ("velocity", "control", "traction", "brake")  # wejście step_metrics
+MANIFEST = "manifest.jsonl"
+SCENARIO_KEYS = ("kp", "Tp", "Ti", "Td", "v_ref", "v0", "t_end")
+VEHICLE_KEYS = ("mass", "drag_coeff", "max_traction", "max_brake")
+INTEGRATORS = ("exact", "euler", "adaptive")
+
+
+def parse_scenario(line, lineno):
+    """Wiersz JSONL -> słownik scenariusza z rozwiniętymi parametrami pojazdu."""
+    try:
+        raw = json.loads(line)
+    except json.JSONDecodeError as exc:
+        raise ValueError(f"wiersz {lineno}: niepoprawny JSON ({exc})") from None
+    return scenario_from_dict(raw, lineno, f"wiersz {lineno}")
+
+
+def scenario_from_dict(raw, default_id, where):
+    """Słownik jak w wierszu JSONL -> scenariusz; where – położenie do komunikatów błędów."""
+    if not isinstance(raw, dict):
+        raise ValueError(f"{where}: oczekiwano obiektu JSON")
+    vehicle = raw.get("vehicle", "city_car")
+    if isinstance(vehicle, str):
+        if vehicle not in VEHICLE_PRESETS:
+            raise ValueError(f"{where}: nieznany pojazd {vehicle!r}")
+        vehicle = VEHICLE_PRESETS[vehicle]
+    elif not isinstance(vehicle, dict):
+        raise ValueError(f"{where}: vehicle musi być nazwą presetu albo obiektem parametrów")
+    missing = [k for k in SCENARIO_KEYS if k not in raw] + [f"vehicle.{k}" for k in VEHICLE_KEYS
+                                                             if k not in vehicle]
+    if missing:
+        raise ValueError(f"{where}: brak pól {', '.join(missing)}")
+    values = {k: vehicle[k] for k in VEHICLE_KEYS}
+    values.update({k: raw[k] for k in SCENARIO_KEYS})
+    # Tylko liczby JSON – bez napisów i wartości logicznych
+    if not all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in values.values()):
+        raise ValueError(f"{where}: parametry muszą być liczbami")
+    scenario = {k: float(x) for k, x in values.items()}
+    if not np.isfinite(list(scenario.values())).all():
+        raise ValueError(f"{where}: parametry muszą być skończone")
+    if min(scenario["mass"], scenario["Tp"], scenario["Ti"]) <= 0:
+        raise ValueError(f"{where}: wymagane mass, Tp, Ti > 0")
+    if min(scenario[k] for k in ("drag_coeff", "max_traction", "max_brake", "Td", "t_end")) < 0:
+        raise ValueError(f"{where}: wymagane drag_coeff, max_traction, max_brake, Td, t_end >= 0")
+    scenario["id"] = str(raw.get("id", default_id))
+    scenario["integrator"] = raw.get("integrator", "exact")
+    if not isinstance(scenario["integrator"], str) or scenario["integrator"] not in INTEGRATORS:
+        raise ValueError(f"{where}: nieznany integrator {scenario['integrator']!r}")
+    return scenario
+
+
+def _read_chunks(path, chunk_size):
+    """Generator (numer paczki, [(nr wiersza, wiersz), ...]) – bez wczytywania całego pliku."""
+    with open(path, encoding="utf-8") as f:
+        lines = ((i, line) for i, line in enumerate(f, start=1) if line.strip())
+        for index, chunk in enumerate(iter(lambda: list(islice(lines, chunk_size)), [])):
+            yield index, chunk
+
+
+def simulate_scenarios(scenarios, channels=CHANNELS):
+    """
+    Symulacja paczki – wspólne wywołanie simulate_batch dla "exact"/"euler" (osobno dla każdej
+    liczby próbek, żeby krótkie przebiegi nie były dopełniane do najdłuższego), reszta pojedynczo.
+    channels – przebiegi potrzebne w wyniku (poza "time"); wskaźniki jakości wymagają METRIC_CHANNELS.
+    """
+    results = [None] * len(scenarios)
+    groups = {}
+    for i, s in enumerate(scenarios):
+        if s["integrator"] in ("exact", "euler"):
+            groups.setdefault((s["integrator"], int(s["t_end"] / s["Tp"]) + 1), []).append(i)
+    for (integrator, _), idx in groups.items():
+        cols = {k: np.array([scenarios[i][k] for i in idx]) for k in SCENARIO_KEYS + VEHICLE_KEYS}
+        res = simulate_batch(cols["kp"], cols["Ti"], cols["Td"], cols["Tp"], cols["mass"],
+                             cols["drag_coeff"], cols["max_traction"], cols["max_brake"],
+                             cols["v_ref"], cols["v0"], cols["t_end"], integrator=integrator,
+                             channels=channels)
+        for row, i in enumerate(idx):
+            n = res["n_steps"][row]
+            results[i] = {name: res[name][row, :n] for name in tuple(channels) + ("time",)}
+    for i, s in enumerate(scenarios):
+        if results[i] is None:
+            sim = CruiseControlSimulator(s, s["kp"], s["Tp"], s["Ti"], s["Td"])
+            results[i] = sim.simulate(s["v_ref"], s["v0"], s["t_end"], integrator=s["integrator"])
+    return results
+
+
+def _metric_columns(scenarios, results):
+    metrics = [step_metrics(r["time"], r["velocity"], s["v_ref"], s["v0"], r["control"],
+                            r["traction"], r["brake"]) for s, r in zip(scenarios, results)]
+    return {name: np.array([m[name] for m in metrics]) for name in metrics[0]}
+
+
+def result_columns(scenarios, results, channels, metrics=True, dtype=np.float32):
+    """
+    Wyniki kolumnowo (jak w plikach paczek): id, offsets, t_end, kanały sklejone w jedną
+    tablicę (przebieg i – [offsets[i]:offsets[i + 1]]) i wskaźniki jako kolumny metric_*.
+    """
+    lengths = np.array([len(r["time"]) for r in results], dtype=np.int64)
+    columns = {
+        "id": np.array([s["id"] for s in scenarios]),
+        "offsets": np.concatenate([[0], np.cumsum(lengths)]),
+        "t_end": np.array([s["t_end"] for s in scenarios]),
+    }
+    for name in channels:
+        columns[name] = np.concatenate([r[name] for r in results]).astype(dtype)
+    if metrics:
+        for name, value in _metric_columns(scenarios, results).items():
+            columns["metric_" + name] = value
+    return columns
+
+
+def run_chunk(index, lines, out_dir, channels):
+    """Przetworzenie jednej paczki w procesie roboczym; zwraca wpis do manifestu."""
+    scenarios = [parse_scenario(line, lineno) for lineno, line in lines]
+    results = simulate_scenarios(scenarios, tuple(dict.fromkeys([*channels, *METRIC_CHANNELS])))
+    columns = result_columns(scenarios, results, channels)
+    columns["line"] = np.array([lineno for lineno, _ in lines])
+
+    # Zapis atomowy – w katalogu nigdy nie ma niekompletnego pliku paczki
+    name = f"chunk-{index:06d}.npz"
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        np.savez(f, **columns)
+    os.replace(tmp_path, os.path.join(out_dir, name))
+    return {"chunk": index, "file": name, "first_line": lines[0][0], "last_line": lines[-1][0],
+            "scenarios": len(scenarios)}
+
+
+def _load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST)
+    header, done = None, set()
+    if not os.path.exists(path):
+        return header, done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:  # niedokończony ostatni wiersz po przerwaniu
+                continue
+            if "chunk" in entry:
+                if os.path.exists(os.path.join(out_dir, entry["file"])):
+                    done.add(entry["chunk"])
+            else:
+                header = entry
+    return header, done
+
+
+def run(scenarios_path, out_dir, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, channels=DEFAULT_CHANNELS,
+        log=None):
+    """
+    Przetwarza plik scenariuszy; zwraca liczbę paczek policzonych w tym uruchomieniu.
+    Przy wznawianiu obowiązują chunk_size i kanały z nagłówka manifestu.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    header, done = _load_manifest(out_dir)
+    if header is None:
+        header = {"source": os.path.abspath(scenarios_path), "chunk_size": chunk_size, "channels": list(channels)}
+        with open(os.path.join(out_dir, MANIFEST), "a", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+    chunk_size, channels = header["chunk_size"], header["channels"]
+    if log and done:
+        log(f"wznowienie: {len(done)} paczek już policzonych")
+
+    workers = workers or os.cpu_count() or 1
+    manifest = open(os.path.join(out_dir, MANIFEST), "a+", encoding="utf-8")
+    manifest.seek(0, os.SEEK_END)
+    if manifest.tell() > 0:
+        manifest.seek(manifest.tell() - 1)
+        if manifest.read(1) != "\n":  # urwany wiersz po przerwaniu – nowe wpisy od nowej linii
+            manifest.write("\n")
+    computed = 0
+
+    def record(entry):
+        nonlocal computed
+        manifest.write(json.dumps(entry) + "\n")
+        manifest.flush()
+        os.fsync(manifest.fileno())
+        computed += 1
+        if log:
+            log(f"paczka {entry['chunk']}: wiersze {entry['first_line']}–{entry['last_line']}")
+
+    try:
+        todo = ((i, lines) for i, lines in _read_chunks(scenarios_path, chunk_size) if i not in done)
+        if workers == 1:
+            for index, lines in todo:
+                record(run_chunk(index, lines, out_dir, channels))
+            return computed
+        # Ograniczona liczba paczek w locie – pamięć nie zależy od rozmiaru pliku
+        with ProcessPoolExecutor(workers) as executor:
+            pending = set()
+            for index, lines in todo:
+                if len(pending) >= 2 * workers:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        record(future.result())
+                pending.add(executor.submit(run_chunk, index, lines, out_dir, channels))
+            for future in pending:
+                record(future.result())
+    finally:
+        manifest.close()
+    return computed
+
+
+def iter_results(out_dir):
+    """
+    Odczyt wyników: generator (id, kanały, wskaźniki) w kolejności paczek.
+    Czas: np.linspace(0, t_end, len(kanału)).
+    """
+    _, done = _load_manifest(out_dir)
+    for index in sorted(done):
+        with np.load(os.path.join(out_dir, f"chunk-{index:06d}.npz")) as data:
+            offsets = data["offsets"]
+            channels = [k for k in data.files if k in CHANNELS]
+            metric_names = [k for k in data.files if k.startswith("metric_")]
+            arrays = {k: data[k] for k in channels + metric_names}
+            for i, scenario_id in enumerate(data["id"]):
+                a, b = offsets[i], offsets[i + 1]
+                yield (str(scenario_id), {k: arrays[k][a:b] for k in channels},
+                       {k[len("metric_"):]: float(arrays[k][i]) for k in metric_names})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Wsadowa symulacja scenariuszy z pliku JSONL")
+    parser.add_argument("scenarios", help="plik JSONL – jeden scenariusz na wiersz")
+    parser.add_argument("-o", "--output", required=True, help="katalog wyników (wznawianie – ten sam)")
+    parser.add_argument("--workers", type=int, help="liczba procesów (domyślnie liczba rdzeni)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="scenariuszy na plik")
+    parser.add_argument("--channels", default=",".join(DEFAULT_CHANNELS),
+                        help=f"zapisywane przebiegi, spośród: {','.join(CHANNELS)}")
+    args = parser.parse_args(argv)
+
+    channels = [c for c in args.channels.split(",") if c]
+    unknown = set(channels) - set(CHANNELS)
+    if unknown:
+        parser.error(f"nieznane kanały: {', '.join(sorted(unknown))}")
+    try:
+        n = run(args.scenarios, args.output, args.workers, args.chunk_size, channels,
+                log=lambda msg: print(msg, file=sys.stderr))
+    except ValueError as exc:
+        print(f"błąd: {exc}", file=sys.stderr)
+        return 2
+    print(f"policzono {n} paczek -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
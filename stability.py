@@ -0,0 +1,223 @@
+import numpy as np
+
+from core import V_MAX_REF
+
+# =============================================================================
+# ANALIZA STABILNOŚCI UKŁADU ZAMKNIĘTEGO (BEZ SYMULACJI W DZIEDZINIE CZASU)
+# =============================================================================
+# Poza nasyceniem sterowania i ograniczeniem v >= 0 model z CruiseControlSimulator
+# jest liniowy. Po dyskretyzacji (ZOH, okres Tp) w zmiennej y = v / V_MAX_REF:
+#   obiekt:    y[k+1] = a·y[k] + g·u[k],  a = exp(-b·Tp/m),  g = F_max·(1 - a) / (b·V_MAX_REF)
+#   regulator: u = kp·(e + r·S + q·Δe),   S[k] = Σ_{j<k} e[j],  r = Tp/Ti,  q = Td/Tp
+# czyli C(z) = kp·(1 + r/(z - 1) + q·(z - 1)/z), P(z) = g/(z - a), a wielomian
+# charakterystyczny z·(z - 1)·(z - a) + kp·g·(z·(z - 1) + r·z + q·(z - 1)²):
+#   z³ + [-(1 + a) + kg·(1 + q)]·z² + [a + kg·(r - 1 - 2q)]·z + kg·q,   kg = kp·g.
+# Wszystkie funkcje rozgłaszają parametry (jak NumPy) – siatka nastaw to np.
+# kp[:, None] i Ti[None, :]. Stabilność rozstrzyga kryterium Jury'ego (bez pierwiastków).
+
+N_FREQ = 128  # punktów siatki częstotliwości (logarytmicznej, do częstotliwości Nyquista)
+THETA_MIN = 1e-4  # najniższa częstotliwość względna ω·Tp [rad]
+
+
+def plant(vehicle_params, Tp, actuator="traction"):
+    """Parametry (a, g) dyskretnego obiektu; actuator="brake" – wzmocnienie przy hamowaniu."""
+    m = np.asarray(vehicle_params["mass"], dtype=float)
+    b = np.asarray(vehicle_params["drag_coeff"], dtype=float)
+    f_max = np.asarray(vehicle_params["max_traction" if actuator == "traction" else "max_brake"], dtype=float)
+    Tp = np.asarray(Tp, dtype=float)
+    a = np.exp(-b * Tp / m)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gain = np.where(b > 0, (1 - a) / b, Tp / m)  # b = 0: całkowanie czyste
+    return a, f_max * gain / V_MAX_REF
+
+
+def characteristic_polynomial(vehicle_params, kp, Ti, Td, Tp, actuator="traction"):
+    """Współczynniki [1, c2, c1, c0] wielomianu charakterystycznego – tablica (..., 4)."""
+    a, g = plant(vehicle_params, Tp, actuator)
+    kg = np.asarray(kp, dtype=float) * g
+    r = np.asarray(Tp, dtype=float) / np.asarray(Ti, dtype=float)
+    q = np.asarray(Td, dtype=float) / np.asarray(Tp, dtype=float)
+    c2 = -(1 + a) + kg * (1 + q)
+    c1 = a + kg * (r - 1 - 2 * q)
+    c0 = kg * q
+    c2, c1, c0 = np.broadcast_arrays(c2, c1, c0)
+    return np.stack([np.ones_like(c2), c2, c1, c0], axis=-1)
+
+
+def jury_stable(coeffs):
+    """Kryterium Jury'ego dla z³ + c2·z² + c1·z + c0: wszystkie bieguny w kole jednostkowym."""
+    c2, c1, c0 = coeffs[..., 1], coeffs[..., 2], coeffs[..., 3]
+    p_plus = 1 + c2 + c1 + c0  # P(1) > 0
+    p_minus = 1 - c2 + c1 - c0  # -P(-1) > 0
+    return (p_plus > 0) & (p_minus > 0) & (np.abs(c0) < 1) & (np.abs(c0 ** 2 - 1) > np.abs(c0 * c2 - c1))
+
+
+def closed_loop_poles(coeffs):
+    """
+    Bieguny układu zamkniętego – tablica (..., 3). Wzory Cardana (zespolone, wektorowo)
+    i dwa kroki Newtona na wielomianie wyjściowym – kilka razy szybciej niż
+    np.linalg.eigvals dla macierzy towarzyszących.
+    """
+    b, c, d = coeffs[..., 1, None], coeffs[..., 2, None], coeffs[..., 3, None]
+    # z = t - b/3: t³ + p·t + s = 0
+    p = c - b * b / 3
+    s = 2 * b ** 3 / 27 - b * c / 3 + d
+    root = np.sqrt((s * s / 4 + p ** 3 / 27).astype(complex))
+    # Znak pierwiastka wybrany tak, by uniknąć odejmowania bliskich liczb
+    w = -s / 2 + np.where((-s / 2 * root.conj()).real >= 0, root, -root)
+    C = w ** (1 / 3) * np.exp(2j * np.pi / 3 * np.arange(3))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(C != 0, C - p / (3 * C), 0) - b / 3
+        for _ in range(2):
+            f = ((z + b) * z + c) * z + d
+            df = (3 * z + 2 * b) * z + c
+            z = z - np.where(df != 0, f / df, 0)
+    return z
+
+
+def _crossings(x, values):
+    """
+    Interpolowane wartości values w miejscach zmiany znaku x (wzdłuż ostatniej osi)
+    – tablica jak x[..., 1:], NaN tam, gdzie nie ma przejścia.
+    """
+    x0, x1 = x[..., :-1], x[..., 1:]
+    hit = (x0 > 0) != (x1 > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frac = np.where(hit, x0 / (x0 - x1), np.nan)
+    return values[..., :-1] + frac * (values[..., 1:] - values[..., :-1])
+
+
+def _frequency_response(a, r, q, theta):
+    """
+    |L|/kg [dB] i faza L [°] na siatce theta = ω·Tp ∈ (0, π] – tablice (len(a), len(theta)).
+    Dla z = exp(jθ): L = kg·N / ((z - 1)·(z - a)), N = r - 1 - 2q + (1 + 2q)·cosθ + j·sinθ,
+    arg(z - 1) = π/2 + θ/2. Im N > 0 i Im(z - a) > 0, więc faza wychodzi bez rozwijania
+    i w całości w (-360°, 90°): jedyne przejście krytyczne to -180°.
+    """
+    cos, sin = np.cos(theta), np.sin(theta)
+    re_num = (r - 1 - 2 * q)[:, None] + (1 + 2 * q)[:, None] * cos
+    re_den = cos - a[:, None]
+    mag2 = (re_num ** 2 + sin ** 2) / (4 * np.sin(theta / 2) ** 2 * (re_den ** 2 + sin ** 2))
+    phase = np.degrees(np.arctan2(sin, re_num) - np.arctan2(sin, re_den) - np.pi / 2 - theta / 2)
+    return 10 * np.log10(mag2), phase
+
+
+def _unique_rows(x):
+    """np.unique(x, axis=0, return_inverse=True) przez lexsort – kilka razy szybciej dla liczb."""
+    order = np.lexsort(x.T[::-1])
+    ordered = x[order]
+    new = np.ones(len(x), dtype=bool)
+    new[1:] = np.any(ordered[1:] != ordered[:-1], axis=-1)
+    inverse = np.empty(len(x), dtype=int)
+    inverse[order] = np.cumsum(new) - 1
+    return ordered[new], inverse
+
+
+def _monotone_runs(values):
+    """
+    Podział wierszy values na odcinki monotoniczne (niemalejące / malejące): indeksy punktów
+    początku i końca – tablice (wiersze, R) – oraz liczba odcinków w wierszu. Sąsiednie
+    odcinki mają wspólny punkt; każdy przedział siatki należy do dokładnie jednego.
+    """
+    up = np.diff(values, axis=-1) >= 0
+    begins = np.ones(up.shape, dtype=bool)
+    begins[:, 1:] = up[:, 1:] != up[:, :-1]
+    n_runs = begins.sum(axis=-1)
+    rows, cols = np.nonzero(begins)
+    run = np.cumsum(begins, axis=-1)[rows, cols] - 1
+    starts = np.zeros((len(values), n_runs.max(initial=1)), dtype=int)
+    ends = np.zeros_like(starts)
+    starts[rows, run] = cols
+    ends[:, :-1] = starts[:, 1:]
+    ends[np.arange(len(values)), n_runs - 1] = values.shape[-1] - 1
+    return starts, ends, n_runs
+
+
+def _bisect(lo, hi, inside, steps):
+    """Wektorowa bisekcja: ostatni indeks z inside(k) = inside(lo) w [lo, hi) (inside monotoniczne)."""
+    first = inside(lo)
+    for _ in range(steps):
+        mid = (lo + hi) // 2
+        same = inside(mid) == first
+        lo, hi = np.where(same, mid, lo), np.where(same, hi, mid)
+    return lo
+
+
+def _margins(a, kg, r, q, theta):
+    """
+    Zapasy i pasmo dla zestawów (tablice 1D). Faza nie zależy od kp – charakterystyki
+    liczone są raz dla każdej różnej trójki (a, r, q), a kp tylko przesuwa moduł; na zestaw
+    przypada wyszukiwanie binarne po siatce częstotliwości zamiast przeglądania jej całej.
+    """
+    keys, inverse = _unique_rows(np.stack([a, r, q], axis=-1))
+    unit_db, phase = _frequency_response(*keys.T, theta)
+    to_critical = phase + 180.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gain_db = 20 * np.log10(kg)
+    steps = len(theta).bit_length()
+
+    # Zapas wzmocnienia: przejścia fazy przez -180° – najmniejszy z nich. Przy częstotliwości
+    # Nyquista L(-1) jest rzeczywiste – faza często osiąga tam -180° dokładnie.
+    at_phase = _crossings(to_critical, unit_db)
+    at_nyquist = np.where(np.abs(to_critical[:, -1]) < 1e-6, unit_db[:, -1], -np.inf)
+    unit_margin = -np.maximum(np.max(np.where(np.isnan(at_phase), -np.inf, at_phase), axis=-1), at_nyquist)
+    gain_margin = unit_margin[inverse] - gain_db
+
+    # Zapas fazy: przejścia |L| przez 0 dB (ujemny – układ niestabilny). Na odcinku
+    # monotonicznym modułu jest co najwyżej jedno – bisekcja, interpolacja jak w _crossings.
+    starts, ends, n_runs = _monotone_runs(unit_db)
+    phase_margin = np.full(len(kg), np.inf)
+    for j in range(starts.shape[1]):
+        lo, hi = starts[inverse, j], ends[inverse, j]
+
+        def above(k):
+            return unit_db[inverse, k] + gain_db > 0
+
+        hit = (j < n_runs[inverse]) & (above(lo) != above(hi))
+        k = _bisect(lo, hi, above, steps)
+        x0, x1 = unit_db[inverse, k] + gain_db, unit_db[inverse, k + 1] + gain_db
+        with np.errstate(divide="ignore", invalid="ignore"):
+            frac = x0 / (x0 - x1)
+        value = to_critical[inverse, k] + frac * (to_critical[inverse, k + 1] - to_critical[inverse, k])
+        phase_margin = np.where(hit & (value < phase_margin), value, phase_margin)
+
+    # Pasmo: pierwsze |T|² = |L|² / |1 + L|² < 1/2, czyli |L|² - 2·|L|·cos φ - 1 < 0. Dla kp >= 0
+    # to kg < K(θ) = (cos φ + √(cos² φ + 1)) / |L/kg| – pierwsza taka częstotliwość to
+    # pierwsze przekroczenie kg przez bieżące maksimum K (ciąg niemalejący).
+    cos_phase = np.cos(np.radians(phase))
+    root = np.sqrt(cos_phase ** 2 + 1)
+    rho = np.where(cos_phase >= 0, cos_phase + root, 1 / (root - cos_phase))
+    reach = np.maximum.accumulate(rho / 10 ** (unit_db / 20), axis=-1)
+    n = len(theta)
+    first = _bisect(np.full(len(kg), -1), np.full(len(kg), n - 1),
+                    lambda k: (k < 0) | (reach[inverse, np.maximum(k, 0)] <= kg), steps)
+    bandwidth = np.where(reach[inverse, -1] > kg, theta[np.minimum(first + 1, n - 1)], np.nan)
+    return gain_margin, phase_margin, bandwidth
+
+
+def stability_map(vehicle_params, kp, Ti, Td, Tp, actuator="traction", margins=True, n_freq=N_FREQ):
+    """
+    Mapa stabilności dla rozgłoszonych nastaw (i ew. parametrów pojazdu).
+
+    Zwraca słownik tablic o wspólnym kształcie:
+      stable – kryterium Jury'ego, spectral_radius – max |z| biegunów, poles (..., 3),
+      przy margins=True: gain_margin [dB], phase_margin [°] (inf – brak przejścia),
+      bandwidth [rad/s] (NaN – |T| nie spada poniżej -3 dB do częstotliwości Nyquista).
+    """
+    coeffs = characteristic_polynomial(vehicle_params, kp, Ti, Td, Tp, actuator)
+    poles = closed_loop_poles(coeffs)
+    out = {"stable": jury_stable(coeffs), "spectral_radius": np.abs(poles).max(axis=-1), "poles": poles}
+    if not margins:
+        return out
+
+    shape = coeffs.shape[:-1]
+    a, g = plant(vehicle_params, Tp, actuator)
+    a, kg, r, q, Tp = (np.broadcast_to(x, shape).ravel() for x in (
+        a, np.asarray(kp) * g, np.asarray(Tp, dtype=float) / np.asarray(Ti, dtype=float),
+        np.asarray(Td, dtype=float) / np.asarray(Tp, dtype=float), np.asarray(Tp, dtype=float)))
+    theta = np.geomspace(THETA_MIN, np.pi, n_freq)
+    gm, pm, bw = _margins(a, kg, r, q, theta)
+    out["gain_margin"] = gm.reshape(shape)
+    out["phase_margin"] = pm.reshape(shape)
+    out["bandwidth"] = (bw / Tp).reshape(shape)
+    return out
@@ -0,0 +1,143 @@
+import json
+import os
+
+import numpy as np
+
+from metrics import SimulationResult, StepMetrics
+
+# =============================================================================
+# WYNIKI W PLIKACH MAPOWANYCH W PAMIĘCI (BARDZO DŁUGIE SYMULACJE)
+# =============================================================================
+# Każdy kanał to osobny plik .npy zapisywany sekwencyjnie blokami w trakcie symulacji
+# (CruiseControlSimulator.simulate(..., out_dir=...)), więc pamięć nie zależy od
+# horyzontu. Oś czasu jest równomierna – nie jest zapisywana (ImplicitTime).
+# Wskaźniki jakości liczone są w tym samym przejściu i trafiają do meta.json, który
+# zapisywany jest na końcu – katalog bez meta.json to zapis przerwany.
+# Odczyt: open_result(katalog) – kanały jako np.memmap tylko do odczytu.
+
+STORE_BLOCK = 65536  # próbek w jednym bloku zapisu
+STORE_DTYPE = np.dtype("<f4")  # domyślny typ kanałów (float32, little-endian)
+CHANNELS = ("velocity", "error", "control", "traction", "brake", "integral", "derivative")
+META = "meta.json"
+
+
+class ImplicitTime:
+    """
+    Oś czasu t_k = k·dt (k = 0..n-1) bez tablicy w pamięci – wartości wyliczane przy
+    indeksowaniu; identyczne z np.linspace(0, t_end, n).
+    """
+
+    def __init__(self, n, t_end):
+        self.n = n
+        self.t_end = float(t_end)
+        self.dt = self.t_end / max(n - 1, 1)
+
+    ndim = 1
+    dtype = np.dtype(float)
+
+    @property
+    def shape(self):
+        return (self.n,)
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            k = np.arange(*key.indices(self.n))
+        else:
+            k = np.arange(self.n)[key] if isinstance(key, (list, tuple)) else np.asarray(key)
+            if k.dtype == bool:  # maska (np.bool_) – indeksy wybranych próbek
+                if k.shape != (self.n,):
+                    raise IndexError(f"Maska o kształcie {k.shape} dla osi czasu o {self.n} próbkach")
+                k = np.flatnonzero(k)
+            k = np.where(k < 0, k + self.n, k)
+        t = k * self.dt
+        if self.n > 1:
+            t = np.where(k == self.n - 1, self.t_end, t)
+        return t if t.ndim else float(t)
+
+    def __array__(self, dtype=None, copy=None):
+        t = self[:]
+        return t if dtype is None else t.astype(dtype)
+
+
+def _channel_dtypes(channels):
+    """None – wszystkie kanały w STORE_DTYPE; lista nazw albo słownik nazwa -> dtype."""
+    if channels is None:
+        channels = CHANNELS
+    if not isinstance(channels, dict):
+        channels = {name: STORE_DTYPE for name in channels}
+    unknown = set(channels) - set(CHANNELS)
+    if unknown:
+        raise ValueError(f"Nieznane kanały: {', '.join(sorted(unknown))}")
+    return {name: np.dtype(dtype) for name, dtype in channels.items()}
+
+
+def write_result(out_dir, chunks, n_steps, t_end, v_ref, channels=None):
+    """
+    Zapis bloków z CruiseControlSimulator.simulate_chunks do out_dir (kanały poza
+    channels są pomijane) i wskaźniki jakości liczone w locie. Zwraca StoredResult.
+    """
+    dtypes = _channel_dtypes(channels)
+    os.makedirs(out_dir, exist_ok=True)
+    meta_path = os.path.join(out_dir, META)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    files = {name: np.lib.format.open_memmap(os.path.join(out_dir, f"{name}.npy"), mode="w+",
+                                             dtype=dtype, shape=(n_steps,))
+             for name, dtype in dtypes.items()}
+    acc, pos = None, 0
+    for block in chunks:
+        n = len(block["time"])
+        for name, array in files.items():
+            array[pos:pos + n] = block[name]
+        if acc is None:
+            acc = StepMetrics(v_ref, block["velocity"][0])
+        # Wskaźniki z pełnej precyzji (przed rzutowaniem na dtype kanału)
+        acc.update(block["time"], block["velocity"], block["control"], block["traction"], block["brake"])
+        pos += n
+    for array in files.values():
+        array.flush()
+    del files
+
+    meta = {"n_steps": n_steps, "t_end": float(t_end), "v_ref": float(v_ref),
+            "channels": {name: dtype.str for name, dtype in dtypes.items()},
+            "metrics": {k: float(v) for k, v in acc.result().items()}}
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+    return StoredResult(out_dir)
+
+
+class StoredResult(SimulationResult):
+    """
+    Wynik zapisany przez write_result – słownik jak z simulate, ale kanały to np.memmap
+    (tylko do odczytu), a "time" to ImplicitTime. Przebiegi czytane są fragmentami.
+    """
+
+    def __init__(self, out_dir):
+        meta_path = os.path.join(out_dir, META)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"Brak {META} w {out_dir} – zapis niekompletny?")
+        with open(meta_path) as f:
+            meta = json.load(f)
+        super().__init__({name: np.load(os.path.join(out_dir, f"{name}.npy"), mmap_mode="r")
+                          for name in meta["channels"]})
+        self["time"] = ImplicitTime(meta["n_steps"], meta["t_end"])
+        self["v_ref"] = meta["v_ref"]
+        self.out_dir = out_dir
+        self._metrics = meta["metrics"]
+
+    def blocks(self, size=STORE_BLOCK):
+        """Generator kolejnych fragmentów {kanał: tablica} po size próbek (z czasem)."""
+        n = len(self["time"])
+        names = [k for k in self if k != "v_ref"]
+        for k0 in range(0, n, size):
+            yield {name: np.asarray(self[name][k0:k0 + size]) for name in names}
+
+
+def open_result(out_dir):
+    return StoredResult(out_dir)
@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+from batch import BatchStepper
+from core import VEHICLE_PRESETS, kmh_to_ms
+
+# =============================================================================
+# PRZYBLIŻENIE ODPOWIEDZI SKOKOWEJ (PODGLĄD NA ŻYWO PRZY PRZESUWANIU SUWAKÓW)
+# =============================================================================
+# python surrogate.py [--preset truck] [-o katalog] [--workers 8]
+#
+# Dla każdego presetu pojazdu liczona jest offline tablica przebiegów prędkości na
+# siatce węzłów (kp, Ti, Td, Tp, v_ref, v0) – paczki BatchStepper w osobnych procesach.
+# Przebiegi (próbkowane co TIME_STEP do T_MAX) zapisywane są jako uint16 ze wspólną
+# skalą – 4 razy mniej niż float64 przy rozdzielczości ~1 mm/s. (Rozkład SVD się nie
+# sprawdza: nastawy na granicy stabilności dają cykle graniczne, które nie mają
+# zwartej bazy.) Na dysku: table.npy (siatka × czas) i meta.json (skala, węzły
+# w jednostkach symulatora; zapisywany na końcu – katalog bez niego to zapis przerwany).
+# Aplikacja otwiera table.npy jako np.memmap; podgląd to interpolacja wieloliniowa
+# w 2^6 narożnikach komórki siatki (ułamek ms). Pełna symulacja (przycisk) dalej
+# liczona jest dokładnie.
+
+SURROGATE_DIR = os.environ.get("TEMPOMAT_SURROGATE_DIR",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), "surrogate"))
+FORMAT_VERSION = 1
+META = "meta.json"
+
+# Węzły siatki w jednostkach suwaków (prędkości w km/h); skrajne węzły = zakresy suwaków
+AXES = {
+    "kp": (1, 3, 6, 10, 15, 22, 32, 50),
+    "Ti": (0.1, 0.3, 0.7, 1.5, 3, 5, 10),
+    "Td": (0, 0.5, 1.5, 5),
+    "Tp": (0.1, 0.4, 0.7, 1.0),
+    "v_ref": (30, 60, 90, 120, 150),
+    "v0": (0, 30, 60, 90, 120),
+}
+SPEED_AXES = ("v_ref", "v0")
+T_MAX = 300.0  # najdłuższy czas symulacji w aplikacji [s]
+TIME_STEP = 1.0  # [s]
+CHUNK_SIZE = 1024  # zestawów w jednej paczce procesu roboczego
+VEHICLE_KEYS = ("mass", "drag_coeff", "max_traction", "max_brake")
+
+
+def axis_nodes(name):
+    """Węzły osi name w jednostkach symulatora (prędkości w m/s)."""
+    nodes = np.asarray(AXES[name], dtype=float)
+    return kmh_to_ms(nodes) if name in SPEED_AXES else nodes
+
+
+def time_grid():
+    return np.arange(int(round(T_MAX / TIME_STEP)) + 1) * TIME_STEP
+
+
+def _simulate_chunk(vehicle_params, kp, Ti, Td, Tp, v_ref, v0):
+    """Przebiegi prędkości paczki o wspólnym Tp, przeniesione na time_grid() – tablica (zestaw, czas)."""
+    Tp = float(Tp[0])
+    stepper = BatchStepper(kp, Ti, Td, Tp, *(vehicle_params[k] for k in VEHICLE_KEYS), v_ref, v0)
+    n_steps = int(np.ceil(T_MAX / Tp - 1e-9)) + 1
+    v = np.empty((n_steps, len(stepper)))
+    v[0] = stepper.v
+    for k in range(1, n_steps):
+        stepper.step()
+        v[k] = stepper.v
+    # Interpolacja liniowa między próbkami okresu Tp
+    pos = time_grid() / Tp
+    k0 = np.minimum(np.floor(pos + 1e-9).astype(int), n_steps - 2)
+    frac = (pos - k0)[:, None]
+    return (v[k0] * (1 - frac) + v[k0 + 1] * frac).T
+
+
+def response_table(vehicle_params, workers=None):
+    """Przebiegi prędkości we wszystkich węzłach – tablica (len(kp), ..., len(v0), czas)."""
+    names = list(AXES)
+    mesh = np.meshgrid(*(axis_nodes(name) for name in names), indexing="ij")
+    shape = mesh[0].shape
+    flat = {name: m.ravel() for name, m in zip(names, mesh)}
+    table = np.empty((flat["kp"].size, len(time_grid())))
+
+    chunks = []
+    for Tp in np.unique(flat["Tp"]):
+        idx = np.flatnonzero(flat["Tp"] == Tp)
+        chunks += np.array_split(idx, -(-len(idx) // CHUNK_SIZE))
+    params = {k: float(vehicle_params[k]) for k in VEHICLE_KEYS}
+    args = [(params, *(flat[name][idx] for name in names)) for idx in chunks]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = (_simulate_chunk(*a) for a in args)
+        for idx, rows in zip(chunks, results):
+            table[idx] = rows
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            for idx, rows in zip(chunks, executor.map(_simulate_chunk, *zip(*args))):
+                table[idx] = rows
+    return table.reshape(shape + (-1,))
+
+
+def quantize(table):
+    """Zapis uint16 ze wspólną skalą: (kody, skala [m/s na jednostkę], błąd maksymalny)."""
+    scale = max(float(table.max()), 1e-9) / np.iinfo(np.uint16).max
+    codes = np.round(table / scale).astype(np.uint16)
+    return codes, scale, float(np.abs(codes * scale - table).max())
+
+
+def build(name, out_dir=SURROGATE_DIR, workers=None):
+    """Buduje i zapisuje przybliżenie dla presetu name; zwraca meta (skala, błąd, czas budowy)."""
+    vehicle_params = VEHICLE_PRESETS[name]
+    start = time.perf_counter()
+    codes, scale, error = quantize(response_table(vehicle_params, workers))
+
+    path = os.path.join(out_dir, name)
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, META)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    np.save(os.path.join(path, "table.npy"), codes)
+    meta = {"version": FORMAT_VERSION, "vehicle": {k: float(vehicle_params[k]) for k in VEHICLE_KEYS},
+            "axes": {k: axis_nodes(k).tolist() for k in AXES}, "time_step": TIME_STEP, "t_max": T_MAX,
+            "scale": scale, "max_error": error, "build_s": time.perf_counter() - start}
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+    return meta
+
+
+class ResponseSurrogate:
+    """Przybliżenie zapisane przez build – tablica przebiegów jako np.memmap (tylko do odczytu)."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, META)) as f:
+            self.meta = json.load(f)
+        self.axes = [np.asarray(nodes) for nodes in self.meta["axes"].values()]
+        self.table = np.load(os.path.join(path, "table.npy"), mmap_mode="r")
+        self.time = np.arange(self.table.shape[-1]) * self.meta["time_step"]
+
+    def matches(self, vehicle_params):
+        """Czy przybliżenie policzono dla tych parametrów pojazdu (preset mógł się zmienić)."""
+        return (self.meta["version"] == FORMAT_VERSION
+                and all(self.meta["vehicle"][k] == float(vehicle_params[k]) for k in VEHICLE_KEYS))
+
+    def velocity(self, kp, Ti, Td, Tp, v_ref, v0, t_end):
+        """
+        Przybliżony przebieg prędkości [m/s] – (czas, prędkość) co time_step do t_end.
+        Argumenty poza siatką przycinane są do jej zakresu.
+        """
+        corner, weights = [], []
+        for nodes, x in zip(self.axes, (kp, Ti, Td, Tp, v_ref, v0)):
+            i = int(np.clip(np.searchsorted(nodes, x, side="right") - 1, 0, len(nodes) - 2))
+            corner.append(slice(i, i + 2))
+            weights.append(float(np.clip((x - nodes[i]) / (nodes[i + 1] - nodes[i]), 0.0, 1.0)))
+        n = min(int(t_end / self.meta["time_step"] + 1e-9) + 1, len(self.time))
+        block = self.table[tuple(corner) + (slice(0, n),)] * self.meta["scale"]  # (2,) * 6 + (n,)
+        for w in weights:
+            block = (1 - w) * block[0] + w * block[1]
+        return self.time[:n], block
+
+
+@lru_cache(maxsize=None)
+def _open(path):
+    return ResponseSurrogate(path) if os.path.exists(os.path.join(path, META)) else None
+
+
+def load_surrogate(name, directory=SURROGATE_DIR):
+    """Przybliżenie dla presetu name albo None (brak pliku lub nieaktualne parametry pojazdu)."""
+    surrogate = _open(os.path.join(directory, name))
+    if surrogate is None or name not in VEHICLE_PRESETS or not surrogate.matches(VEHICLE_PRESETS[name]):
+        return None
+    return surrogate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Budowa przybliżeń odpowiedzi do podglądu na żywo")
+    parser.add_argument("--preset", action="append", choices=list(VEHICLE_PRESETS),
+                        help="preset pojazdu (można powtórzyć; domyślnie wszystkie)")
+    parser.add_argument("-o", "--output", default=SURROGATE_DIR, help="katalog wynikowy")
+    parser.add_argument("--workers", type=int, help="liczba procesów (domyślnie liczba rdzeni)")
+    args = parser.parse_args(argv)
+
+    for name in args.preset or VEHICLE_PRESETS:
+        meta = build(name, args.output, args.workers)
+        print(f"{name}: błąd w węzłach {meta['max_error'] * 1000:.2f} mm/s, "
+              f"{meta['build_s']:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from batch import CHANNELS, simulate_batch
+from core import VEHICLE_PRESETS, CruiseControlSimulator
+
+# Zestawy (kp, Ti, Td, Tp, v_ref, v0, t_end) – różne Tp / t_end sprawdzają grupowanie
+# wierszy po liczbie próbek i wypełnianie NaN
+CASES = [
+    (2.0, 5.0, 0.2, 0.1, 25.0, 0.0, 30.0),
+    (5.0, 1.0, 0.0, 0.5, 30.0, 10.0, 60.0),
+    (20.0, 0.3, 1.0, 0.2, 10.0, 25.0, 20.0),
+    (1.0, 10.0, 5.0, 1.0, 35.0, 35.0, 45.0),
+]
+
+
+@pytest.mark.parametrize("integrator", ["exact", "euler"])
+@pytest.mark.parametrize("preset", sorted(VEHICLE_PRESETS))
+def test_batch_matches_scalar(preset, integrator):
+    """Każdy wiersz simulate_batch jest identyczny (bit w bit) z CruiseControlSimulator.simulate."""
+    vehicle = VEHICLE_PRESETS[preset]
+    kp, Ti, Td, Tp, v_ref, v0, t_end = (np.array(column) for column in zip(*CASES))
+    batch = simulate_batch(kp, Ti, Td, Tp, vehicle["mass"], vehicle["drag_coeff"],
+                           vehicle["max_traction"], vehicle["max_brake"], v_ref, v0, t_end,
+                           integrator=integrator)
+    for row, (kp, Ti, Td, Tp, v_ref, v0, t_end) in enumerate(CASES):
+        scalar = CruiseControlSimulator(vehicle, kp, Tp, Ti, Td).simulate(v_ref, v0, t_end, integrator)
+        n = batch["n_steps"][row]
+        assert n == len(scalar["time"])
+        assert np.all(np.isnan(batch["velocity"][row, n:]))
+        np.testing.assert_allclose(batch["time"][row, :n], scalar["time"], rtol=1e-12)
+        for name in CHANNELS:
+            np.testing.assert_array_equal(batch[name][row, :n], scalar[name], err_msg=name)
+
+
+def test_batch_channel_subset():
+    """channels ogranicza zapisywane przebiegi, nie zmieniając ich wartości."""
+    vehicle = VEHICLE_PRESETS["city_car"]
+    args = ([2.0, 8.0], 5.0, 0.2, 0.1, vehicle["mass"], vehicle["drag_coeff"],
+            vehicle["max_traction"], vehicle["max_brake"], 25.0, 0.0, 20.0)
+    full = simulate_batch(*args)
+    subset = simulate_batch(*args, channels=("velocity", "brake"))
+    assert "control" not in subset and "integral" not in subset
+    np.testing.assert_array_equal(subset["velocity"], full["velocity"])
+    np.testing.assert_array_equal(subset["brake"], full["brake"])
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from core import SENSITIVITY_PARAMS, VEHICLE_PRESETS, CruiseControlSimulator
+
+
+def _simulator(preset="city_car", kp=2.0, Tp=0.1, Ti=5.0, Td=0.2, **overrides):
+    return CruiseControlSimulator({**VEHICLE_PRESETS[preset], **overrides}, kp, Tp, Ti, Td)
+
+
+@pytest.mark.parametrize("preset, kp, Ti, Td, v0", [
+    ("city_car", 2.0, 5.0, 0.2, 20.0),
+    ("truck", 4.0, 3.0, 0.5, 15.0),  # nasycenie sterowania i hamowanie
+    ("sports_car", 1.5, 8.0, 1.0, 30.0),  # hamowanie – gałąź max_brake
+])
+def test_sensitivities_match_finite_differences(preset, kp, Ti, Td, v0):
+    """Pochodne z simulate(..., sensitivities=True) zgodne z ilorazem różnicowym centralnym."""
+    gains = {"kp": kp, "Ti": Ti, "Td": Td}
+    sens = _simulator(preset, **gains).simulate(25.0, v0, 30.0, sensitivities=True)["sensitivity"]
+    for name in SENSITIVITY_PARAMS:
+        value = gains.get(name, VEHICLE_PRESETS[preset].get(name))
+        h = 1e-6 * value
+        runs = []
+        for sign in (1, -1):
+            if name in gains:
+                sim = _simulator(preset, **{**gains, name: value + sign * h})
+            else:
+                sim = _simulator(preset, **gains, **{name: value + sign * h})
+            runs.append(sim.simulate(25.0, v0, 30.0)["velocity"])
+        numeric = (runs[0] - runs[1]) / (2 * h)
+        scale = max(np.abs(numeric).max(), 1e-12)
+        np.testing.assert_allclose(sens[name], numeric, rtol=0, atol=1e-4 * scale, err_msg=name)
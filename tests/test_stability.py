@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from core import VEHICLE_PRESETS
+from stability import (N_FREQ, THETA_MIN, _crossings, _frequency_response, characteristic_polynomial,
+                       closed_loop_poles, jury_stable, plant, stability_map)
+
+
+def _grid(preset, actuator):
+    """Wielomiany charakterystyczne na siatce nastaw obejmującej obszary stabilne i niestabilne."""
+    kp = np.geomspace(0.1, 200.0, 25)[:, None, None, None]
+    Ti = np.geomspace(0.05, 20.0, 9)[None, :, None, None]
+    Td = np.array([0.0, 0.1, 0.5, 2.0, 5.0])[None, None, :, None]
+    Tp = np.array([0.05, 0.1, 0.5, 1.0])[None, None, None, :]
+    return characteristic_polynomial(VEHICLE_PRESETS[preset], kp, Ti, Td, Tp, actuator).reshape(-1, 4)
+
+
+@pytest.mark.parametrize("actuator", ["traction", "brake"])
+@pytest.mark.parametrize("preset", sorted(VEHICLE_PRESETS))
+def test_jury_matches_roots(preset, actuator):
+    """Kryterium Jury'ego rozstrzyga tak samo jak max |pierwiastek| < 1 z np.roots."""
+    coeffs = _grid(preset, actuator)
+    radius = np.array([np.abs(np.roots(c)).max() for c in coeffs])
+    clear = np.abs(radius - 1) > 1e-9  # bieguny na samym okręgu – rozstrzyga zaokrąglenie
+    stable = jury_stable(coeffs)
+    assert stable[clear].any() and not stable[clear].all()
+    np.testing.assert_array_equal(stable[clear], radius[clear] < 1)
+
+
+def test_poles_match_roots():
+    """closed_loop_poles zwraca te same bieguny co np.roots (z dokładnością do kolejności)."""
+    coeffs = _grid("city_car", "traction")
+    poles = closed_loop_poles(coeffs)
+    for c, z in zip(coeffs, poles):
+        expected = np.roots(c)
+        distance = np.abs(z[:, None] - expected[None, :])
+        tol = 1e-6 * max(1.0, np.abs(expected).max())
+        assert distance.min(axis=0).max() < tol and distance.min(axis=1).max() < tol, (c, z, expected)
+
+
+def _reference_margins(vehicle, kp, Ti, Td, Tp, theta):
+    """Zapas fazy i pasmo z pełnej siatki częstotliwości – przegląd wszystkich przedziałów."""
+    a, g = plant(vehicle, Tp)
+    unit_db, phase = _frequency_response(np.atleast_1d(a), np.atleast_1d(Tp / Ti), np.atleast_1d(Td / Tp), theta)
+    level = unit_db[0] + 20 * np.log10(kp * g)
+    at_gain = _crossings(level, phase[0] + 180.0)
+    mag = 10 ** (unit_db[0] / 20) * kp * g
+    below = mag * (mag - 2 * np.cos(np.radians(phase[0]))) < 1
+    return (np.min(np.where(np.isnan(at_gain), np.inf, at_gain)),
+            theta[below.argmax()] / Tp if below.any() else np.nan)
+
+
+@pytest.mark.parametrize("preset", sorted(VEHICLE_PRESETS))
+def test_margins_match_full_grid_search(preset):
+    """Zapas fazy i pasmo z wyszukiwania binarnego jak z przeglądu całej siatki częstotliwości."""
+    vehicle = VEHICLE_PRESETS[preset]
+    kp = np.geomspace(0.5, 100.0, 12)[:, None, None]
+    Ti = np.geomspace(0.1, 10.0, 6)[None, :, None]
+    Td = np.array([0.0, 0.3, 2.0])[None, None, :]
+    result = stability_map(vehicle, kp, Ti, Td, 0.5)
+    theta = np.geomspace(THETA_MIN, np.pi, N_FREQ)
+    for i, j, k in np.ndindex(result["phase_margin"].shape):
+        pm, bw = _reference_margins(vehicle, kp[i, 0, 0], Ti[0, j, 0], Td[0, 0, k], 0.5, theta)
+        assert result["phase_margin"][i, j, k] == pm
+        np.testing.assert_equal(result["bandwidth"][i, j, k], bw)
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from storage import ImplicitTime
+
+
+@pytest.mark.parametrize("n, t_end", [(1, 0.0), (2, 1.0), (3001, 300.0), (1201, 0.7)])
+def test_implicit_time_matches_linspace(n, t_end):
+    """Indeksowanie osi czasu daje te same wartości co np.linspace(0, t_end, n)."""
+    time, expected = ImplicitTime(n, t_end), np.linspace(0, t_end, n)
+    np.testing.assert_array_equal(np.asarray(time), expected)
+    np.testing.assert_array_equal(time[::7], expected[::7])
+    np.testing.assert_array_equal(time[[0, -1, n // 2]], expected[[0, -1, n // 2]])
+    assert time[-1] == expected[-1] and time[0] == expected[0]
+    mask = np.arange(n) % 3 == 0
+    np.testing.assert_array_equal(time[mask], expected[mask])
+    np.testing.assert_array_equal(time[expected > t_end / 2], expected[expected > t_end / 2])
+
+
+def test_implicit_time_rejects_mask_of_wrong_length():
+    with pytest.raises(IndexError):
+        ImplicitTime(10, 1.0)[np.ones(9, dtype=bool)]
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from core import VEHICLE_PRESETS, CruiseControlSimulator
+
+
+def _simulator(preset="city_car", kp=2.0, Tp=0.1, Ti=5.0, Td=0.2, **overrides):
+    return CruiseControlSimulator({**VEHICLE_PRESETS[preset], **overrides}, kp, Tp, Ti, Td)
+
+
+@pytest.mark.parametrize("integrator", ["exact", "euler"])
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_chunks_match_simulate(chunk_size, integrator):
+    """Sklejone bloki simulate_chunks dają ten sam przebieg co simulate."""
+    sim = _simulator(kp=8.0, Ti=0.5)
+    full = sim.simulate(25.0, 5.0, 30.0, integrator)
+    chunks = list(sim.simulate_chunks(25.0, 5.0, 30.0, chunk_size, integrator=integrator))
+    for name in chunks[0]:
+        joined = np.concatenate([chunk[name] for chunk in chunks])
+        if name == "time":
+            np.testing.assert_allclose(joined, full[name], rtol=1e-12, atol=1e-12)
+        else:
+            np.testing.assert_array_equal(joined, full[name], err_msg=name)
+
+
+def test_chunks_resume_from_state():
+    """Przerwany generator wznowiony z tym samym stanem kończy przebieg bez zmian."""
+    sim = _simulator()
+    full = sim.simulate(25.0, 0.0, 20.0)
+    state = sim.initial_state(25.0, 0.0)
+    first = next(sim.simulate_chunks(25.0, 0.0, 20.0, 50, state=state))
+    rest = list(sim.simulate_chunks(25.0, 0.0, 20.0, 50, state=state))
+    joined = np.concatenate([first["velocity"]] + [chunk["velocity"] for chunk in rest])
+    np.testing.assert_array_equal(joined, full["velocity"])